@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Sum
+
+from accounts.models import Seller
+from antiques.models import Antique
+from payments.models import OrderItem
+
+SOLD_ORDER_STATUSES = ('paid', 'fulfilled')
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized seller counters from antiques and orders (run nightly to correct drift)."
+
+    def handle(self, *args, **options):
+        listings = dict(
+            Antique.objects.filter(seller__isnull=False, is_sold=False)
+            .values('seller')
+            .annotate(n=Count('pk'))
+            .values_list('seller', 'n')
+        )
+        sales = {
+            row['antique__seller']: row
+            for row in OrderItem.objects.filter(
+                antique__seller__isnull=False,
+                order__status__in=SOLD_ORDER_STATUSES,
+            )
+            .values('antique__seller')
+            .annotate(
+                units=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('unit_price')),  # what record_sale() added: the price paid
+            )
+        }
+
+        changed = []
+        for seller in Seller.objects.only('pk', 'active_listings', 'total_sales', 'total_revenue'):
+            sale = sales.get(seller.pk, {})
+            stats = (
+                listings.get(seller.pk, 0),
+                sale.get('units') or 0,
+                sale.get('revenue') or 0,
+            )
+            if stats != (seller.active_listings, seller.total_sales, seller.total_revenue):
+                seller.active_listings, seller.total_sales, seller.total_revenue = stats
+                changed.append(seller)
+
+        Seller.objects.bulk_update(
+            changed, ['active_listings', 'total_sales', 'total_revenue'], batch_size=500
+        )
+        self.stdout.write(self.style.SUCCESS(f"Recomputed stats, {len(changed)} seller(s) corrected."))
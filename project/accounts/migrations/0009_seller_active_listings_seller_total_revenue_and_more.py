@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_passwordreset"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="seller",
+            name="active_listings",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="seller",
+            name="total_revenue",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="seller",
+            name="total_sales",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 from django.conf import settings
@@ -51,7 +53,12 @@ class Seller(models.Model):
     # Seller status & metrics
     is_verified = models.BooleanField(default=False)  # if store is verified
     #rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
-    #total_sales = models.PositiveIntegerField(default=0)
+
+    # Denormalized storefront counters. Kept up to date by the Antique signals and the
+    # Stripe webhook, and corrected nightly by `manage.py recompute_seller_stats`.
+    active_listings = models.PositiveIntegerField(default=0)
+    total_sales = models.PositiveIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     # social media links
     facebook = models.URLField(blank=True, null=True)
@@ -62,6 +69,34 @@ class Seller(models.Model):
     def __str__(self):
         return f"{self.store_name} - {self.user.email}"
 
+    @staticmethod
+    def refresh_active_listings(seller_id):
+        """Recount a seller's unsold antiques in a single UPDATE ... (SELECT COUNT) query"""
+        if not seller_id:
+            return
+        from antiques.models import Antique
+
+        active = (
+            Antique.objects.filter(seller=OuterRef('pk'), is_sold=False)
+            .order_by()
+            .values('seller')
+            .annotate(n=Count('pk'))
+            .values('n')
+        )
+        Seller.objects.filter(pk=seller_id).update(
+            active_listings=Coalesce(Subquery(active), 0)
+        )
+
+    @staticmethod
+    def record_sale(seller_id, quantity, amount):
+        """Atomically add a completed sale to the seller's counters"""
+        if not seller_id:
+            return
+        Seller.objects.filter(pk=seller_id).update(
+            total_sales=F('total_sales') + quantity,
+            total_revenue=F('total_revenue') + amount,
+        )
+
 class EmailVerification(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='email_verifications')
     code = models.CharField(max_length=6)
@@ -15,3 +15,33 @@ def create_stripe_customer(sender, instance, created, **kwargs):
         )
         instance.stripe_customer_id = customer.id
         instance.save()
+
+
+# ------------------------------
+# Seller storefront counters
+# ------------------------------
+
+from django.db.models.signals import post_delete
+from antiques.deletion import in_bulk_delete
+from antiques.models import Antique
+from .models import Seller
+from project.versions import bump_version
+
+LISTING_FIELDS = {'quantity', 'is_sold', 'seller'}
+
+@receiver(post_save, sender=Antique)
+def update_seller_listings_on_save(sender, instance, update_fields=None, **kwargs):
+    # Saves that only touch Stripe ids etc. can't change the listing count
+    if update_fields is not None and not LISTING_FIELDS.intersection(update_fields):
+        return
+    Seller.refresh_active_listings(instance.seller_id)
+
+@receiver(post_delete, sender=Antique)
+def update_seller_listings_on_delete(sender, instance, **kwargs):
+    if not in_bulk_delete():  # delete_antiques() recounts each seller once per batch
+        Seller.refresh_active_listings(instance.seller_id)
+
+@receiver(post_save, sender=Seller)
+def bump_seller_version(sender, **kwargs):
+    # Seller details are rendered on every antique detail page
+    bump_version('sellers')
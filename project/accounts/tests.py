@@ -1,3 +1,87 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db.models import F
+from django.urls import reverse
+
+from antiques.models import Antique
+from project.testing import Catalog, QueryBudgetTestCase, TemporaryMediaTestCase
+from service.management.commands.seed_catalog import SEED_PASSWORD
+
+XHR = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+class AuthQueryBudgets(QueryBudgetTestCase):
+    def test_login_page(self):
+        self.assertQueryBudget(0, 'accounts:login_view')
+
+    def test_login(self):
+        self.assertQueryBudget(9, 'accounts:login_view', method='post',
+                               data=lambda c: {'username': c.buyer.email, 'password': SEED_PASSWORD}, **XHR)
+
+    def test_logout(self):
+        self.assertQueryBudget(4, 'accounts:logout_view', user='buyer', status=302)
+
+    def test_signup_page(self):
+        self.assertQueryBudget(0, 'accounts:signup_view')
+
+
+class SettingsQueryBudgets(QueryBudgetTestCase):
+    def test_settings(self):
+        self.assertQueryBudget(3, 'accounts:settings', user='buyer')
+
+    def test_seller_form(self):
+        self.assertQueryBudget(2, 'accounts:seller_form', user='buyer')
+
+    def test_send_verification_code(self):
+        self.assertQueryBudget(8, 'accounts:send_verification_code_ajax', user='buyer', method='post')
+
+    def test_verify_email(self):
+        self.assertQueryBudget(3, 'accounts:verify_email_ajax', user='buyer', method='post',
+                               data={'code': '123456'})
+
+    def test_verify_password(self):
+        self.assertQueryBudget(2, 'accounts:verify_password', user='buyer', method='post',
+                               data={'password': SEED_PASSWORD})
+
+
+class PasswordResetQueryBudgets(QueryBudgetTestCase):
+    def test_request_password_reset(self):
+        self.assertQueryBudget(3, 'accounts:request_password_reset', method='post',
+                               data=lambda c: {'email': c.buyer.email})
+
+    def test_reset_password_page(self):
+        self.assertQueryBudget(1, 'accounts:reset_password_page', args=['not-a-token'])
+
+
+class StorefrontQueryBudgets(QueryBudgetTestCase):
+    def test_seller_storefront(self):
+        self.assertQueryBudget(5, 'accounts:seller_storefront', args=lambda c: [c.seller.pk])
+
+    def test_seller_storefront_signed_in(self):
+        self.assertQueryBudget(7, 'accounts:seller_storefront', args=lambda c: [c.seller.pk], user='buyer')
+
+
+class SellerStatsTests(TemporaryMediaTestCase):
+    def test_recount_keeps_the_prices_paid(self):
+        catalog = Catalog(12)
+        call_command('recompute_seller_stats', stdout=io.StringIO())
+        catalog.seller.refresh_from_db()
+        revenue = catalog.seller.total_revenue
+        self.assertGreater(revenue, 0)
+
+        # A price change after the sales isn't "drift" in the revenue
+        Antique.objects.update(price=F('price') + 100)
+        call_command('recompute_seller_stats', stdout=io.StringIO())
+        catalog.seller.refresh_from_db()
+        self.assertEqual(catalog.seller.total_revenue, revenue)
+
+    def test_revenue_is_shown_to_the_owner_only(self):
+        catalog = Catalog(12)
+        call_command('recompute_seller_stats', stdout=io.StringIO())
+        url = reverse('accounts:seller_storefront', args=[catalog.seller.pk])
+        self.assertNotContains(self.client.get(url), "total revenue")
+        self.client.force_login(catalog.buyer)
+        self.assertNotContains(self.client.get(url), "total revenue")
+        self.client.force_login(catalog.seller_user)
+        self.assertContains(self.client.get(url), "total revenue")
@@ -10,6 +10,7 @@ urlpatterns = [
 
     path('settings/', views.settings_view, name='settings'),
     path('seller-form/', views.seller_form, name='seller_form'),  # New URL for seller form
+    path('sellers/<int:pk>/', views.seller_storefront, name='seller_storefront'),
     
     path('send-verification-code/', views.send_verification_code_ajax, name='send_verification_code_ajax'),
     path('verify-email/', views.verify_email_ajax, name='verify_email_ajax'),
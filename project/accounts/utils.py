@@ -2,8 +2,11 @@
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
+import logging
 import random
 
+logger = logging.getLogger(__name__)
+
 # def send_verification_email(user, code):
 #     subject = 'Verify your email'
 #     from_email = settings.DEFAULT_FROM_EMAIL
@@ -54,5 +57,5 @@ def send_mailerlite_email(to_email, subject, html_content):
     if response.status_code == 200:
         return True
     else:
-        print(response.text)
+        logger.warning("MailerLite send to %s failed (%s): %s", to_email, response.status_code, response.text)
         return False
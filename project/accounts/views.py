@@ -1,8 +1,10 @@
 # accounts/views.py
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, update_session_auth_hash, get_user_model, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
+from django.core.paginator import Paginator
+from django.db.models import Sum
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.mail import send_mail
@@ -10,17 +12,20 @@ from django.utils import timezone
 from datetime import timedelta
 from decouple import config
 import json
+import logging
 import secrets
 
 from .forms import LoginForm, SellerForm, SettingsForm, SignUpForm
-from .models import EmailVerification, PasswordReset
+from .models import EmailVerification, PasswordReset, Seller
 from .utils import generate_verification_code
 from service.models import Subscriber
+from antiques.models import Antique, AntiqueDailyViews
 
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 
 # ------------------------------
@@ -50,8 +55,8 @@ def send_email_helper(subject, html_message, recipient_email, plain_text_message
             fail_silently=False,
         )
         return True
-    except Exception as e:
-        print(f"Email sending failed to {recipient_email}: {e}")
+    except Exception:
+        logger.exception("Email sending failed to %s", recipient_email)
         return False
 
 
@@ -184,6 +189,34 @@ def seller_form(request):
     return render(request, 'accounts/selling/seller_form.html', {'form': form})
 
 
+STOREFRONT_PAGE_SIZE = 24
+STOREFRONT_VIEWS_DAYS = 30
+
+def seller_storefront(request, pk):
+    """Public storefront listing a seller's antiques, with the denormalized seller stats"""
+    seller = get_object_or_404(Seller, pk=pk)
+    antiques = (
+        Antique.objects.filter(seller=seller)
+        .order_by('is_sold', '-created_at')
+        .prefetch_related('images')
+    )
+    page = Paginator(antiques, STOREFRONT_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    # From the daily rollups, so this is one small aggregate however popular the store is
+    since = timezone.localdate() - timedelta(days=STOREFRONT_VIEWS_DAYS - 1)
+    recent_views = AntiqueDailyViews.objects.filter(
+        antique__seller=seller, date__gte=since,
+    ).aggregate(total=Sum('views'))['total'] or 0
+
+    return render(request, 'accounts/selling/storefront.html', {
+        'seller': seller,
+        'is_owner': request.user.is_authenticated and request.user.pk == seller.user_id,  # revenue is private
+        'page': page,
+        'recent_views': recent_views,
+        'recent_views_days': STOREFRONT_VIEWS_DAYS,
+    })
+
+
 # ------------------------------
 # Email Verification Views
 # ------------------------------
@@ -205,8 +238,8 @@ def send_verification_code_ajax(request):
             }
         )
         
-        # Print to console for testing
-        print(f"Verification code for {request.user.email}: {code}")
+        # For local testing; debug level, so it's never in production logs
+        logger.debug("Verification code for %s: %s", request.user.email, code)
         
         # Send email
         email_sent = send_verification_email(request.user, code)
@@ -221,7 +254,7 @@ def send_verification_code_ajax(request):
             'message': message
         })
     except Exception as e:
-        print(f"Error in send_verification_code_ajax: {e}")
+        logger.exception("Error in send_verification_code_ajax")
         return JsonResponse({
             'success': False,
             'message': f'Error sending code: {str(e)}'
@@ -282,7 +315,7 @@ def verify_email_ajax(request):
             })
             
     except Exception as e:
-        print(f"Error in verify_email_ajax: {e}")
+        logger.exception("Error in verify_email_ajax")
         return JsonResponse({
             'success': False,
             'message': f'Error: {str(e)}'
@@ -314,7 +347,7 @@ def verify_password(request):
         })
         
     except Exception as e:
-        print(f"Error in verify_password: {e}")
+        logger.exception("Error in verify_password")
         return JsonResponse({
             'valid': False,
             'message': f'Error: {str(e)}'
@@ -348,13 +381,13 @@ def reset_password(request):
         return JsonResponse({"success": True})
         
     except json.JSONDecodeError:
-        print("Error decoding JSON in reset_password")
+        logger.warning("Invalid JSON in reset_password")
         return JsonResponse({
             "success": False,
             "error": "Invalid JSON data"
         }, status=400)
     except Exception as e:
-        print(f"Error in reset_password: {e}")
+        logger.exception("Error in reset_password")
         return JsonResponse({
             "success": False,
             "error": str(e)
@@ -405,8 +438,8 @@ def request_password_reset(request):
         # Generate reset URL
         reset_url = request.build_absolute_uri(f'/accounts/reset-password/{token}/')
         
-        # Print to console for testing
-        print(f"Password reset link for {user.email}: {reset_url}")
+        # For local testing; debug level, so it's never in production logs
+        logger.debug("Password reset link for %s: %s", user.email, reset_url)
         
         # Send email
         email_sent = send_password_reset_email(user, reset_url)
@@ -422,7 +455,7 @@ def request_password_reset(request):
         })
         
     except Exception as e:
-        print(f"Error in request_password_reset: {e}")
+        logger.exception("Error in request_password_reset")
         return JsonResponse({
             'success': False,
             'message': f'Error: {str(e)}'
@@ -472,8 +505,8 @@ def reset_password_page(request, token):
         return render(request, 'accounts/password_reset_invalid.html', {
             'message': 'Invalid password reset link.'
         })
-    except Exception as e:
-        print(f"Error in reset_password_page: {e}")
+    except Exception:
+        logger.exception("Error in reset_password_page")
         return render(request, 'accounts/password_reset_invalid.html', {
             'message': 'An error occurred. Please try again.'
         })
\ No newline at end of file
@@ -1,9 +1,39 @@
 from django.contrib import admin
-from .models import Antique, Wishlist, DailyPick
+from .deletion import delete_antiques
+from .models import Antique, AntiqueDailyViews, Wishlist, DailyPick, SimilarAntique
+
+@admin.register(Antique)
+class AntiqueAdmin(admin.ModelAdmin):
+    list_display = ('title', 'seller', 'price', 'quantity', 'view_count', 'wishlist_count', 'created_at')
+    readonly_fields = ('view_count', 'wishlist_count')
+    search_fields = ('title', 'short_id')
+    actions = ['bulk_delete']
+
+    @admin.action(description='Delete selected antiques (batched, Stripe archived in background)', permissions=['delete'])
+    def bulk_delete(self, request, queryset):
+        selected = queryset.count()
+        deleted = delete_antiques(queryset)
+        message = f'{deleted} antiques deleted.'
+        if deleted < selected:
+            message += f' {selected - deleted} kept because they have been ordered.'
+        self.message_user(request, message)
 
-admin.site.register(Antique)
 admin.site.register(Wishlist)
 
+@admin.register(AntiqueDailyViews)
+class AntiqueDailyViewsAdmin(admin.ModelAdmin):
+    list_display = ('antique', 'date', 'views')
+    list_filter = ('date',)
+    date_hierarchy = 'date'
+    ordering = ('-date', '-views')
+    list_select_related = ('antique',)
+
+@admin.register(SimilarAntique)
+class SimilarAntiqueAdmin(admin.ModelAdmin):
+    list_display = ('antique', 'rank', 'similar', 'score')
+    list_select_related = ('antique', 'similar')
+    raw_id_fields = ('antique', 'similar')
+
 @admin.register(DailyPick)
 class DailyPickAdmin(admin.ModelAdmin):
     list_display = ('date', 'created_by')
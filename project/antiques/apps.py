@@ -6,3 +6,4 @@ class AntiquesConfig(AppConfig):
 
     def ready(self):
         import payments.signals
+        import antiques.signals
@@ -0,0 +1,101 @@
+# antiques/deletion.py
+"""
+Deleting antiques in bulk.
+
+A plain queryset delete runs the per-antique signal handlers (M2M cleanup,
+seller recount, catalog bump) once per row. delete_antiques() does that work
+once per batch with set-based queries instead, and hands the slow external
+parts (Stripe archival, image files) to the background queue.
+"""
+from contextvars import ContextVar
+
+from django.db import transaction
+
+from accounts.models import Seller
+from payments.models import OrderItem
+from payments.tasks import archive_stripe_objects
+from project.tasks import enqueue
+from project.versions import bump_version
+from .models import Antique, AntiqueImage, DailyPick, SimilarAntique, Wishlist
+from .recommendations import refresh_neighbour_lists
+
+DELETE_BATCH_SIZE = 200
+
+_bulk_delete = ContextVar('antiques_bulk_delete', default=False)
+
+
+def in_bulk_delete():
+    """True while delete_antiques() is deleting, so per-antique signal handlers can skip their work"""
+    return _bulk_delete.get()
+
+
+def detach_antiques(antique_ids):
+    """Remove the antiques from every wishlist and daily pick with one DELETE per through table"""
+    # Their SimilarAntique rows cascade; the lists they were in get refilled once this commits
+    referrers = set(
+        SimilarAntique.objects.filter(similar_id__in=antique_ids)
+        .exclude(antique_id__in=antique_ids)
+        .values_list('antique_id', flat=True)
+    )
+    if referrers:
+        enqueue(refresh_neighbour_lists, referrers)
+
+    wishlist_rows = Wishlist.antiques.through.objects.filter(antique_id__in=antique_ids)
+    owners = set(wishlist_rows.values_list('wishlist__owner_id', flat=True))
+    wishlist_rows.delete()
+    DailyPick.picks.through.objects.filter(antique_id__in=antique_ids).delete()
+    # Raw through deletes send no m2m_changed
+    bump_version('picks', *[f"wishlists:{owner_id}" for owner_id in owners])
+
+
+def delete_antiques(antiques, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete every antique in the queryset, `batch_size` per transaction.
+    Antiques that have been ordered are kept, so buyers' order history never
+    loses its items. Returns how many were deleted.
+    """
+    ids = list(antiques.values_list('pk', flat=True))
+    deleted = 0
+    for start in range(0, len(ids), batch_size):
+        deleted += _delete_batch(ids[start:start + batch_size])
+    return deleted
+
+
+def _delete_batch(ids):
+    with transaction.atomic():
+        # Checked in the transaction, so an order placed meanwhile keeps its antique too
+        rows = list(
+            Antique.objects.filter(pk__in=ids)
+            .exclude(pk__in=OrderItem.objects.values('antique_id'))
+            .values_list('pk', 'seller_id', 'stripe_product_id', 'stripe_price_id')
+        )
+        if not rows:
+            return 0
+        ids = [pk for pk, _, _, _ in rows]
+        image_names = list(AntiqueImage.objects.filter(antique_id__in=ids).values_list('image', flat=True))
+
+        detach_antiques(ids)
+        token = _bulk_delete.set(True)
+        try:
+            # Cascades images, daily views and stored terms
+            Antique.objects.filter(pk__in=ids).delete()
+        finally:
+            _bulk_delete.reset(token)
+
+        for seller_id in {seller_id for _, seller_id, _, _ in rows if seller_id}:
+            Seller.refresh_active_listings(seller_id)
+        bump_version('catalog')
+
+        # Both run after commit, so a rolled back batch keeps its Stripe objects and files
+        stripe_ids = [(product_id, price_id) for _, _, product_id, price_id in rows if product_id]
+        if stripe_ids:
+            enqueue(archive_stripe_objects, stripe_ids)
+        if image_names:
+            enqueue(delete_image_files, image_names)
+    return len(rows)
+
+
+def delete_image_files(names):
+    storage = AntiqueImage.image.field.storage
+    for name in names:
+        storage.delete(name)
@@ -0,0 +1,24 @@
+from django.db.models import F
+
+from project.exports import EXPORT_CHUNK_SIZE
+from .models import Antique
+
+ANTIQUE_EXPORT_FIELDS = [
+    'id', 'short_id', 'slug', 'title', 'type_of_antique', 'price', 'quantity', 'is_sold',
+    'dimensions', 'description', 'additional_info', 'seller_id', 'store_name',
+    'stripe_product_id', 'stripe_price_id', 'created_at', 'updated_at',
+]
+
+
+def antique_export_rows(seller=None):
+    """Catalog rows as plain dicts, fetched in chunks with a values() projection"""
+    antiques = Antique.objects.all()
+    if seller is not None:
+        antiques = antiques.filter(seller=seller)
+
+    fields = [f for f in ANTIQUE_EXPORT_FIELDS if f != 'store_name']
+    return (
+        antiques.order_by('created_at', 'id')
+        .values(*fields, store_name=F('seller__store_name'))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
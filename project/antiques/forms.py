@@ -33,6 +33,19 @@ class AntiqueImageForm(forms.ModelForm):
 
 
 
+class InventoryRowForm(forms.Form):
+    """One row of the seller inventory sheet. Prefixed with the antique id."""
+    price = forms.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.05'}),
+    )
+    quantity = forms.IntegerField(
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': '0', 'step': '1'}),
+    )
+
+
+
 # Formset for multiple images
 AntiqueImageFormSet = modelformset_factory(
     AntiqueImage,
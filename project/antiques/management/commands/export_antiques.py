@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Seller
+from antiques.exports import ANTIQUE_EXPORT_FIELDS, antique_export_rows
+from project.exports import EXPORT_FORMATS, write_export
+
+
+class Command(BaseCommand):
+    help = "Write the antique catalog (site-wide or for one seller) to a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write")
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--seller', type=int, help="Only export this seller's antiques (seller id)")
+
+    def handle(self, *args, **options):
+        seller = None
+        if options['seller'] is not None:
+            seller = Seller.objects.filter(pk=options['seller']).first()
+            if seller is None:
+                raise CommandError(f"Seller {options['seller']} does not exist.")
+
+        count = write_export(antique_export_rows(seller), ANTIQUE_EXPORT_FIELDS, options['format'], options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} antiques to {options['output']}."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from antiques.recommendations import rebuild_similar_antiques
+
+
+class Command(BaseCommand):
+    help = (
+        "Reindex the catalog and rebuild every antique's \"you may also like\" neighbours from scratch. "
+        "Saves keep them up to date incrementally from the stored term vectors; run this nightly so the "
+        "TF-IDF weights follow the whole catalog, and once after migrating to index existing antiques."
+    )
+
+    def handle(self, *args, **options):
+        written = rebuild_similar_antiques()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt recommendations, {written} neighbour row(s) written."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from antiques.models import Antique, Wishlist
+from project.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = "Recompute Antique.wishlist_count from the wishlists (run nightly to correct drift)."
+
+    def handle(self, *args, **options):
+        counts = dict(
+            Wishlist.antiques.through.objects.filter(wishlist__owner__isnull=False)
+            .values('antique')
+            .annotate(n=Count('wishlist__owner', distinct=True))
+            .values_list('antique', 'n')
+        )
+
+        changed = []
+        for antique in Antique.objects.only('pk', 'wishlist_count').iterator(chunk_size=2000):
+            count = counts.get(antique.pk, 0)
+            if count != antique.wishlist_count:
+                antique.wishlist_count = count
+                changed.append(antique)
+
+        Antique.objects.bulk_update(changed, ['wishlist_count'], batch_size=500)
+        if changed:
+            bump_version('popularity')
+        self.stdout.write(self.style.SUCCESS(f"Recomputed wishlist counts, {len(changed)} antique(s) corrected."))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_seller_active_listings_seller_total_revenue_and_more"),
+        ("antiques", "0014_alter_antique_owner_alter_dailypick_picks_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="antique",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="antique_newest_idx"
+            ),
+        ),
+    ]
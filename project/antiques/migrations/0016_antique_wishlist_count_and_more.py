@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_seller_active_listings_seller_total_revenue_and_more"),
+        ("antiques", "0015_antique_antique_newest_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="antique",
+            name="wishlist_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="antique",
+            index=models.Index(
+                fields=["-wishlist_count", "-created_at"],
+                name="antique_most_wanted_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antiques", "0016_antique_wishlist_count_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="antique",
+            name="view_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="AntiqueDailyViews",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("views", models.PositiveIntegerField(default=0)),
+                (
+                    "antique",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_views",
+                        to="antiques.antique",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "antique daily views",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("antique", "date"), name="unique_antique_daily_views"
+                    )
+                ],
+            },
+        ),
+    ]
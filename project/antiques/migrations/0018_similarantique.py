@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antiques", "0017_antique_view_count_antiquedailyviews"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarAntique",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "antique",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="antiques.antique",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_to",
+                        to="antiques.antique",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["antique", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("antique", "rank"), name="unique_similar_antique_rank"
+                    )
+                ],
+            },
+        ),
+    ]
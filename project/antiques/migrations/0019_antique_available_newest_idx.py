@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_seller_active_listings_seller_total_revenue_and_more"),
+        ("antiques", "0018_similarantique"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="antique",
+            index=models.Index(
+                condition=models.Q(("is_sold", False)),
+                fields=["-created_at", "-id"],
+                name="antique_available_newest_idx",
+            ),
+        ),
+    ]
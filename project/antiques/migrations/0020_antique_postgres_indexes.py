@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from project.postgres import RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction; it doesn't block writes to the table
+    atomic = False
+
+    dependencies = [
+        ("antiques", "0019_antique_available_newest_idx"),
+    ]
+
+    operations = [
+        RunPostgresSQL(
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # title__icontains (the admin search) is UPPER(title::text) LIKE UPPER('%...%'),
+        # so the trigram index is on that expression
+        RunPostgresSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS antique_title_trgm_idx "
+            "ON antiques_antique USING gin ((UPPER(title::text)) gin_trgm_ops)",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS antique_title_trgm_idx",
+        ),
+        # Rows are added in created_at order, so a few block ranges summarise the whole table
+        # for created_at range filters (API cursors) that don't need the b-tree's ordering
+        RunPostgresSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS antique_created_brin_idx "
+            "ON antiques_antique USING brin (created_at)",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS antique_created_brin_idx",
+        ),
+    ]
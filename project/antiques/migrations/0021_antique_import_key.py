@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antiques", "0020_antique_postgres_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="antique",
+            name="import_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+    ]
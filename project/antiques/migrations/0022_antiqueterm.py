@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("antiques", "0021_antique_import_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AntiqueTerm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=110)),
+                ("weight", models.FloatField()),
+                (
+                    "antique",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="antiques.antique",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["term", "weight"], name="antique_term_postings_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("antique", "term"), name="unique_antique_term"
+                    )
+                ],
+            },
+        ),
+    ]
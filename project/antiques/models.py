@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 import uuid
 import random
@@ -42,6 +44,23 @@ class Antique(BaseModel):
     stripe_product_id = models.CharField(max_length=100, blank=True, null=True)
     stripe_price_id = models.CharField(max_length=100, blank=True, null=True)
 
+    # Denormalized: how many people have this in at least one wishlist (see refresh_wishlist_counts)
+    wishlist_count = models.PositiveIntegerField(default=0, editable=False)
+    # Buffered in each worker and flushed in batches, see project/viewcounts.py
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    # "<import id>:<row number>" for antiques from import_antiques, so a resumed import skips rows it already inserted
+    import_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Catalog listings and API cursors walk newest-first
+            models.Index(fields=['-created_at', '-id'], name='antique_newest_idx'),
+            # The default catalog page (available only, newest first) without stepping over sold rows
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_sold=False), name='antique_available_newest_idx'),
+            # "Most wanted" catalog sort
+            models.Index(fields=['-wishlist_count', '-created_at'], name='antique_most_wanted_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.id})"
 
@@ -56,17 +75,46 @@ class Antique(BaseModel):
                     self.short_id = candidate
                     break
         if not self.slug:
-            base_slug = slugify(self.title)
-            unique_slug = base_slug
-            counter = 1
-            while Antique.objects.filter(slug=unique_slug).exclude(pk=self.pk).exists():
-                unique_slug = f'{base_slug}-{counter}'
-                counter += 1
-            self.slug = unique_slug
+            self.slug = self._unique_slug(slugify(self.title))
 
         self.is_sold = self.quantity == 0
         super().save(*args, **kwargs)
 
+    def _unique_slug(self, base_slug):
+        """The first free one of base, base-1, base-2, ..., from the taken ones in one query"""
+        others = Antique.objects.exclude(pk=self.pk)
+        if connections[others.db].vendor == 'postgresql':
+            # Both served by the varchar_pattern_ops index Django adds for the unique slug
+            taken = others.filter(Q(slug=base_slug) | Q(slug__startswith=f'{base_slug}-'))
+        else:
+            # SQLite's LIKE ignores case, so can't use the slug's index, but this range can. It's
+            # exactly base and base-*: no slug character sorts below '-'. (Not on PostgreSQL,
+            # where a locale collation doesn't order by code point.)
+            taken = others.filter(slug__gte=base_slug, slug__lt=f'{base_slug}.')
+        taken = set(taken.values_list('slug', flat=True))
+
+        unique_slug = base_slug
+        counter = 1
+        while unique_slug in taken:
+            unique_slug = f'{base_slug}-{counter}'
+            counter += 1
+        return unique_slug
+
+    @staticmethod
+    def refresh_wishlist_counts(antique_ids):
+        """Recount distinct wishlist owners for the given antiques in a single UPDATE ... (SELECT COUNT) query"""
+        antique_ids = list(antique_ids)
+        if not antique_ids:
+            return
+        owners = (
+            Wishlist.antiques.through.objects.filter(antique=OuterRef('pk'), wishlist__owner__isnull=False)
+            .order_by()
+            .values('antique')
+            .annotate(n=Count('wishlist__owner', distinct=True))
+            .values('n')
+        )
+        Antique.objects.filter(pk__in=antique_ids).update(wishlist_count=Coalesce(Subquery(owners), 0))
+
 class AntiqueImage(models.Model):
     antique = models.ForeignKey(
         Antique, 
@@ -78,6 +126,57 @@ class AntiqueImage(models.Model):
     def __str__(self):
         return f"Image for {self.antique.title} ({self.id})"
 
+class AntiqueDailyViews(models.Model):
+    """Views of an antique per day, for seller stats (written by project/viewcounts.py)"""
+    antique = models.ForeignKey(Antique, on_delete=models.CASCADE, related_name='daily_views')
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['antique', 'date'], name='unique_antique_daily_views'),
+        ]
+        verbose_name_plural = 'antique daily views'
+
+    def __str__(self):
+        return f"{self.antique_id} on {self.date}: {self.views}"
+
+class SimilarAntique(models.Model):
+    """The precomputed "you may also like" neighbours of an antique (written by antiques/recommendations.py)"""
+    antique = models.ForeignKey(Antique, on_delete=models.CASCADE, related_name='+')
+    similar = models.ForeignKey(Antique, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also the index the detail page reads the neighbours through, in order
+            models.UniqueConstraint(fields=['antique', 'rank'], name='unique_similar_antique_rank'),
+        ]
+        ordering = ['antique', 'rank']
+
+    def __str__(self):
+        return f"{self.antique_id} -> {self.similar_id} ({self.score:.3f})"
+
+class AntiqueTerm(models.Model):
+    """One term of an antique's TF-IDF vector, as of its last indexing (written by antiques/recommendations.py)"""
+    antique = models.ForeignKey(Antique, on_delete=models.CASCADE, related_name='+')
+    term = models.CharField(max_length=110)  # a word, or "type:" and the type
+    weight = models.FloatField()  # 0 for terms too common to count; the row still counts towards the term's frequency
+
+    class Meta:
+        constraints = [
+            # Also the index an antique's vector is read through
+            models.UniqueConstraint(fields=['antique', 'term'], name='unique_antique_term'),
+        ]
+        indexes = [
+            # The postings: every antique using a term
+            models.Index(fields=['term', 'weight'], name='antique_term_postings_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.antique_id} {self.term} ({self.weight:.3f})"
+
 class Wishlist(BaseModel):
     antiques = models.ManyToManyField(Antique, related_name='wishlists', blank=True)
 
@@ -100,18 +199,13 @@ class DailyPick(models.Model):
         today = timezone.localdate()
         daily_pick, created = DailyPick.objects.get_or_create(date=today)
         if daily_pick.picks.count() == 0:
-            antiques = list(Antique.objects.all().filter(is_sold=False)) # prevents sold antiques from being picked
-            if antiques:
-                daily_pick.picks.set(random.sample(antiques, min(3, len(antiques))))
+            available = Antique.objects.filter(is_sold=False) # prevents sold antiques from being picked
+            if connections[available.db].vendor == 'postgresql':
+                # ORDER BY random() LIMIT 3 in the database: only the picks cross the network
+                picks = list(available.order_by('?').values_list('pk', flat=True)[:3])
+            else:
+                ids = list(available.values_list('pk', flat=True))
+                picks = random.sample(ids, min(3, len(ids)))
+            if picks:
+                daily_pick.picks.set(picks)
         return daily_pick.picks.all()
-
-from django.db.models.signals import pre_delete
-from django.dispatch import receiver
-
-@receiver(pre_delete, sender=Antique)
-def remove_antique_from_m2m(sender, instance, **kwargs): # Prevents integrity error
-    # Remove from wishlists
-    instance.wishlists.clear()
-    # Remove from daily picks
-    for pick in instance.daily_picks.all():
-        pick.picks.remove(instance)
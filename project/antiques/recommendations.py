@@ -0,0 +1,350 @@
+# antiques/recommendations.py
+"""
+"You may also like" recommendations.
+
+Every antique is turned into a sparse TF-IDF vector over its title,
+description, content and type, and its SIMILAR_STORED nearest neighbours by
+cosine similarity are written to SimilarAntique. The detail page then reads
+them back with one indexed query instead of comparing anything per request.
+The vectors are the rows of a SciPy CSR matrix, so weighting, normalising and
+scoring are sparse matrix operations: a block of the similarity matrix is one
+product, and only picking each row's top k is left to a loop.
+
+The vectors are stored too, one AntiqueTerm row per term, and the rows of a
+term are its postings: comparing one antique against the catalog only reads
+the listings that share a term with it, and a term's document frequency is
+its row count. rebuild_similar_antiques() redoes everything (the
+rebuild_recommendations command); update_similar_antiques() reindexes just
+the created, edited or deleted antiques, refreshes the lists they can change
+and runs on the background queue after each save or import batch.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.utils.html import strip_tags
+from scipy import sparse
+
+from project.versions import bump_version
+from .models import Antique, AntiqueImage, AntiqueTerm, SimilarAntique
+
+SIMILAR_STORED = 12  # per antique, so there are still enough left once sold ones are hidden
+SIMILAR_SHOWN = 4
+
+# An updated antique can enter the lists of this many of its closest matches; a list it
+# would only join further down is picked up by the next full rebuild
+CANDIDATE_LISTS = 4 * SIMILAR_STORED
+
+# Title words say more about a piece than the body text, and a shared type counts for a lot
+FIELD_WEIGHTS = {'title': 3, 'description': 1, 'content': 1}
+TYPE_WEIGHT = 3
+
+# Terms in more than this share of listings ("antique", "vintage") are noise; only applied
+# once there are enough listings for the share to mean anything
+MAX_DOC_FREQUENCY = 0.5
+MIN_DOCS_FOR_MAX_DF = 50
+
+MAX_WORD_LENGTH = 40  # longer "words" are URLs and run-together text
+
+SCORE_BLOCK = 1000  # rows of the similarity matrix a full rebuild holds at once
+
+TEXT_FIELDS = ('title', 'description', 'content', 'type_of_antique')
+
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have in is it its of on or that the this
+    to was were with which who will would there their they these those very can all any
+    into our your you we he she his her them than then so such not no
+""".split())
+
+_word = re.compile(r"[a-z0-9]+")
+
+
+def antique_terms(title, description, content, type_of_antique):
+    """Weighted term counts for one antique"""
+    counts = Counter()
+    for field, text in (('title', title), ('description', description), ('content', strip_tags(content or ''))):
+        for word in _word.findall((text or '').lower()):
+            if 1 < len(word) <= MAX_WORD_LENGTH and word not in STOP_WORDS:
+                counts[word] += FIELD_WEIGHTS[field]
+    if type_of_antique:
+        counts[f"type:{type_of_antique.strip().lower()}"] += TYPE_WEIGHT
+    return counts
+
+
+def _idf(doc_freq, total):
+    max_df = MAX_DOC_FREQUENCY * total if total >= MIN_DOCS_FOR_MAX_DF else total
+    # Smoothed idf, as in the usual formulation: log((1 + n) / (1 + df)) + 1
+    return {
+        term: math.log((1 + total) / (1 + df)) + 1
+        for term, df in doc_freq.items()
+        if df <= max_df
+    }
+
+
+def _sparse_rows(vectors, columns):
+    """A CSR matrix with one row per vector ({term: value}), over the terms numbered in `columns`"""
+    indptr, indices, values = [0], [], []
+    for vector in vectors:
+        for term, value in vector.items():
+            indices.append(columns[term])
+            values.append(value)
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.array(values, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int32)),
+        shape=(len(indptr) - 1, len(columns)),
+    )
+
+
+def _tfidf_matrix(documents, idf):
+    """
+    L2-normalised TF-IDF rows for documents ({antique id: Counter of weighted
+    terms}), one column per term of `idf`. Returns (antique ids, terms, matrix).
+    """
+    terms = list(idf)
+    columns = {term: i for i, term in enumerate(terms)}
+    matrix = _sparse_rows(({term: n for term, n in doc.items() if term in columns} for doc in documents.values()), columns)
+    # Sublinear tf, so a word repeated ten times isn't worth ten mentions
+    matrix.data = 1 + np.log(matrix.data)
+    matrix = matrix @ sparse.diags(np.fromiter(idf.values(), dtype=np.float64, count=len(terms)))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1  # rows with no weighted terms stay empty
+    return list(documents), terms, (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def _row_vectors(pks, terms, matrix):
+    """{antique id: {term: weight}} for the non-empty rows of `matrix`"""
+    vectors = {}
+    for i, pk in enumerate(pks):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        if start < end:
+            vectors[pk] = dict(zip([terms[c] for c in matrix.indices[start:end]], matrix.data[start:end].tolist()))
+    return vectors
+
+
+def _top_neighbours(scores, row_pks, column_pks, k):
+    """
+    The `k` best-scoring columns of each row of `scores` (a sparse matrix of
+    cosine similarities), as {row antique: [(antique, score), ...]}, best
+    first and never the antique itself.
+    """
+    scores = scores.tocsr()
+    neighbours = {}
+    for i, pk in enumerate(row_pks):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        columns, values = scores.indices[start:end], scores.data[start:end]
+        if len(values) > k + 1:
+            keep = np.argpartition(-values, k)[:k + 1]  # one more, in case it's `pk` itself
+            columns, values = columns[keep], values[keep]
+        order = np.argsort(-values, kind='stable')
+        best = [
+            (column_pks[column], score)
+            for column, score in zip(columns[order].tolist(), values[order].tolist())
+            if column_pks[column] != pk
+        ]
+        neighbours[pk] = best[:k]
+    return neighbours
+
+
+def _term_rows(documents, vectors):
+    # Every term gets a row, weighted or not, so the row counts stay the document frequencies
+    return [
+        AntiqueTerm(antique_id=pk, term=term, weight=vectors.get(pk, {}).get(term, 0.0))
+        for pk, terms in documents.items()
+        for term in terms
+    ]
+
+
+def _catalog_neighbours(vectors, k):
+    """
+    The `k` nearest stored antiques to each of `vectors` ({antique id: {term:
+    weight}}). Only the postings of their terms are read: an antique sharing
+    none of them scores 0 anyway.
+    """
+    columns = {}
+    for vector in vectors.values():
+        for term in vector:
+            columns.setdefault(term, len(columns))
+    if not columns:
+        return {}
+
+    # The stored vectors cut down to those terms, which leaves their dot products unchanged
+    numbers, rows, cols, weights = {}, [], [], []
+    postings = (
+        AntiqueTerm.objects.filter(term__in=list(columns), weight__gt=0)
+        .values_list('term', 'antique_id', 'weight')
+        .iterator(chunk_size=5000)
+    )
+    for term, pk, w in postings:
+        rows.append(numbers.setdefault(pk, len(numbers)))
+        cols.append(columns[term])
+        weights.append(w)
+    catalog = sparse.csr_matrix((weights, (rows, cols)), shape=(len(numbers), len(columns)))
+    return _top_neighbours(_sparse_rows(vectors.values(), columns) @ catalog.T, list(vectors), list(numbers), k)
+
+
+def _best(scored, k=SIMILAR_STORED):
+    return heapq.nlargest(k, scored, key=itemgetter(1))
+
+
+def stored_vectors(antique_ids):
+    """The stored vectors of these antiques, without the unweighted terms"""
+    vectors = defaultdict(dict)
+    rows = AntiqueTerm.objects.filter(antique_id__in=antique_ids, weight__gt=0).values_list('antique_id', 'term', 'weight')
+    for pk, term, w in rows:
+        vectors[pk][term] = w
+    return vectors
+
+
+def index_antiques(antique_ids):
+    """
+    Replace the stored vectors of these antiques, weighted by the current
+    document frequencies, and return them. Deleted ones just lose their rows.
+    The rest of the catalog keeps the weights it was indexed with; the drift
+    only shifts scores slightly until the next full rebuild.
+    """
+    rows = Antique.objects.filter(pk__in=antique_ids).values_list('pk', *TEXT_FIELDS)
+    documents = {pk: antique_terms(*text) for pk, *text in rows}
+    AntiqueTerm.objects.filter(antique_id__in=antique_ids).delete()
+
+    doc_freq = Counter(term for terms in documents.values() for term in terms)
+    doc_freq.update(dict(
+        AntiqueTerm.objects.filter(term__in=list(doc_freq)).values('term').annotate(n=Count('pk')).values_list('term', 'n')
+    ))
+    vectors = _row_vectors(*_tfidf_matrix(documents, _idf(doc_freq, Antique.objects.count())))
+    AntiqueTerm.objects.bulk_create(_term_rows(documents, vectors), batch_size=1000)
+    return vectors
+
+
+def _write_neighbours(neighbours):
+    """Replace the lists of the antiques in `neighbours` ({antique id: [(antique, score), ...]})"""
+    rows = [
+        SimilarAntique(antique_id=pk, similar_id=other, rank=rank, score=score)
+        for pk, best in neighbours.items()
+        for rank, (other, score) in enumerate(best)
+    ]
+    with transaction.atomic():
+        SimilarAntique.objects.filter(antique_id__in=list(neighbours)).delete()
+        SimilarAntique.objects.bulk_create(rows, batch_size=1000)
+        bump_version('recommendations')
+    return len(rows)
+
+
+def rebuild_similar_antiques():
+    """Reindex the whole catalog and recompute every antique's neighbours. Returns how many rows were written."""
+    rows = Antique.objects.values_list('pk', *TEXT_FIELDS).iterator(chunk_size=2000)
+    documents = {pk: antique_terms(*text) for pk, *text in rows}
+    doc_freq = Counter(term for terms in documents.values() for term in terms)
+    pks, terms, matrix = _tfidf_matrix(documents, _idf(doc_freq, len(documents)))
+    vectors = _row_vectors(pks, terms, matrix)
+
+    # The cosine similarities are matrix @ matrix.T, computed a block of rows at a time
+    neighbours = {}
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(pks), SCORE_BLOCK):
+        block = pks[start:start + SCORE_BLOCK]
+        neighbours.update(_top_neighbours(matrix[start:start + SCORE_BLOCK] @ transposed, block, pks, SIMILAR_STORED))
+
+    with transaction.atomic():
+        AntiqueTerm.objects.all().delete()
+        AntiqueTerm.objects.bulk_create(_term_rows(documents, vectors), batch_size=5000)
+        SimilarAntique.objects.all().delete()
+        written = _write_neighbours({pk: neighbours[pk] for pk in vectors})
+    return written
+
+
+def update_similar_antiques(antique_ids):
+    """
+    Reindex created, edited or deleted antiques and refresh the neighbour
+    lists they can affect: their own, any list they're already in, and any
+    list of their closest matches whose weakest entry they now beat. Only
+    the postings of their terms are read, never the whole catalog.
+    """
+    antique_ids = list(dict.fromkeys(antique_ids))
+    if not antique_ids:
+        return 0
+
+    with transaction.atomic():
+        vectors = index_antiques(antique_ids)
+        # Lists that mention them: the score changed, or the antique is gone
+        mentioned = set(
+            SimilarAntique.objects.filter(similar_id__in=antique_ids)
+            .exclude(antique_id__in=antique_ids)
+            .values_list('antique_id', flat=True)
+        )
+        vectors.update(stored_vectors(mentioned))
+        neighbours = _catalog_neighbours(vectors, CANDIDATE_LISTS)
+        written = _write_neighbours({pk: neighbours.get(pk, [])[:SIMILAR_STORED] for pk in [*antique_ids, *mentioned]})
+
+        # Lists they should now get into: {list owner: {updated antique: score}}
+        refreshed = {*antique_ids, *mentioned}
+        offers = defaultdict(dict)
+        for pk in antique_ids:
+            for other, score in neighbours.get(pk, []):
+                if other not in refreshed:
+                    offers[other][pk] = score
+        written += _offer_neighbours(offers)
+    return written
+
+
+def _offer_neighbours(offers):
+    """Merge new (antique, score) entries into the lists that have room for them or a weaker entry"""
+    if not offers:
+        return 0
+    current = {
+        row['antique_id']: row
+        for row in SimilarAntique.objects.filter(antique_id__in=list(offers))
+        .values('antique_id')
+        .annotate(n=Count('pk'), weakest=Min('score'))
+    }
+    changed = [
+        pk for pk, offered in offers.items()
+        if pk not in current
+        or current[pk]['n'] < SIMILAR_STORED
+        or max(offered.values()) > current[pk]['weakest']
+    ]
+    if not changed:
+        return 0
+
+    lists = defaultdict(list)
+    for pk, similar_id, score in SimilarAntique.objects.filter(antique_id__in=changed).values_list(
+        'antique_id', 'similar_id', 'score'
+    ):
+        lists[pk].append((similar_id, score))
+    rows = [
+        SimilarAntique(antique_id=pk, similar_id=other, rank=rank, score=score)
+        for pk in changed
+        for rank, (other, score) in enumerate(_best([*lists[pk], *offers[pk].items()]))
+    ]
+    with transaction.atomic():
+        SimilarAntique.objects.filter(antique_id__in=changed).delete()
+        SimilarAntique.objects.bulk_create(rows, batch_size=1000)
+        bump_version('recommendations')
+    return len(rows)
+
+
+def refresh_neighbour_lists(antique_ids):
+    """Recompute just these antiques' own lists, e.g. ones that pointed at deleted antiques"""
+    antique_ids = list(antique_ids)
+    if not antique_ids:
+        return 0
+    neighbours = _catalog_neighbours(stored_vectors(antique_ids), SIMILAR_STORED)
+    return _write_neighbours({pk: neighbours.get(pk, []) for pk in antique_ids})
+
+
+def similar_antiques(antique, limit=SIMILAR_SHOWN):
+    """The unsold neighbours of `antique`, best first, with a `cover_url` each - one query"""
+    cover_image = AntiqueImage.objects.filter(antique=OuterRef('pk')).order_by('pk').values('image')[:1]
+    similar = list(
+        Antique.objects.filter(similar_to__antique=antique, is_sold=False)
+        .annotate(cover_image=Subquery(cover_image))
+        .order_by('similar_to__rank')[:limit]
+    )
+    storage = AntiqueImage.image.field.storage
+    for other in similar:
+        other.cover_url = storage.url(other.cover_image) if other.cover_image else None
+    return similar
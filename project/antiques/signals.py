@@ -0,0 +1,109 @@
+# antiques/signals.py
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from project.tasks import enqueue
+from project.versions import bump_version
+from .deletion import detach_antiques, in_bulk_delete
+from .models import Antique, AntiqueImage, DailyPick, Wishlist
+from .recommendations import TEXT_FIELDS, update_similar_antiques
+
+# ------------------------------
+# Content versions (ETags / cache keys)
+# ------------------------------
+
+@receiver(post_save, sender=Antique)
+@receiver(post_delete, sender=Antique)
+def bump_catalog_version(sender, **kwargs):
+    if not in_bulk_delete():  # delete_antiques() bumps once per batch
+        bump_version('catalog')
+
+@receiver(post_save, sender=AntiqueImage)
+@receiver(post_delete, sender=AntiqueImage)
+def touch_antique_on_image_change(sender, instance, **kwargs):
+    # Images cascading away with their antique(s) don't need the parent touched
+    origin = kwargs.get('origin')
+    if isinstance(origin, Antique) or getattr(origin, 'model', None) is Antique:
+        return
+    # Bump the parent's updated_at so Last-Modified/ETag on the detail page follow the image set
+    Antique.objects.filter(pk=instance.antique_id).update(updated_at=timezone.now())
+    bump_version('catalog')
+
+@receiver(post_save, sender=DailyPick)
+@receiver(post_delete, sender=DailyPick)
+def bump_picks_version(sender, **kwargs):
+    bump_version('picks')
+
+@receiver(m2m_changed, sender=DailyPick.picks.through)
+def bump_picks_version_on_m2m(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version('picks')
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def bump_wishlist_version(sender, instance, **kwargs):
+    bump_version(f"wishlists:{instance.owner_id}")
+
+@receiver(m2m_changed, sender=Wishlist.antiques.through)
+def bump_wishlist_version_on_m2m(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # antique.wishlists.clear() etc. - we don't know which owners, so bump all of them
+        owners = Wishlist.objects.filter(pk__in=kwargs.get('pk_set') or []).values_list('owner_id', flat=True)
+        bump_version(*{f"wishlists:{owner_id}" for owner_id in owners})
+    else:
+        bump_version(f"wishlists:{instance.owner_id}")
+
+# ------------------------------
+# Deleting antiques
+# ------------------------------
+
+@receiver(pre_delete, sender=Antique)
+def remove_antique_from_m2m(sender, instance, **kwargs):
+    # Set-based, without the m2m_changed round per wishlist/pick; delete_antiques() does whole batches itself
+    if not in_bulk_delete():
+        detach_antiques([instance.pk])
+
+# ------------------------------
+# Wishlist popularity counters (Antique.wishlist_count)
+# ------------------------------
+
+def refresh_popularity(antique_ids):
+    Antique.refresh_wishlist_counts(antique_ids)
+    bump_version('popularity')
+
+@receiver(m2m_changed, sender=Wishlist.antiques.through)
+def update_wishlist_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # antique.wishlists.add()/remove()/clear()
+        if action.startswith('post_'):
+            refresh_popularity([instance.pk])
+    elif action == 'pre_clear':
+        # pk_set is None for clear(), so note what's in the wishlist before it goes
+        instance._cleared_antique_ids = list(instance.antiques.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_popularity(getattr(instance, '_cleared_antique_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        refresh_popularity(pk_set or [])
+
+@receiver(pre_delete, sender=Wishlist)
+def note_deleted_wishlist_antiques(sender, instance, **kwargs):
+    # The cascade deletes the through rows without sending m2m_changed
+    instance._deleted_antique_ids = list(instance.antiques.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Wishlist)
+def update_wishlist_counts_on_delete(sender, instance, **kwargs):
+    refresh_popularity(getattr(instance, '_deleted_antique_ids', []))
+
+# ------------------------------
+# "You may also like" (SimilarAntique)
+# ------------------------------
+
+@receiver(post_save, sender=Antique)
+def update_recommendations(sender, instance, created, update_fields=None, **kwargs):
+    # Saves that can't change the text (Stripe ids, counters) leave the neighbours alone
+    if created or update_fields is None or set(update_fields) & set(TEXT_FIELDS):
+        enqueue(update_similar_antiques, [instance.pk])
@@ -0,0 +1,182 @@
+# antiques/snapshot.py
+"""
+In-process catalog snapshot.
+
+The listing metadata of every antique (id, price, type, sold flag, seller,
+created_at) is small enough to keep in each worker, so filtering and paging
+the newest-first catalog doesn't need to touch the table. Each column is a
+NumPy array, with types as integer codes. The newest-first order is computed
+once per snapshot, as position arrays for all, sold and unsold antiques and
+for each type within those, so the catalog's own filters pick a precomputed
+array and a page is a slice of it. The API's other filters are boolean masks
+over the picked array, so a query never loops over antiques in Python.
+
+When the 'catalog' content version changes, the snapshot is rebuilt (one
+values_list query) on the background queue; until it's ready, callers get
+None and go to the database, so nothing built from the old rows is stored or
+tagged under the new version. Wishlist counts aren't in it: they change with
+every wishlist edit, so the most-wanted order comes from its index instead.
+Set CATALOG_SNAPSHOT=false to go to the database for everything.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from project.tasks import enqueue
+from project.versions import get_versions
+from .models import Antique
+
+VERSION_MAX_AGE = 1  # seconds a worker trusts its copy of the versions
+REFRESH_RETRY = 60  # seconds before a refresh that never ran (rolled back, worker died) is queued again
+
+_snapshot = None
+_refresh_queued_at = None
+_lock = threading.Lock()
+
+
+class CatalogSnapshot:
+    def __init__(self, rows, version):
+        self.version = version
+        ids, prices, types, sold, sellers, created = [], [], [], [], [], []
+        self._type_codes = {}
+        for pk, price, type_of_antique, is_sold, seller_id, created_at in rows:
+            ids.append(pk)
+            prices.append(price)
+            types.append(self._type_codes.setdefault(type_of_antique, len(self._type_codes)))
+            sold.append(is_sold)
+            sellers.append(seller_id or 0)  # 0 when the antique has no seller
+            created.append(created_at.timestamp())
+        self.type_names = sorted(self._type_codes, key=self._type_codes.get)
+
+        self.ids = np.array(ids, dtype=object)  # UUIDs
+        self.prices = np.array(prices, dtype=np.float64)
+        self.types = np.array(types, dtype=np.int32)
+        self.sold = np.array(sold, dtype=bool)
+        self.sellers = np.array(sellers, dtype=np.int64)
+        self.created = np.array(created, dtype=np.float64)
+        # The ids' hex, which orders like the UUIDs do (and like the database does)
+        self._keys = np.array([pk.hex for pk in ids], dtype='<U32')
+
+        # Same order as the database path: -created_at, -id
+        newest = np.lexsort((self._keys, self.created))[::-1].astype(np.int32)
+        # Positions in that order, keyed by sold flag (None: all) and by (sold flag, type code)
+        self._listings = {None: newest, False: newest[~self.sold[newest]], True: newest[self.sold[newest]]}
+        self._type_listings = {}
+        for listing_sold, positions in self._listings.items():
+            # A stable sort by type keeps each type's run in newest-first order
+            by_type = positions[np.argsort(self.types[positions], kind='stable')]
+            codes = self.types[by_type]
+            bounds = np.searchsorted(codes, np.arange(len(self.type_names) + 1))
+            for code, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+                if start < end:
+                    self._type_listings[listing_sold, code] = by_type[start:end]
+        self._types_for = {
+            sold: sorted(self.type_names[code] for listing_sold, code in self._type_listings if listing_sold == sold)
+            for sold in self._listings
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _positions(self, sold=None, type=None):
+        if type is None:
+            return self._listings[sold]
+        return self._type_listings.get((sold, self._type_codes.get(type)), np.empty(0, dtype=np.int32))
+
+    def listing(self, sold=None, type=None):
+        """The (un)sold antiques of `type`, newest first, as ids a Paginator can count and slice"""
+        return IdList(self.ids, self._positions(sold, type))
+
+    def query(self, sold=None, type=None, min_price=None, max_price=None, seller=None,
+              after=None, offset=0, limit=None):
+        """
+        Ids of the matching antiques, newest first, skipping `offset` of them
+        and stopping after `limit`. `after` is a (created_at, id) cursor: only
+        antiques strictly older than it are returned.
+        """
+        positions = self._positions(sold, type)
+        if after is not None:
+            created_at, last_id = after[0].timestamp(), after[1].hex
+            created = self.created[positions]
+            older = created < created_at
+            ties = np.flatnonzero(created == created_at)
+            older[ties] = self._keys[positions[ties]] < last_id
+            positions = positions[older]
+
+        mask = np.ones(len(positions), dtype=bool)
+        if min_price is not None:
+            mask &= self.prices[positions] >= float(min_price)
+        if max_price is not None:
+            mask &= self.prices[positions] <= float(max_price)
+        if seller is not None:
+            mask &= self.sellers[positions] == seller
+        if not mask.all():
+            positions = positions[mask]
+
+        return self.ids[positions[offset:None if limit is None else offset + limit]].tolist()
+
+    def types_for(self, sold=None):
+        """Sorted distinct types among the (un)sold antiques"""
+        return self._types_for[sold]
+
+
+class IdList:
+    """The ids at `positions`, counted and sliced without building the whole list"""
+
+    def __init__(self, ids, positions):
+        self._ids = ids
+        self._positions = positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._ids[self._positions[index]].tolist()
+        return self._ids[self._positions[index]]
+
+
+def build_snapshot(version):
+    rows = Antique.objects.values_list(
+        'pk', 'price', 'type_of_antique', 'is_sold', 'seller_id', 'created_at',
+    ).iterator(chunk_size=5000)
+    return CatalogSnapshot(rows, version)
+
+
+def refresh_snapshot():
+    """Build the snapshot for the current catalog version, unless this worker already has it"""
+    global _snapshot, _refresh_queued_at
+    try:
+        # The version is read before the rows, so a snapshot is never older than its label
+        version = get_versions('catalog')['catalog']
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = build_snapshot(version)
+    finally:
+        with _lock:
+            _refresh_queued_at = None
+
+
+def get_catalog_snapshot():
+    """This worker's snapshot for the current catalog, or None when disabled or not built yet"""
+    global _refresh_queued_at
+    if not settings.CATALOG_SNAPSHOT:
+        return None
+
+    version = get_versions('catalog', max_age=VERSION_MAX_AGE)['catalog']
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    # Never rebuilt in the request: one refresh at a time on the background queue
+    with _lock:
+        if _refresh_queued_at is None or time.time() - _refresh_queued_at > REFRESH_RETRY:
+            _refresh_queued_at = time.time()
+            enqueue(refresh_snapshot)
+    return None
+
+
+def fetch_in_order(ids, queryset=None):
+    """The antiques for `ids`, in that order, with one in_bulk query (on `queryset` if given)"""
+    antiques = (Antique.objects if queryset is None else queryset).in_bulk(ids)
+    return [antiques[pk] for pk in ids if pk in antiques]
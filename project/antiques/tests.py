@@ -1,3 +1,344 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from antiques.deletion import delete_antiques
+from antiques.management.commands.import_antiques import Command as ImportCommand
+from antiques.models import Antique, AntiqueImage, AntiqueTerm, SimilarAntique, Wishlist
+from antiques.recommendations import rebuild_similar_antiques, update_similar_antiques
+from antiques import snapshot as catalog_snapshot
+from antiques.snapshot import build_snapshot, get_catalog_snapshot, refresh_snapshot
+from payments.models import OrderItem
+from project import versions
+from project.caching import tiered_cache
+from project.versions import bump_version
+from project.testing import Catalog, QueryBudgetTestCase, TemporaryMediaTestCase
+
+
+def detail_args(catalog):
+    return [catalog.antique.short_id, catalog.antique.slug]
+
+
+def every_antique_in_wishlist(catalog):
+    return {'antique_ids': [a.pk for a in catalog.antiques], 'wishlist_ids': [catalog.wishlist.pk]}
+
+
+class CatalogQueryBudgets(QueryBudgetTestCase):
+    # Cold runs go to the database: the catalog snapshot is only built on the background queue
+    def test_view_antiques(self):
+        self.assertQueryBudget(3, 'antiques:view_antiques')
+
+    def test_view_antiques_logged_in(self):
+        self.assertQueryBudget(7, 'antiques:view_antiques', user='buyer')
+
+    def test_antique_detail(self):
+        self.assertQueryBudget(9, 'antiques:antique_detail', args=detail_args)
+
+    def test_antique_detail_logged_in(self):
+        self.assertQueryBudget(13, 'antiques:antique_detail', args=detail_args, user='buyer')
+
+    def test_export_antiques(self):
+        self.assertQueryBudget(3, 'antiques:export_antiques', user='superuser')
+
+
+class SellerQueryBudgets(QueryBudgetTestCase):
+    def test_create_antique(self):
+        self.assertQueryBudget(2, 'antiques:create_antique', user='seller_user')
+
+    def test_edit_antique(self):
+        self.assertQueryBudget(3, 'antiques:edit_antique', args=lambda c: [c.antique.slug], user='seller_user')
+
+    def test_delete_antique(self):
+        self.assertQueryBudget(23, 'antiques:delete_antique', args=lambda c: [c.antique.slug],
+                               user='seller_user', method='post', status=302)
+
+    def test_seller_inventory(self):
+        self.assertQueryBudget(5, 'antiques:seller_inventory', user='seller_user')
+
+    def test_export_inventory(self):
+        self.assertQueryBudget(4, 'antiques:export_inventory', user='seller_user')
+
+
+class WishlistQueryBudgets(QueryBudgetTestCase):
+    def test_add_to_wishlist(self):
+        # Includes the SAVEPOINT and RELEASE of its write transaction (project/sqlite.py)
+        self.assertQueryBudget(
+            7, 'antiques:add_to_wishlist', user='buyer', method='post',
+            data=lambda c: {'antique_id': c.antiques[-1].pk, 'wishlist_id': c.wishlist.pk},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+    def test_wishlists(self):
+        self.assertQueryBudget(4, 'antiques:wishlists', user='buyer')
+
+    def test_bulk_add_to_wishlists(self):
+        # Includes the SAVEPOINT and RELEASE of its write transaction (project/sqlite.py)
+        self.assertQueryBudget(8, 'antiques:bulk_add_to_wishlists', user='buyer', method='post',
+                               data=every_antique_in_wishlist)
+
+    def test_bulk_remove_from_wishlists(self):
+        # Includes the SAVEPOINT and RELEASE of its write transaction (project/sqlite.py)
+        self.assertQueryBudget(8, 'antiques:bulk_remove_from_wishlists', user='buyer', method='post',
+                               data=every_antique_in_wishlist)
+
+    def test_wishlist_detail(self):
+        self.assertQueryBudget(6, 'antiques:wishlist_detail', args=lambda c: [c.wishlist.pk], user='buyer')
+
+    def test_delete_wishlist(self):
+        self.assertQueryBudget(7, 'antiques:delete_wishlist', args=lambda c: [c.wishlist.pk], user='buyer',
+                               method='post', status=302)
+
+    def test_create_wishlist(self):
+        self.assertQueryBudget(2, 'antiques:create_wishlist', user='buyer')
+
+    def test_edit_wishlist(self):
+        self.assertQueryBudget(4, 'antiques:edit_wishlist', args=lambda c: [c.wishlist.pk], user='buyer')
+
+
+class BulkWishlistTests(TemporaryMediaTestCase):
+    def test_a_failed_count_update_rolls_back_the_rows(self):
+        catalog = Catalog(12)
+        Wishlist.antiques.through.objects.all().delete()
+        self.client.force_login(catalog.buyer)
+        with mock.patch.object(Antique, 'refresh_wishlist_counts', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(reverse('antiques:bulk_add_to_wishlists'), every_antique_in_wishlist(catalog))
+        self.assertFalse(Wishlist.antiques.through.objects.exists())
+
+
+class DeletionTests(TemporaryMediaTestCase):
+    def test_ordered_antiques_are_kept_for_the_order_history(self):
+        Catalog(12)
+        ordered = set(OrderItem.objects.values_list('antique_id', flat=True))
+        self.assertTrue(ordered)
+        items = OrderItem.objects.count()
+
+        deleted = delete_antiques(Antique.objects.all())
+        self.assertEqual(deleted, 12 - len(ordered))
+        self.assertEqual(set(Antique.objects.values_list('pk', flat=True)), ordered)
+        self.assertEqual(OrderItem.objects.count(), items)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+        media = override_settings(MEDIA_ROOT=os.path.join(self.workdir, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+        self.seller = Catalog(12).seller
+
+        self.images_dir = os.path.join(self.workdir, 'images')
+        os.mkdir(self.images_dir)
+        with open(os.path.join(self.images_dir, 'chair.jpg'), 'wb') as f:
+            f.write(b'not really a jpeg')
+        self.path = os.path.join(self.workdir, 'antiques.csv')
+        with open(self.path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, ['title', 'price', 'type_of_antique', 'quantity', 'images'])
+            writer.writeheader()
+            for i in range(3):
+                writer.writerow({'title': f"Imported chair {i}", 'price': '10', 'type_of_antique': 'Chair',
+                                 'quantity': '1', 'images': 'chair.jpg'})
+
+    def run_import(self):
+        call_command('import_antiques', self.path, seller=str(self.seller.pk), batch_size=2, skip_stripe=True,
+                     images_dir=self.images_dir, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def imported(self):
+        return Antique.objects.filter(title__startswith="Imported chair")
+
+    def test_resume_after_a_crash_before_the_checkpoint_skips_the_committed_batch(self):
+        write_checkpoint = ImportCommand._write_checkpoint
+
+        def crash_after_first_batch(command, data):
+            if data.get('rows_done') == 2:
+                raise KeyboardInterrupt  # the batch committed, its checkpoint never got written
+            write_checkpoint(command, data)
+
+        with mock.patch.object(ImportCommand, '_write_checkpoint', crash_after_first_batch), \
+                self.assertRaises(KeyboardInterrupt):
+            self.run_import()
+        self.assertEqual(self.imported().count(), 2)
+
+        self.run_import()
+        self.assertEqual(
+            sorted(self.imported().values_list('title', flat=True)),
+            ["Imported chair 0", "Imported chair 1", "Imported chair 2"],
+        )
+
+    def test_short_ids_count_up_and_slugs_are_checked_without_a_query_per_row(self):
+        with open(self.path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, ['title', 'price', 'type_of_antique', 'quantity', 'slug'])
+            writer.writeheader()
+            for i, slug in enumerate([self.seller_antique_slug(), 'imported-chair-a', 'imported-chair-b']):
+                writer.writerow({'title': f"Imported chair {i}", 'price': '10', 'type_of_antique': 'Chair',
+                                 'quantity': '1', 'slug': slug})
+        highest = max(Antique.objects.values_list('short_id', flat=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import()
+        self.assertFalse([query for query in queries if '"antiques_antique"."slug" =' in query['sql']])
+        self.assertEqual(
+            sorted(self.imported().values_list('slug', 'short_id')),
+            [('imported-chair-a', max(highest, 99999) + 1), ('imported-chair-b', max(highest, 99999) + 2)],
+        )
+
+    def seller_antique_slug(self):
+        return Antique.objects.filter(seller=self.seller).values_list('slug', flat=True).first()
+
+    def test_rolled_back_batch_deletes_its_images(self):
+        with mock.patch.object(AntiqueImage.objects, 'bulk_create', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.run_import()
+        self.assertFalse(self.imported().exists())
+        self.assertEqual(os.listdir(os.path.join(self.workdir, 'media', 'antiques')), ['seed-placeholder.jpg'])
+
+
+class CatalogCacheTests(TestCase):
+    def test_wishlist_counts_revalidate_the_default_sort(self):
+        # Every card shows its wishlist count, whatever the order
+        etag = self.client.get(reverse('antiques:view_antiques'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version('popularity')
+        response = self.client.get(reverse('antiques:view_antiques'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_seller_changes_revalidate_the_detail_page_by_date(self):
+        antique = Antique.objects.create(title="Oak desk", type_of_antique="Desk", price=1, stripe_product_id='prod_test')
+        url = reverse('antiques:antique_detail', args=[antique.short_id, antique.slug])
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # A client sending only If-Modified-Since must still see the seller's new details
+        with mock.patch('project.versions.time.time', return_value=antique.updated_at.timestamp() + 60), \
+                self.captureOnCommitCallbacks(execute=True):
+            bump_version('sellers')
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+
+class CatalogSnapshotTests(TemporaryMediaTestCase):
+    def setUp(self):
+        self.catalog = Catalog(40)
+        patcher = mock.patch.multiple(catalog_snapshot, _snapshot=None, _refresh_queued_at=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def listing(self, snapshot, **params):
+        """Every page of the catalog for `params`, as pks"""
+        cache.clear()
+        tiered_cache.clear_local()
+        versions._seen.clear()
+        self.client.force_login(self.catalog.buyer)  # no page cache shared between the two settings
+        pks, number = [], 1
+        # Small pages, so the 40 antiques span several
+        with override_settings(CATALOG_SNAPSHOT=snapshot), mock.patch('antiques.views.CATALOG_PAGE_SIZE', 7):
+            if snapshot:
+                refresh_snapshot()  # what the background queue would do
+                self.assertIsNotNone(get_catalog_snapshot())
+            while True:
+                response = self.client.get(reverse('antiques:view_antiques'), {**params, 'page': number})
+                pks += [antique.pk for antique in response.context['antiques']]
+                self.assertLessEqual(len(response.context['antiques']), 7)
+                if not response.context['page'].has_next():
+                    return pks
+                number += 1
+
+    def test_catalog_pages_match_the_database(self):
+        antique_type = self.catalog.antique.type_of_antique
+        for params in ({}, {'show_sold': 'true'}, {'sort': 'most_wanted'}, {'sort': 'most_wanted', 'show_sold': 'true'},
+                       {'type': antique_type}, {'type': antique_type, 'show_sold': 'true'}, {'type': 'No such type'}):
+            with self.subTest(**params):
+                expected = self.listing(False, **params)
+                self.assertEqual(self.listing(True, **params), expected)
+                if params.get('type') != 'No such type':
+                    self.assertTrue(expected)
+
+    def test_query_matches_the_database(self):
+        snapshot = build_snapshot(version=None)
+        newest = Antique.objects.order_by('-created_at', '-id')
+        cursor = newest[10]
+        cases = [
+            ({}, Q()),
+            ({'sold': False}, Q(is_sold=False)),
+            ({'sold': True, 'type': self.catalog.antique.type_of_antique},
+             Q(is_sold=True, type_of_antique=self.catalog.antique.type_of_antique)),
+            ({'min_price': 500, 'max_price': 3000}, Q(price__gte=500, price__lte=3000)),
+            ({'seller': self.catalog.seller.pk, 'sold': False}, Q(seller=self.catalog.seller, is_sold=False)),
+            ({'after': (cursor.created_at, cursor.pk), 'min_price': 500},
+             (Q(created_at__lt=cursor.created_at) | Q(created_at=cursor.created_at, id__lt=cursor.pk))
+             & Q(price__gte=500)),
+        ]
+        for filters, q in cases:
+            with self.subTest(**filters):
+                expected = list(newest.filter(q).values_list('pk', flat=True))
+                self.assertEqual(snapshot.query(**filters), expected)
+                self.assertEqual(snapshot.query(**filters, offset=3, limit=5), expected[3:8])
+
+    def test_a_stale_snapshot_is_rebuilt_in_the_background(self):
+        refresh_snapshot()
+        built = get_catalog_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version('catalog')
+
+        with mock.patch('antiques.snapshot.enqueue') as enqueue:
+            # The database answers until the rebuild has run, and it's only queued once
+            self.assertIsNone(get_catalog_snapshot())
+            self.assertIsNone(get_catalog_snapshot())
+        enqueue.assert_called_once_with(refresh_snapshot)
+
+        refresh_snapshot()
+        rebuilt = get_catalog_snapshot()
+        self.assertIsNotNone(rebuilt)
+        self.assertNotEqual(rebuilt.version, built.version)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.desk = self.create_antique("Victorian oak writing desk", "Desk")
+        self.lamp = self.create_antique("Art deco brass table lamp", "Lamp")
+        for title, antique_type in (("Edwardian mahogany dining chair", "Chair"), ("Georgian silver tea set", "Silver"),
+                                    ("Victorian pine chest of drawers", "Cabinet")):
+            self.create_antique(title, antique_type)
+        rebuild_similar_antiques()
+
+    def create_antique(self, title, antique_type):
+        # With a Stripe product already, so saving doesn't create one
+        return Antique.objects.create(title=title, type_of_antique=antique_type, price=1, stripe_product_id='prod_test')
+
+    def neighbours(self, antique):
+        return list(SimilarAntique.objects.filter(antique=antique).values_list('similar_id', flat=True))
+
+    def stored_terms(self):
+        return sorted(AntiqueTerm.objects.values_list('antique_id', 'term'))
+
+    def test_update_reads_only_the_changed_antiques(self):
+        bureau = self.create_antique("Victorian oak bureau desk", "Desk")
+        with CaptureQueriesContext(connection) as queries:
+            update_similar_antiques([bureau.pk])
+        text_reads = [query for query in queries if '"antiques_antique"."description"' in query['sql']]
+        self.assertEqual(len(text_reads), 1)
+        self.assertEqual(self.neighbours(bureau)[0], self.desk.pk)
+        self.assertEqual(self.neighbours(self.desk)[0], bureau.pk)
+
+        # An edit moves it out of the lists it no longer belongs at the top of
+        bureau.title, bureau.type_of_antique = "Art deco brass floor lamp", "Lamp"
+        bureau.save()
+        update_similar_antiques([bureau.pk])
+        self.assertEqual(self.neighbours(bureau)[0], self.lamp.pk)
+        self.assertNotEqual(self.neighbours(self.desk)[0], bureau.pk)
+
+        terms = self.stored_terms()
+        rebuild_similar_antiques()
+        self.assertEqual(self.stored_terms(), terms)
@@ -7,11 +7,16 @@ urlpatterns = [
     path('view/', views.view_antiques, name='view_antiques'),
     path("antiques/<int:short_id>-<slug:slug>/", views.antique_detail, name="antique_detail"),
     path('antiques/new/', views.antique_form, name='create_antique'),
+    path('inventory/', views.seller_inventory, name='seller_inventory'),
+    path('inventory/export/', views.export_inventory, name='export_inventory'),
+    path('export/', views.export_antiques, name='export_antiques'),
     path('antiques/<slug:slug>/', views.antique_form, name='edit_antique'),
     path('antiques/delete/<slug:slug>/', views.antique_delete, name='delete_antique'),
 
     path('add/', views.add_to_wishlist, name='add_to_wishlist'),  # New URL pattern for adding to wishlist
     path('wishlists/', views.wishlists, name='wishlists'),
+    path('wishlists/bulk/add/', views.bulk_add_to_wishlists, name='bulk_add_to_wishlists'),
+    path('wishlists/bulk/remove/', views.bulk_remove_from_wishlists, name='bulk_remove_from_wishlists'),
     path('wishlists/<uuid:pk>/', views.wishlist_detail, name='wishlist_detail'),
     path('wishlists/delete/<uuid:pk>/', views.delete_wishlist, name='delete_wishlist'),
     path('wishlists/form/', views.wishlist_form, name='create_wishlist'),
@@ -2,82 +2,238 @@
 
 from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Antique, Wishlist, AntiqueImage, DailyPick
-from .forms import AntiqueForm, WishlistForm
+from .models import Antique, AntiqueDailyViews, Wishlist, AntiqueImage, DailyPick
+from .forms import AntiqueForm, InventoryRowForm, WishlistForm
+from accounts.models import Seller
+from payments.tasks import update_stripe_price
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition, require_POST
 from project.generic_functions import _generic_form_view, _generic_delete, random_text
+from project.caching import cache_anonymous_page, tiered_cache
+from project.exports import export_response, get_export_format
+from project.replicas import use_replica
+from project.sqlite import write_transaction
+from project.tasks import enqueue
+from project.versions import bump_version, get_versions, wishlist_version_name
+from project.viewcounts import count_views
+from service.utils import only_superuser
+from .deletion import delete_antiques
+from .recommendations import similar_antiques
+from .exports import ANTIQUE_EXPORT_FIELDS, antique_export_rows
+from .snapshot import fetch_in_order, get_catalog_snapshot
 from django.conf import settings
-import stripe
+from datetime import datetime, timezone as dt_timezone
+import hashlib
+import logging
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
+
+def get_wishlist_state(user):
+    """
+    The user's wishlists (newest first, as (id, title)) and which antiques each
+    one holds, loaded in two small queries and cached until the user's wishlist
+    version is bumped by a signal or a bulk operation.
+    """
+    def load():
+        wishlists = list(Wishlist.objects.filter(owner=user).order_by('-created_at').values_list('id', 'title'))
+        membership = {}
+        for antique_id, wishlist_id in Wishlist.antiques.through.objects.filter(
+            wishlist__owner=user
+        ).values_list('antique_id', 'wishlist_id'):
+            membership.setdefault(antique_id, set()).add(wishlist_id)
+        return wishlists, membership
+
+    return tiered_cache.get_or_set(f"wishlists:{user.pk}", load, versions=(wishlist_version_name(user),))
 
 def get_wishlists(user):
     if user.is_authenticated:
-        return Wishlist.objects.filter(owner=user).order_by('-created_at')[:5]
+        return [{'id': pk, 'title': title} for pk, title in get_wishlist_state(user)[0][:5]]
     return []
 
+def get_wishlist_membership(user, antique_ids):
+    """{antique_id: set of wishlist ids} for the given antiques that are in any of the user's wishlists"""
+    if not user.is_authenticated:
+        return {}
+    membership = get_wishlist_state(user)[1]
+    return {pk: membership[pk] for pk in antique_ids if pk in membership}
+
+# ------------------------------
+# Conditional GET (ETag / Last-Modified)
+# ------------------------------
+
+def viewer_key(request):
+    # Logged-in pages differ per user (nav, wishlists modal) and embed a CSRF token derived from
+    # the CSRF secret. get_token() makes sure the secret exists now, before the template asks.
+    # Anonymous pages render no CSRF token, which is also what lets them be page-cached.
+    if not request.user.is_authenticated:
+        return "anonymous"
+    get_token(request)
+    return f"{request.user.pk}|{request.META['CSRF_COOKIE']}"
+
+def make_etag(*parts):
+    return hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+
+CATALOG_SORTS = {
+    'newest': ('-created_at', '-id'),  # antique_newest_idx, or antique_available_newest_idx
+    'most_wanted': ('-wishlist_count', '-created_at', '-id'),  # antique_most_wanted_idx
+}
+CATALOG_PAGE_SIZE = 24
+
+def catalog_sort(request):
+    sort = request.GET.get('sort')
+    return sort if sort in CATALOG_SORTS else 'newest'
+
+def filters_query(request):
+    """The request's query string without `page`, for the pagination links"""
+    query = request.GET.copy()
+    query.pop('page', None)
+    return query.urlencode()
+
+def catalog_versions(request):
+    # Memoized on the request so the etag and last_modified funcs share one cache read
+    if not hasattr(request, '_catalog_versions'):
+        # 'popularity' for every sort: each card shows its wishlist count, not just the most-wanted order
+        request._catalog_versions = get_versions('catalog', 'popularity', wishlist_version_name(request.user))
+    return request._catalog_versions
+
+def view_antiques_etag(request):
+    versions = catalog_versions(request)
+    return make_etag(*versions.values(), request.GET.urlencode(), viewer_key(request))
+
+def view_antiques_last_modified(request):
+    versions = catalog_versions(request)
+    latest = max(versions['catalog'], versions['popularity'])
+    return datetime.fromtimestamp(latest, tz=dt_timezone.utc)
+
+def antique_version(request, short_id, slug):
+    """(updated_at, image_count, last_image_id) for the detail page, or None if it doesn't exist"""
+    if not hasattr(request, '_antique_version'):
+        request._antique_version = (
+            Antique.objects.filter(short_id=short_id, slug=slug)
+            .values('pk')
+            .annotate(image_count=Count('images'), last_image=Max('images__id'))
+            .values_list('updated_at', 'image_count', 'last_image')
+            .first()
+        )
+    return request._antique_version
+
+def antique_detail_versions(request):
+    # Memoized on the request so the etag and last_modified funcs share one cache read
+    if not hasattr(request, '_antique_detail_versions'):
+        request._antique_detail_versions = get_versions('sellers', 'recommendations', wishlist_version_name(request.user))
+    return request._antique_detail_versions
+
+def antique_detail_etag(request, short_id, slug):
+    version = antique_version(request, short_id, slug)
+    if version is None:
+        return None
+    return make_etag(*version, *antique_detail_versions(request).values(), viewer_key(request))
+
+def antique_detail_last_modified(request, short_id, slug):
+    # The latest of the antique's own changes (images touch updated_at) and everything else the ETag covers
+    version = antique_version(request, short_id, slug)
+    if version is None:
+        return None
+    latest = max(version[0].timestamp(), *antique_detail_versions(request).values())
+    return datetime.fromtimestamp(latest, tz=dt_timezone.utc)
+
+
+@use_replica
+@condition(etag_func=view_antiques_etag, last_modified_func=view_antiques_last_modified)
+@cache_anonymous_page('catalog', 'popularity')
 def view_antiques(request):
     show_sold = request.GET.get('show_sold') == 'true'
+    sort = catalog_sort(request)
+    antique_type = request.GET.get('type') or None
+    search = request.GET.get('search', '').strip()
+
+    # Each card's first image comes with its row, so a cold card cache doesn't query per card
+    cards = Antique.objects.annotate(cover_image=Subquery(
+        AntiqueImage.objects.filter(antique=OuterRef('pk')).order_by('pk').values('image')[:1]
+    ))
 
-    if show_sold:
-        # Show only sold (quantity = 0)
-        antiques = Antique.objects.filter(quantity=0).order_by('-created_at')
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None and sort == 'newest' and not search:
+        # A precomputed list from the snapshot, then one pk lookup for the page
+        page = Paginator(snapshot.listing(sold=show_sold, type=antique_type), CATALOG_PAGE_SIZE).get_page(
+            request.GET.get('page')
+        )
+        antiques = fetch_in_order(page.object_list, cards)
     else:
-        # Show only available (quantity > 0, or is_sold=False)
-        antiques = Antique.objects.filter(quantity__gt=0, is_sold=False).order_by('-created_at')
+        # is_sold always mirrors quantity == 0
+        antiques = cards.filter(is_sold=show_sold)
+        if antique_type:
+            antiques = antiques.filter(type_of_antique=antique_type)
+        if search:
+            antiques = antiques.filter(Q(title__icontains=search) | Q(description__icontains=search))
+        page = Paginator(antiques.order_by(*CATALOG_SORTS[sort]), CATALOG_PAGE_SIZE).get_page(request.GET.get('page'))
+        antiques = page.object_list
 
     # Make the antique types dropdown reflect whatever the user is seeing
-    antique_types = (
-        antiques.values_list('type_of_antique', flat=True)
-        .distinct()
-        .order_by('type_of_antique')
-    )
+    if snapshot is not None:
+        antique_types = snapshot.types_for(sold=show_sold)
+    else:
+        antique_types = tiered_cache.get_or_set(
+            f"antique_types:{show_sold}",
+            lambda: list(
+                Antique.objects.filter(is_sold=show_sold)
+                .values_list('type_of_antique', flat=True).distinct().order_by('type_of_antique')
+            ),
+            versions=('catalog',),
+        )
+
+    storage = AntiqueImage.image.field.storage
+    antiques = list(antiques)
+    for antique in antiques:
+        antique.cover_url = storage.url(antique.cover_image) if antique.cover_image else None
+
+    # Every antique the user has wishlisted; the page marks whichever cards it shows
+    wishlisted = []
+    if request.user.is_authenticated:
+        wishlisted = [str(pk) for pk in get_wishlist_state(request.user)[1]]
 
     return render(request, 'antiques/view/view_antiques.html', {
         'antiques': antiques,
+        'page': page,
+        'page_query': filters_query(request),
         'wishlists': get_wishlists(request.user),
+        'wishlisted': wishlisted,
         'antique_types': antique_types,
         'show_sold': show_sold,  # useful for the checkbox in your template
+        'sort': sort,
     })
 
-    
+
+@use_replica
+@count_views(Antique, 'short_id', daily_model=AntiqueDailyViews)
+@condition(etag_func=antique_detail_etag, last_modified_func=antique_detail_last_modified)
+@cache_anonymous_page('catalog', 'sellers', 'recommendations')
 def antique_detail(request, short_id, slug):
     antique = get_object_or_404(Antique, short_id=short_id, slug=slug)
-    return render(request, 'antiques/view/antique_detail.html', {'antique': antique, 'wishlists': get_wishlists(request.user)})
+    in_wishlists = get_wishlist_membership(request.user, [antique.pk]).get(antique.pk, set())
+    return render(request, 'antiques/view/antique_detail.html', {
+        'antique': antique,
+        'wishlists': get_wishlists(request.user),
+        'in_wishlists': in_wishlists,
+        'similar_antiques': similar_antiques(antique),  # precomputed, see antiques/recommendations.py
+    })
 
 @require_POST
 def antique_delete(request, slug): # Note: this function only archives the Stripe product/price instead of deleting them
     antique = get_object_or_404(Antique, slug=slug, owner=request.user)
     title = antique.title  # store before deleting
     
-    # Delete Stripe product and price if they exist
-    if antique.stripe_product_id:
-        try:
-            # Archive the price first (prices can't be deleted, only archived)
-            if antique.stripe_price_id:
-                try:
-                    stripe.Price.modify(
-                        antique.stripe_price_id,
-                        active=False
-                    )
-                    print(f"DEBUG: Archived Stripe price {antique.stripe_price_id}")
-                except stripe.error.StripeError as e:
-                    print(f"WARNING: Failed to archive Stripe price: {e}")
-            
-            # Archive the product (products can't be deleted, only archived)
-            stripe.Product.modify(
-                antique.stripe_product_id,
-                active=False
-            )
-            print(f"DEBUG: Archived Stripe product {antique.stripe_product_id}")
-        except stripe.error.StripeError as e:
-            # Log the error but continue with deletion
-            print(f"WARNING: Failed to archive Stripe product: {e}")
-            messages.warning(request, f'"{title}" was deleted, but there was an issue with Stripe. Please check manually.')
-    
-    antique.delete()
+    # Stripe archival and image files are handled in the background after the delete commits
+    if not delete_antiques(Antique.objects.filter(pk=antique.pk)):
+        messages.error(request, f'"{title}" has been ordered, so it stays in the buyers\' order history. '
+                                'Set its quantity to 0 to take it off sale.')
+        return redirect('antiques:view_antiques')
     messages.success(request, f'"{title}" was successfully deleted.')
     return redirect('antiques:view_antiques') 
 
@@ -99,10 +255,7 @@ def antique_form(request, slug=None):
     if request.method == "POST":
         form = AntiqueForm(request.POST, request.FILES, instance=antique)
 
-        print("\n--- DEBUG: POST Request ---")
-        print("Files received:", request.FILES)
-        print("Images received:", request.FILES.getlist("images"))
-        print("---------------------------\n")
+        logger.debug("antique_form POST: %d file(s)", len(request.FILES), extra={'slug': slug})
 
         if form.is_valid():
             obj = form.save(commit=False)
@@ -117,27 +270,17 @@ def antique_form(request, slug=None):
             if images:
                 for image_file in images:
                     AntiqueImage.objects.create(antique=obj, image=image_file)
-                    print(f"DEBUG: Saved image -> {image_file.name}")
-            else:
-                print("DEBUG: No images uploaded.")
+            logger.info("Antique %s saved with %d new image(s)", obj.pk, len(images),
+                        extra={'antique_id': obj.pk, 'created': not editing})
 
             messages.success(request, f"'{obj.title}' saved successfully!")
-            print("DEBUG: Antique saved successfully.\n")
             return redirect("antiques:antique_detail", short_id=obj.short_id, slug=obj.slug)
 
         else:
-            print("DEBUG: Form is not valid.")
-            print("Form errors:", form.errors)
+            logger.debug("antique_form invalid: %s", form.errors.get_json_data())
             messages.error(request, "Please correct the errors below.")
 
     else:
-        print("\n--- DEBUG: GET Request ---")
-        if editing:
-            print(f"Editing existing antique: {antique.title}")
-        else:
-            print("Creating new antique.")
-        print("---------------------------\n")
-
         form = AntiqueForm(instance=antique)
         
 
@@ -159,9 +302,95 @@ def antique_form(request, slug=None):
         "editing": editing,
     })
 
+INVENTORY_PAGE_SIZE = 100
+
+@login_required
+def seller_inventory(request):
+    """
+    Spreadsheet-style price/quantity editor for a seller's antiques.
+    Every changed row is written with one bulk_update, is_sold is recomputed in SQL
+    and only rows whose price really changed are queued for a Stripe price update.
+    """
+    seller = getattr(request.user, 'seller', None)
+    if seller is None:
+        messages.error(request, "You need a seller account to manage inventory.")
+        return redirect('accounts:seller_form')
+
+    antiques = (
+        Antique.objects.filter(seller=seller)
+        .order_by('-created_at')
+        .only('id', 'title', 'slug', 'short_id', 'price', 'quantity', 'is_sold', 'stripe_product_id')
+    )
+
+    page_number = request.GET.get('page', 1)
+
+    if request.method == "POST":
+        posted = antiques.filter(pk__in=request.POST.getlist('ids'))
+        rows = [(a, InventoryRowForm(request.POST, prefix=str(a.pk))) for a in posted]
+
+        if all([form.is_valid() for _, form in rows]):
+            now = timezone.now()
+            changed, repriced = [], []
+            for antique, form in rows:
+                price = form.cleaned_data['price']
+                quantity = form.cleaned_data['quantity']
+                if price == antique.price and quantity == antique.quantity:
+                    continue
+                if price != antique.price and antique.stripe_product_id:
+                    repriced.append(antique.pk)
+                antique.price, antique.quantity = price, quantity
+                antique.updated_at = now  # bulk_update skips auto_now
+                changed.append(antique)
+
+            if changed:
+                with write_transaction():
+                    Antique.objects.bulk_update(changed, ['price', 'quantity', 'updated_at'])
+                    Antique.objects.filter(pk__in=[a.pk for a in changed]).update(
+                        is_sold=ExpressionWrapper(Q(quantity=0), output_field=BooleanField())
+                    )
+                    # bulk_update doesn't send post_save, so do the signal work here
+                    Seller.refresh_active_listings(seller.pk)
+                    bump_version('catalog')
+                    for pk in repriced:
+                        enqueue(update_stripe_price, pk)
+
+            messages.success(request, f"Updated {len(changed)} antique{'s' if len(changed) != 1 else ''}.")
+            return redirect(f"{request.path}?page={page_number}")
+
+        messages.error(request, "Please correct the errors below.")
+        page = None
+    else:
+        page = Paginator(antiques, INVENTORY_PAGE_SIZE).get_page(page_number)
+        rows = [
+            (a, InventoryRowForm(initial={'price': a.price, 'quantity': a.quantity}, prefix=str(a.pk)))
+            for a in page
+        ]
+
+    return render(request, 'antiques/inventory/inventory.html', {
+        'rows': rows,
+        'page': page,
+        'page_number': page_number,
+    })
+
+@only_superuser
+def export_antiques(request):
+    """Site-wide catalog export, streamed as CSV or JSONL (?format=jsonl)"""
+    fmt = get_export_format(request)
+    return export_response(antique_export_rows(), ANTIQUE_EXPORT_FIELDS, fmt, "antiques")
+
+@login_required
+def export_inventory(request):
+    """The logged-in seller's own catalog export"""
+    seller = getattr(request.user, 'seller', None)
+    if seller is None:
+        messages.error(request, "You need a seller account to export inventory.")
+        return redirect('accounts:seller_form')
+
+    fmt = get_export_format(request)
+    return export_response(antique_export_rows(seller), ANTIQUE_EXPORT_FIELDS, fmt, f"inventory-{seller.pk}")
+
 @login_required
 def add_to_wishlist(request):
-    print("DEBUG: add_to_wishlist called")
     if request.method == "POST" and request.headers.get("x-requested-with") == "XMLHttpRequest":
         antique_id = request.POST.get("antique_id")
         wishlist_id = request.POST.get("wishlist_id")
@@ -169,20 +398,101 @@ def add_to_wishlist(request):
         antique = get_object_or_404(Antique, id=antique_id)
         wishlist = get_object_or_404(Wishlist, id=wishlist_id, owner=request.user)
 
-        wishlist.antiques.add(antique)
-        print(f"DEBUG: Added '{antique.title}' to wishlist '{wishlist.title}'")
+        with write_transaction():
+            wishlist.antiques.add(antique)
+        logger.debug("Added antique %s to wishlist %s", antique.pk, wishlist.pk)
         return JsonResponse({"success": True})
-    print("DEBUG: Invalid request to add to wishlist")
     return JsonResponse({"success": False}, status=400)
     
+def _bulk_wishlist_pairs(request):
+    """Validate a bulk request: the user's own wishlists and existing antiques, by id"""
+    antique_ids = request.POST.getlist('antique_ids')
+    wishlist_ids = request.POST.getlist('wishlist_ids')
+    if not antique_ids or not wishlist_ids:
+        return None, None
+    try:
+        antique_ids = list(Antique.objects.filter(pk__in=antique_ids).values_list('pk', flat=True))
+        wishlist_ids = list(Wishlist.objects.filter(pk__in=wishlist_ids, owner=request.user).values_list('pk', flat=True))
+    except ValidationError:  # malformed uuid
+        return None, None
+    return antique_ids, wishlist_ids
+
+@login_required
+@require_POST
+def bulk_add_to_wishlists(request):
+    """Add every posted antique_ids to every posted wishlist_ids (that belong to the user)"""
+    antique_ids, wishlist_ids = _bulk_wishlist_pairs(request)
+    if antique_ids is None:
+        return JsonResponse({"success": False, "error": "antique_ids and wishlist_ids are required"}, status=400)
+
+    Through = Wishlist.antiques.through
+    # One transaction, so the rows and the wishlist counts never disagree
+    with write_transaction():
+        existing = set(Through.objects.filter(
+            wishlist_id__in=wishlist_ids, antique_id__in=antique_ids,
+        ).values_list('wishlist_id', 'antique_id'))
+        new_rows = [
+            Through(wishlist_id=wishlist_id, antique_id=antique_id)
+            for wishlist_id in wishlist_ids
+            for antique_id in antique_ids
+            if (wishlist_id, antique_id) not in existing
+        ]
+        # ignore_conflicts covers a concurrent request adding the same pair. Neither bulk_create
+        # nor the delete below sends m2m_changed, so the versions and counters are updated here.
+        Through.objects.bulk_create(new_rows, ignore_conflicts=True)
+        Antique.refresh_wishlist_counts(antique_ids)
+        bump_version(wishlist_version_name(request.user), 'popularity')
+    return JsonResponse({"success": True, "added": len(new_rows)})
+
+@login_required
+@require_POST
+def bulk_remove_from_wishlists(request):
+    """Remove every posted antique_ids from every posted wishlist_ids (that belong to the user)"""
+    antique_ids, wishlist_ids = _bulk_wishlist_pairs(request)
+    if antique_ids is None:
+        return JsonResponse({"success": False, "error": "antique_ids and wishlist_ids are required"}, status=400)
+
+    with write_transaction():
+        removed, _ = Wishlist.antiques.through.objects.filter(
+            wishlist_id__in=wishlist_ids, antique_id__in=antique_ids,
+        ).delete()
+        Antique.refresh_wishlist_counts(antique_ids)
+        bump_version(wishlist_version_name(request.user), 'popularity')
+    return JsonResponse({"success": True, "removed": removed})
+
+WISHLISTS_PAGE_SIZE = 24
+WISHLIST_PAGE_SIZE = 24
+
+@login_required
 def wishlists(request):
-    wishlists = Wishlist.objects.filter(owner=request.user).order_by('-created_at')
-    return render(request, 'antiques/wishlists/wishlists.html', {'wishlists': wishlists})
+    # Item count and the first image of any antique in it as a cover, all in the one query
+    cover_image = (
+        AntiqueImage.objects.filter(antique__wishlists=OuterRef('pk'))
+        .order_by('pk')
+        .values('image')[:1]
+    )
+    wishlists = (
+        Wishlist.objects.filter(owner=request.user)
+        .annotate(antique_count=Count('antiques'), cover_image=Subquery(cover_image))
+        .order_by('-created_at')
+    )
+    page = Paginator(wishlists, WISHLISTS_PAGE_SIZE).get_page(request.GET.get('page'))
+    for wishlist in page:
+        wishlist.cover_url = AntiqueImage.image.field.storage.url(wishlist.cover_image) if wishlist.cover_image else None
+
+    return render(request, 'antiques/wishlists/wishlists.html', {'wishlists': page, 'page': page})
 
+@login_required
 def wishlist_detail(request, pk):
     wishlist = get_object_or_404(Wishlist, pk=pk, owner=request.user)
-    print(wishlist.antiques.all())
-    return render(request, 'antiques/wishlists/wishlist_detail.html', {'wishlist': wishlist})
+    # Constant queries however big the wishlist: count, one page, its images
+    antiques = (
+        wishlist.antiques.select_related('seller')
+        .prefetch_related('images')
+        .order_by('-created_at')
+    )
+    page = Paginator(antiques, WISHLIST_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, 'antiques/wishlists/wishlist_detail.html', {'wishlist': wishlist, 'page': page})
 
 def delete_wishlist(request, pk):
     return _generic_delete(request, Wishlist, pk, 'antiques:wishlists')
@@ -210,7 +520,7 @@ def wishlist_form(request, pk=None):
             return redirect('antiques:wishlist_detail', pk=wishlist.pk)  # redirect to wishlist detail view
         else:
             messages.error(request, "Please correct the errors below.")
-            print("Form errors:", form.errors)
+            logger.debug("wishlist_form invalid: %s", form.errors.get_json_data())
     else:
         form = WishlistForm(instance=instance)
 
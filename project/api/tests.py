@@ -0,0 +1,34 @@
+import base64
+import json
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+def encoded(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+class CursorTests(TestCase):
+    def test_malformed_cursors_are_a_400(self):
+        for cursor in ('not base64!', encoded({'a': 1}), encoded([]), encoded(['2026-01-01T00:00:00Z']),
+                       encoded([1, 2]), encoded(['2026-01-01T00:00:00Z', 'not-a-uuid', 3])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('api:antique_list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': "Invalid cursor"})
+
+
+class FilterTests(TestCase):
+    def test_non_finite_prices_are_a_400(self):
+        for snapshot in (True, False):
+            for value in ('nan', 'inf', '-Infinity', 'cheap'):
+                with self.subTest(snapshot=snapshot, value=value), override_settings(CATALOG_SNAPSHOT=snapshot):
+                    response = self.client.get(reverse('api:antique_list'), {'min_price': value})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': "min_price must be a number"})
+
+    def test_missing_objects_are_a_json_404(self):
+        response = self.client.get(reverse('api:antique_detail', args=[12345]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': "No antique with that id"})
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('antiques/', views.antique_list, name='antique_list'),
+    path('antiques/<int:short_id>/', views.antique_detail, name='antique_detail'),
+    path('sellers/', views.seller_list, name='seller_list'),
+    path('daily-picks/', views.daily_picks, name='daily_picks'),
+]
@@ -0,0 +1,343 @@
+# api/views.py
+"""
+Read-only JSON API (v1) for the catalog.
+
+Every endpoint builds its response from values() projections, so no model
+instances are created, and `?fields=a,b,c` narrows the SELECT to just those
+columns. Lists are cursor paginated on an indexed ordering (or on the
+in-process catalog snapshot, see antiques/snapshot.py) and carry ETags so
+clients and caches can revalidate with If-None-Match and get a 304.
+"""
+import base64
+import hashlib
+import json
+import uuid
+from decimal import Decimal, InvalidOperation
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import condition, require_GET
+
+from accounts.models import Seller
+from antiques.models import Antique, AntiqueImage, DailyPick
+from antiques.snapshot import get_catalog_snapshot
+from project.replicas import use_replica
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+CACHE_MAX_AGE = 60
+
+# Real columns that can be requested with ?fields=
+ANTIQUE_FIELDS = [
+    'id', 'short_id', 'slug', 'title', 'description', 'content', 'price', 'quantity', 'is_sold',
+    'type_of_antique', 'dimensions', 'additional_info', 'seller_id', 'created_at', 'updated_at',
+]
+# Computed fields, each costs at most one extra query per page
+ANTIQUE_EXTRA_FIELDS = ['url', 'images']
+ANTIQUE_DEFAULT_FIELDS = ['id', 'short_id', 'slug', 'title', 'price', 'type_of_antique', 'is_sold', 'quantity', 'updated_at']
+
+SELLER_FIELDS = [
+    'id', 'store_name', 'description', 'email', 'phone_number', 'notes', 'address', 'is_verified',
+    'active_listings', 'total_sales', 'facebook', 'instagram', 'twitter', 'website',
+]
+SELLER_DEFAULT_FIELDS = ['id', 'store_name', 'description', 'is_verified', 'active_listings', 'total_sales']
+
+
+class ApiError(Exception):
+    """Bad query parameters, answered with a 400"""
+
+
+def api_view(view_func):
+    """GET only, reads from a replica, JSON errors (400 and 404), and a short public cache lifetime on successful responses"""
+    @require_GET
+    @use_replica
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        try:
+            response = view_func(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Http404 as e:
+            return JsonResponse({'error': str(e) or "Not found"}, status=404)
+        if response.status_code in (200, 304):
+            patch_cache_control(response, public=True, max_age=CACHE_MAX_AGE)
+        return response
+    return _wrapped_view
+
+
+def json_response(data):
+    return JsonResponse(data, encoder=DjangoJSONEncoder, json_dumps_params={'separators': (',', ':')})
+
+
+def content_etag_response(request, data):
+    """For endpoints without a cheap version key: ETag the body and 304 if it matches"""
+    response = set_response_etag(json_response(data))
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+# ------------------------------
+# Query parameter parsing
+# ------------------------------
+
+def parse_fields(request, allowed, default):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(default)
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def parse_price(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ApiError(f"{name} must be a number")
+    if not price.is_finite():  # nan and inf parse, but the price column can't compare with them
+        raise ApiError(f"{name} must be a number")
+    return price
+
+
+def parse_bool(request, name):
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ApiError(f"{name} must be true or false")
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_cursor(request):
+    raw = request.GET.get('cursor')
+    if not raw:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(raw.encode()))
+    except ValueError:
+        raise ApiError("Invalid cursor")
+
+
+# ------------------------------
+# Antiques
+# ------------------------------
+
+def parse_antique_filters(request):
+    """?type=, ?min_price=, ?max_price=, ?sold=true|false, ?seller=<id>, as CatalogSnapshot.query() arguments"""
+    filters = {
+        'type': request.GET.get('type') or None,
+        'sold': parse_bool(request, 'sold'),
+        'min_price': parse_price(request, 'min_price'),
+        'max_price': parse_price(request, 'max_price'),
+    }
+    try:
+        filters['seller'] = int(request.GET['seller']) if request.GET.get('seller') else None
+    except ValueError:
+        raise ApiError("seller must be a number")
+    return filters
+
+
+def filter_antiques(request, antiques):
+    filters = parse_antique_filters(request)
+    lookups = {
+        'type': 'type_of_antique', 'sold': 'is_sold', 'min_price': 'price__gte',
+        'max_price': 'price__lte', 'seller': 'seller_id',
+    }
+    return antiques.filter(**{lookups[name]: value for name, value in filters.items() if value is not None})
+
+
+def antique_rows(queryset, fields, limit=None, also=()):
+    """
+    Project `fields` with values() (plus any `also` columns the caller needs,
+    e.g. for the cursor), then fill in url/images for the whole page in bulk.
+    """
+    columns = [f for f in fields if f in ANTIQUE_FIELDS]
+    extra = [f for f in fields if f in ANTIQUE_EXTRA_FIELDS]
+    needed = list(dict.fromkeys(
+        columns + list(also)
+        + (['id'] if 'images' in extra else [])
+        + (['short_id', 'slug'] if 'url' in extra else [])
+    ))
+    rows = queryset.values(*needed)
+    rows = list(rows[:limit] if limit is not None else rows)
+
+    if 'images' in extra and rows:
+        images = {}
+        for antique_id, image in AntiqueImage.objects.filter(
+            antique_id__in=[row['id'] for row in rows]
+        ).order_by('pk').values_list('antique_id', 'image'):
+            images.setdefault(antique_id, []).append(AntiqueImage.image.field.storage.url(image))
+        for row in rows:
+            row['images'] = images.get(row['id'], [])
+    if 'url' in extra:
+        for row in rows:
+            row['url'] = reverse('antiques:antique_detail', args=[row['short_id'], row['slug']])
+
+    return rows
+
+
+def project(rows, fields):
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def antique_list_etag(request):
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        # Every change to the listed columns bumps the version the snapshot was built for
+        key = f"{snapshot.version}|{request.GET.urlencode()}"
+        return hashlib.md5(key.encode()).hexdigest()
+
+    # One aggregate over the filtered set: any edit bumps Max(updated_at), any insert/delete the count
+    try:
+        antiques = filter_antiques(request, Antique.objects.all())
+    except ApiError:
+        return None
+    stats = antiques.aggregate(latest=Max('updated_at'), total=Count('pk'))
+    key = f"{stats['latest']}|{stats['total']}|{request.GET.urlencode()}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@api_view
+@condition(etag_func=antique_list_etag)
+def antique_list(request):
+    fields = parse_fields(request, ANTIQUE_FIELDS + ANTIQUE_EXTRA_FIELDS, ANTIQUE_DEFAULT_FIELDS)
+    limit = parse_limit(request)
+    filters = parse_antique_filters(request)
+
+    after = None
+    cursor = decode_cursor(request)
+    if cursor is not None:
+        if not (isinstance(cursor, list) and len(cursor) == 2):
+            raise ApiError("Invalid cursor")
+        try:
+            created_at, last_id = parse_datetime(cursor[0]), uuid.UUID(cursor[1])
+        except (TypeError, ValueError, AttributeError):
+            raise ApiError("Invalid cursor")
+        if created_at is None:
+            raise ApiError("Invalid cursor")
+        after = (created_at, last_id)
+
+    # Fetch one extra row to know whether there's a next page
+    snapshot = get_catalog_snapshot()
+    if snapshot is not None:
+        ids = snapshot.query(**filters, after=after, limit=limit + 1)
+        rows = antique_rows(Antique.objects.filter(pk__in=ids), fields, also=('created_at', 'id'))
+        position = {pk: i for i, pk in enumerate(ids)}
+        rows.sort(key=lambda row: position[row['id']])
+    else:
+        antiques = filter_antiques(request, Antique.objects.all()).order_by('-created_at', '-id')
+        if after:
+            created_at, last_id = after
+            antiques = antiques.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+        rows = antique_rows(antiques, fields, limit=limit + 1, also=('created_at', 'id'))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]['created_at'], rows[-1]['id']])
+
+    return json_response({'data': project(rows, fields), 'next_cursor': next_cursor})
+
+
+def antique_detail_etag(request, short_id):
+    # Images don't touch Antique.updated_at, so count them into the key as well
+    version = (
+        Antique.objects.filter(short_id=short_id)
+        .annotate(image_count=Count('images'))
+        .values_list('updated_at', 'image_count')
+        .first()
+    )
+    if version is None:
+        return None
+    key = f"{version[0]}|{version[1]}|{request.GET.get('fields', '')}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@api_view
+@condition(etag_func=antique_detail_etag)
+def antique_detail(request, short_id):
+    fields = parse_fields(request, ANTIQUE_FIELDS + ANTIQUE_EXTRA_FIELDS, ANTIQUE_FIELDS + ANTIQUE_EXTRA_FIELDS)
+    rows = antique_rows(Antique.objects.filter(short_id=short_id), fields)
+    if not rows:
+        raise Http404("No antique with that id")
+    return json_response({'data': project(rows, fields)[0]})
+
+
+# ------------------------------
+# Sellers
+# ------------------------------
+
+@api_view
+def seller_list(request):
+    """Sellers ordered by id, ?verified=true|false"""
+    fields = parse_fields(request, SELLER_FIELDS, SELLER_DEFAULT_FIELDS)
+    limit = parse_limit(request)
+    sellers = Seller.objects.order_by('id')
+
+    verified = parse_bool(request, 'verified')
+    if verified is not None:
+        sellers = sellers.filter(is_verified=verified)
+
+    cursor = decode_cursor(request)
+    if cursor is not None:
+        if not isinstance(cursor, int):
+            raise ApiError("Invalid cursor")
+        sellers = sellers.filter(id__gt=cursor)
+
+    rows = list(sellers.values(*dict.fromkeys(['id'] + fields))[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['id'])
+
+    return content_etag_response(request, {'data': project(rows, fields), 'next_cursor': next_cursor})
+
+
+# ------------------------------
+# Daily picks
+# ------------------------------
+
+@api_view
+def daily_picks(request):
+    """Today's picks, or ?date=YYYY-MM-DD for an earlier day"""
+    fields = parse_fields(request, ANTIQUE_FIELDS + ANTIQUE_EXTRA_FIELDS, ANTIQUE_DEFAULT_FIELDS)
+    date = timezone.localdate()
+    if request.GET.get('date'):
+        date = parse_date(request.GET['date'])
+        if date is None:
+            raise ApiError("date must be YYYY-MM-DD")
+
+    if date == timezone.localdate():
+        picks = DailyPick.get_today_picks()
+    else:
+        daily_pick = get_object_or_404(DailyPick, date=date)
+        picks = daily_pick.picks.all()
+
+    return content_etag_response(request, {
+        'date': date,
+        'data': project(antique_rows(picks.order_by('-created_at'), fields), fields),
+    })
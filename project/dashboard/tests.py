@@ -1,3 +1,9 @@
-from django.test import TestCase
+from project.testing import QueryBudgetTestCase
 
-# Create your tests here.
+
+class DashboardQueryBudgets(QueryBudgetTestCase):
+    def test_index(self):
+        self.assertQueryBudget(0, 'index')
+
+    def test_dashboard(self):
+        self.assertQueryBudget(18, 'dashboard', user='buyer')
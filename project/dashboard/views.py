@@ -1,6 +1,10 @@
 from django.shortcuts import redirect, render
-from antiques.models import Antique, DailyPick
+from django.template.loader import render_to_string
+from antiques.models import Antique, DailyPick, Wishlist
 from django.contrib import messages
+from django.db.models import Count
+from django.utils import timezone
+from project.caching import tiered_cache
 
 def index(request): 
     if request.user.is_authenticated:
@@ -8,38 +12,51 @@ def index(request):
     
     return render(request, 'dashboard/index.html')
 
-def dashboard(request):
-    if not request.user.is_authenticated:
-        return redirect('index')
-
+def dashboard_sections():
     # Get today's daily picks
-    picks = DailyPick.get_today_picks()
+    picks = DailyPick.get_today_picks().prefetch_related('images')
 
     # Get the IDs of antiques already in today's picks
     pick_ids = picks.values_list('id', flat=True)
 
     # Get the 3 most recent antiques not in today's picks
-
     recent_antiques = (
         Antique.objects.exclude(id__in=pick_ids).exclude(quantity=0)
+        .prefetch_related('images')
         .order_by('-created_at')[:3]
     )
 
     recent_sold_antiques = (
         Antique.objects.filter(quantity=0)
+        .prefetch_related('images')
         .order_by('-created_at')[:3]
     )
 
-    print(recent_sold_antiques)
+    # Stored as rendered HTML, so a cache hit costs no queries and no template work
+    return render_to_string('dashboard/main/shared_sections.html', {
+        'picks': picks,
+        'recent_antiques': recent_antiques,
+        'recent_sold_antiques': recent_sold_antiques,
+    })
 
+def dashboard(request):
+    if not request.user.is_authenticated:
+        return redirect('index')
+
+    # The same for every user, so every worker shares one copy per day and catalog version
+    shared_sections = tiered_cache.get_or_set(
+        f"dashboard:{timezone.localdate()}", dashboard_sections, versions=('catalog', 'picks'),
+    )
 
-    return render(
-        request,
-        'dashboard/main/dashboard.html',
-        {
-            'picks': picks,
-            'recent_antiques': recent_antiques,
-            'recent_sold_antiques': recent_sold_antiques,
-        },
+    # The only per-user part, one query
+    wishlists = (
+        Wishlist.objects.filter(owner=request.user)
+        .annotate(antique_count=Count('antiques'))
+        .order_by('-created_at')
+        .only('pk', 'title')
     )
 
+    return render(request, 'dashboard/main/dashboard.html', {
+        'shared_sections': shared_sections,
+        'wishlists': wishlists,
+    })
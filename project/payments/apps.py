@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        import stripe
+        from project.metrics import StripeHTTPClient
+
+        # Every Stripe call goes through this client, so they're all timed (stripe_request_duration_seconds)
+        stripe.default_http_client = StripeHTTPClient()
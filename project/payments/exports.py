@@ -0,0 +1,49 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import F
+
+from project.exports import EXPORT_CHUNK_SIZE
+from .models import OrderItem
+
+ORDER_FIELDS = ['order_id', 'status', 'user_email', 'stripe_session_id', 'created_at']
+ITEM_FIELDS = ['antique_id', 'short_id', 'title', 'unit_price', 'quantity']
+
+# CSV is flat: one line per order item with its order's columns repeated
+ORDER_EXPORT_FIELDS = ORDER_FIELDS + ITEM_FIELDS
+
+
+def order_item_rows(user=None):
+    """Order items joined to their order and antique, streamed in order_id order"""
+    items = OrderItem.objects.all()
+    if user is not None:
+        items = items.filter(order__user=user)
+
+    return (
+        items.order_by('order__created_at', 'order_id', 'pk')
+        .values(
+            'order_id', 'antique_id', 'quantity', 'unit_price',
+            status=F('order__status'),
+            user_email=F('order__user__email'),
+            stripe_session_id=F('order__stripe_session_id'),
+            created_at=F('order__created_at'),
+            short_id=F('antique__short_id'),
+            title=F('antique__title'),
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def order_export_rows(user=None, nested=False):
+    """
+    Rows for the order export. With `nested`, consecutive items are folded into
+    one dict per order (for JSONL); only one order is held in memory at a time.
+    """
+    rows = order_item_rows(user)
+    if not nested:
+        return rows
+    return (
+        {**{field: items[0][field] for field in ORDER_FIELDS},
+         'items': [{field: item[field] for field in ITEM_FIELDS} for item in items]}
+        for items in (list(group) for _, group in groupby(rows, key=itemgetter('order_id')))
+    )
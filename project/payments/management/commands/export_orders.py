@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from payments.exports import ORDER_EXPORT_FIELDS, order_export_rows
+from project.exports import EXPORT_FORMATS, write_export
+
+
+class Command(BaseCommand):
+    help = "Write every order and its items to a CSV (one line per item) or JSONL (one order per line) file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write")
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        rows = order_export_rows(nested=(fmt == 'jsonl'))
+        count = write_export(rows, ORDER_EXPORT_FIELDS, fmt, options['output'])
+        unit = "order items" if fmt == 'csv' else "orders"
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} {unit} to {options['output']}."))
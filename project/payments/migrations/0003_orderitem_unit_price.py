@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_unit_prices(apps, schema_editor):
+    # The price paid wasn't recorded before; the antique's current price is the best there is
+    OrderItem = apps.get_model('payments', 'OrderItem')
+    Antique = apps.get_model('antiques', 'Antique')
+    OrderItem.objects.update(
+        unit_price=Subquery(Antique.objects.filter(pk=OuterRef('antique')).values('price')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('antiques', '0020_antique_postgres_indexes'),
+        ('payments', '0002_order_stripe_invoice_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_unit_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
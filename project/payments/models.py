@@ -32,7 +32,9 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     antique = models.ForeignKey(Antique, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # The antique's price when it was sold; seller revenue is summed from this, not the current price
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
 
     @property
     def total_price(self):
-        return self.antique.price * self.quantity
+        return self.unit_price * self.quantity
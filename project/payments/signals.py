@@ -5,6 +5,7 @@ from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from antiques.models import Antique
+from .tasks import create_stripe_objects
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -18,18 +19,9 @@ def create_stripe_product(sender, instance, created, **kwargs):
     if created and instance.price > 0 and not instance.is_sold:
         # Avoid creating multiple Stripe products if already exists
         if not hasattr(instance, 'stripe_product_id') or not instance.stripe_product_id:
-            product = stripe.Product.create(
-                name=f"{instance.title}",
-                description=instance.description or "Antique for sale",
-            )
-            
-            price = stripe.Price.create(
-                product=product.id,
-                unit_amount=int(instance.price * 100),  # Stripe uses cents
-                currency="aud",
-            )
-            
+            product_id, price_id = create_stripe_objects(instance)
+
             # Save the Stripe product ID on the instance
-            instance.stripe_product_id = product.id
-            instance.stripe_price_id = price.id
+            instance.stripe_product_id = product_id
+            instance.stripe_price_id = price_id
             instance.save(update_fields=['stripe_product_id', 'stripe_price_id'])
@@ -0,0 +1,79 @@
+# payments/tasks.py
+
+import logging
+
+import stripe
+from django.conf import settings
+
+from antiques.models import Antique
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
+
+# Stripe jobs, run on the background queue (project/tasks.py) so the round
+# trips never block a request.
+
+# -------------------------
+# Jobs
+# -------------------------
+
+def create_stripe_objects(antique):
+    """Create the Stripe product and price for an antique. Returns (product_id, price_id)."""
+    product = stripe.Product.create(
+        name=f"{antique.title}",
+        description=antique.description or "Antique for sale",
+    )
+    price = stripe.Price.create(
+        product=product.id,
+        unit_amount=int(antique.price * 100),  # Stripe uses cents
+        currency="aud",
+    )
+    return product.id, price.id
+
+
+def update_stripe_price(antique_id):
+    """
+    Stripe prices are immutable, so a price change means creating a new Price
+    and archiving the old one. Reads the antique's price at run time so several
+    queued edits collapse into whatever the latest value is.
+    """
+    antique = (
+        Antique.objects.filter(pk=antique_id)
+        .only('price', 'stripe_product_id', 'stripe_price_id')
+        .first()
+    )
+    if antique is None or not antique.stripe_product_id:
+        return
+
+    unit_amount = int(antique.price * 100)  # Stripe uses cents
+    old_price_id = antique.stripe_price_id
+    if old_price_id:
+        current = stripe.Price.retrieve(old_price_id)
+        if current.unit_amount == unit_amount:
+            return
+
+    price = stripe.Price.create(
+        product=antique.stripe_product_id,
+        unit_amount=unit_amount,
+        currency="aud",
+    )
+    # .update() so we don't re-run save() and the post_save Stripe signal
+    Antique.objects.filter(pk=antique_id).update(stripe_price_id=price.id)
+
+    if old_price_id:
+        stripe.Price.modify(old_price_id, active=False)
+
+
+def archive_stripe_objects(stripe_ids):
+    """
+    Archive the Stripe product and price of deleted antiques, given as
+    (product_id, price_id) pairs. Neither can be deleted once used, only
+    deactivated. One failure doesn't stop the rest.
+    """
+    for product_id, price_id in stripe_ids:
+        try:
+            if price_id:
+                stripe.Price.modify(price_id, active=False)
+            stripe.Product.modify(product_id, active=False)
+        except stripe.StripeError as e:
+            logger.warning("Failed to archive Stripe product %s: %s", product_id, e)
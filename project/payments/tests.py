@@ -1,3 +1,75 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from project.stubs import stripe_signature
+from project.testing import QueryBudgetTestCase
+
+WEBHOOK_SECRET = 'whsec_query_budget'
+
+
+def checkout_completed(catalog):
+    return json.dumps({
+        'id': 'evt_query_budget',
+        'object': 'event',
+        'type': 'checkout.session.completed',
+        'data': {'object': {
+            'id': 'cs_query_budget',
+            'object': 'checkout.session',
+            'metadata': {'user_id': str(catalog.buyer.pk), 'antique_id': str(catalog.antique.pk), 'quantity': '1'},
+        }},
+    })
+
+
+class OrderQueryBudgets(QueryBudgetTestCase):
+    def test_orders(self):
+        self.assertQueryBudget(4, 'payments:orders', user='buyer')
+
+    def test_export_orders(self):
+        self.assertQueryBudget(3, 'payments:export_orders', user='buyer')
+
+    def test_export_orders_jsonl(self):
+        self.assertQueryBudget(3, 'payments:export_orders', user='buyer', data={'format': 'jsonl'})
+
+    def test_download_invoice(self):
+        # No PDF and no Stripe session on seeded orders, so this is the "not available yet" answer
+        self.assertQueryBudget(3, 'payments:download_invoice', args=lambda c: [c.order.pk], user='buyer',
+                               status=404)
+
+
+@mock.patch('stripe.checkout.Session.create', return_value=mock.Mock(url='https://checkout.stripe.test/'))
+@mock.patch('stripe.billing_portal.Session.create', return_value=mock.Mock(url='https://billing.stripe.test/'))
+class CheckoutQueryBudgets(QueryBudgetTestCase):
+    def test_create_order(self, *mocks):
+        self.assertQueryBudget(3, 'payments:create_order', args=lambda c: [c.antique.pk], user='buyer',
+                               status=302)
+
+    def test_create_checkout_session(self, *mocks):
+        self.assertQueryBudget(3, 'payments:create_checkout_session', args=lambda c: [c.antique.pk],
+                               user='buyer', status=302)
+
+    def test_checkout_result(self, *mocks):
+        self.assertQueryBudget(2, 'payments:checkout_result', user='buyer', data={'success': 'true'})
+
+    def test_stripe_customer_portal(self, *mocks):
+        self.assertQueryBudget(2, 'payments:stripe_customer_portal', user='buyer', status=302)
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    def test_stripe_webhook(self, *mocks):
+        # Includes the SAVEPOINT and RELEASE of its write transaction (project/sqlite.py)
+        self.assertQueryBudget(
+            9, 'payments:stripe_webhook', method='post', data=checkout_completed,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=lambda c: stripe_signature(checkout_completed(c), WEBHOOK_SECRET),
+        )
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class WebhookTests(TestCase):
+    def test_bad_signature_is_rejected(self):
+        payload = json.dumps({'id': 'evt_forged', 'object': 'event', 'type': 'checkout.session.completed'})
+        response = self.client.post(reverse('payments:stripe_webhook'), payload, content_type='application/json',
+                                    HTTP_STRIPE_SIGNATURE=stripe_signature(payload, 'whsec_someone_else'))
+        self.assertEqual(response.status_code, 400)
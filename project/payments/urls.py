@@ -5,6 +5,7 @@ app_name = 'payments'
 
 urlpatterns = [
     path('orders/', views.orders, name='orders'),
+    path('orders/export/', views.export_orders, name='export_orders'),
     path('create-order/<uuid:pk>/', views.create_order, name='create_order'),
     path('checkout/<uuid:pk>/', views.create_checkout_session, name='create_checkout_session'),
     path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
@@ -7,13 +7,22 @@ from django.conf import settings
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
+from django.db.models import OuterRef, Prefetch, Subquery
 
+import logging
 import stripe
+import time
 
 from .models import Order, OrderItem
-from antiques.models import Antique
+from .exports import ORDER_EXPORT_FIELDS, order_export_rows
+from project import metrics
+from project.exports import export_response, get_export_format
+from project.sqlite import write_transaction
+from antiques.models import Antique, AntiqueImage
+from accounts.models import Seller
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+logger = logging.getLogger(__name__)
 
 
 # -------------------------
@@ -21,10 +30,21 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 # -------------------------
 @login_required
 def orders(request):
-    order_objects = Order.objects.filter(user=request.user).order_by('-created_at')
+    # Items, their antiques and cover images come in one prefetch query instead of three per order
+    cover_image = AntiqueImage.objects.filter(antique=OuterRef('antique')).order_by('pk').values('image')[:1]
+    items = OrderItem.objects.select_related('antique').annotate(cover_image=Subquery(cover_image))
+    order_objects = (
+        Order.objects.filter(user=request.user)
+        .prefetch_related(Prefetch('orderitem_set', queryset=items))
+        .order_by('-created_at')
+    )
+    storage = AntiqueImage.image.field.storage
     stripe_orders = []
 
     for order in order_objects:
+        for item in order.orderitem_set.all():
+            item.cover_url = storage.url(item.cover_image) if item.cover_image else None
+
         stripe_info = {}
         if order.stripe_session_id:
             try:
@@ -63,6 +83,17 @@ def orders(request):
 
     return render(request, "payments/orders/orders.html", {"stripe_orders": stripe_orders})
 
+# -------------------------
+# 1b. Export orders
+# -------------------------
+@login_required
+def export_orders(request):
+    """Stream the order history as CSV (one line per item) or JSONL (one order per line)"""
+    fmt = get_export_format(request)
+    user = None if request.user.is_superuser else request.user
+    rows = order_export_rows(user, nested=(fmt == 'jsonl'))
+    return export_response(rows, ORDER_EXPORT_FIELDS, fmt, "orders")
+
 # -------------------------
 # 2. Create Checkout Session (Direct)
 # -------------------------
@@ -95,9 +126,9 @@ def create_checkout_session(request, pk):
             )
             request.user.stripe_customer_id = customer.id
             request.user.save()
-            print(f"✅ Created Stripe customer for {request.user.email}: {customer.id}")
-        except stripe.StripeError as e:
-            print(f"❌ Failed to create Stripe customer: {e}")
+            logger.info("Created Stripe customer %s", customer.id, extra={'user_id': request.user.pk})
+        except stripe.StripeError:
+            logger.exception("Failed to create Stripe customer", extra={'user_id': request.user.pk})
 
     line_items = [{
         'price': antique.stripe_price_id,
@@ -136,18 +167,20 @@ def stripe_webhook(request):
 
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
-    except (ValueError, stripe.error.SignatureVerificationError):
-        print("⚠️ Webhook signature verification failed")
+    except (ValueError, stripe.SignatureVerificationError):
+        logger.warning("Webhook signature verification failed")
         return HttpResponse(status=400)
 
-    print(f"🔔 Received webhook event: {event['type']}")
+    logger.info("Received webhook event %s", event['type'], extra={'event_id': event.get('id')})
+    if event.get('created'):
+        metrics.observe('stripe_webhook_lag_seconds', max(0, time.time() - event['created']),
+                        buckets=metrics.LAG_BUCKETS, type=event['type'])
 
     # -----------------------------
     # 1️⃣ Handle successful checkout - CREATE ORDER HERE
     # -----------------------------
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
-        print(f"💳 Processing checkout session: {session['id']}")
 
         # Extract metadata from session
         metadata = session.get('metadata', {})
@@ -156,7 +189,7 @@ def stripe_webhook(request):
         quantity = int(metadata.get('quantity', 1))
 
         if not user_id or not antique_id:
-            print("❌ Missing user_id or antique_id in session metadata")
+            logger.error("Checkout session %s has no user_id or antique_id", session['id'])
             return HttpResponse(status=400)
 
         try:
@@ -164,33 +197,41 @@ def stripe_webhook(request):
             from django.contrib.auth import get_user_model
             User = get_user_model()
             user = User.objects.get(id=user_id)
-            antique = Antique.objects.get(id=antique_id)
-            
-            print(f"📦 Creating order for {user.email} - {antique.title}")
-
-            # Create order and order item ONLY when payment succeeds
-            order = Order.objects.create(
-                user=user,
-                stripe_session_id=session['id'],
-                status='paid'
-            )
-            OrderItem.objects.create(
-                order=order,
-                antique=antique,
-                quantity=quantity
-            )
-            print(f"✅ Order {order.id} created and marked as paid")
 
-            # ✅ Safely decrement stock
-            antique.quantity = max(0, antique.quantity - quantity)
-            antique.save()
-            print(f"📦 Updated stock for {antique.title}: {antique.quantity}")
+            # One short transaction, so the stock read below can't race another webhook's
+            with write_transaction():
+                # Locks the row on PostgreSQL, so concurrent webhooks decrement one after another;
+                # SQLite's IMMEDIATE transaction already holds the whole database
+                antique = Antique.objects.select_for_update().get(id=antique_id)
+
+                # Create order and order item ONLY when payment succeeds
+                order = Order.objects.create(
+                    user=user,
+                    stripe_session_id=session['id'],
+                    status='paid'
+                )
+                OrderItem.objects.create(
+                    order=order,
+                    antique=antique,
+                    quantity=quantity,
+                    unit_price=antique.price,
+                )
+
+                # ✅ Safely decrement stock
+                antique.quantity = max(0, antique.quantity - quantity)
+                antique.save(update_fields=['quantity', 'is_sold', 'updated_at'])  # save() derives is_sold
+
+                # ✅ Bump the seller's storefront counters in place
+                Seller.record_sale(antique.seller_id, quantity, antique.price * quantity)  # = the item's total_price
+
+            logger.info("Order %s created and marked as paid", order.id,
+                        extra={'order_id': order.id, 'session_id': session['id'], 'antique_id': antique.id})
 
         except (User.DoesNotExist, Antique.DoesNotExist) as e:
-            print(f"❌ Error finding user or antique: {e}")
+            logger.error("Checkout session %s: %s", session['id'], e)
             return HttpResponse(status=404)
-        except Exception as e:
-            print(f"❌ Error creating order: {e}")
+        except Exception:
+            logger.exception("Failed to create the order for checkout session %s", session['id'])
             return HttpResponse(status=500)
 
     # -----------------------------
@@ -198,7 +239,6 @@ def stripe_webhook(request):
     # -----------------------------
     elif event['type'] in ['invoice.finalized', 'invoice.payment_succeeded']:
         invoice = event['data']['object']
-        print(f"📄 Invoice event: {invoice['id']}")
 
         # Try to find order using payment intent
         order = None
@@ -212,17 +252,17 @@ def stripe_webhook(request):
                         if session.payment_intent == payment_intent_id:
                             order = ord
                             break
-                    except stripe.error.StripeError:
+                    except stripe.StripeError:
                         continue
-            except stripe.error.StripeError as e:
-                print(f"❌ Stripe error fetching payment intent: {e}")
+            except stripe.StripeError:
+                logger.exception("Stripe error looking up the order for invoice %s", invoice['id'])
 
         if order and invoice.get('invoice_pdf'):
             order.stripe_invoice_pdf = invoice['invoice_pdf']
             order.save()
-            print(f"✅ Invoice PDF saved for order {order.id}")
+            logger.info("Invoice PDF saved for order %s", order.id, extra={'order_id': order.id})
         elif not order:
-            print("❌ Could not find associated order for invoice")
+            logger.warning("Could not find the order for invoice %s", invoice['id'])
 
     return HttpResponse(status=200)
 
@@ -257,9 +297,9 @@ def stripe_customer_portal(request):
             )
             request.user.stripe_customer_id = customer.id
             request.user.save()
-            print(f"✅ Created Stripe customer for portal access: {customer.id}")
-        except stripe.StripeError as e:
-            print(f"❌ Failed to create Stripe customer: {e}")
+            logger.info("Created Stripe customer %s for portal access", customer.id, extra={'user_id': request.user.pk})
+        except stripe.StripeError:
+            logger.exception("Failed to create Stripe customer", extra={'user_id': request.user.pk})
             messages.error(request, "Unable to access customer portal at this time.")
             return redirect('dashboard:dashboard')
 
@@ -271,8 +311,8 @@ def stripe_customer_portal(request):
         )
         # Redirect user to the portal
         return redirect(session.url)
-    except stripe.StripeError as e:
-        print(f"❌ Failed to create customer portal session: {e}")
+    except stripe.StripeError:
+        logger.exception("Failed to create customer portal session", extra={'user_id': request.user.pk})
         messages.error(request, "Unable to access customer portal at this time.")
         return redirect('dashboard:dashboard')
 
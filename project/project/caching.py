@@ -0,0 +1,211 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+
+from . import metrics
+from .versions import get_versions
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24  # versions do the invalidating, this only bounds storage
+
+
+def _is_cacheable(request, response):
+    # Never share a page that set a cookie or rendered a CSRF token for this visitor
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not response.has_header('Cache-Control')
+    )
+
+
+def cache_anonymous_page(*version_names, timeout=PAGE_CACHE_TIMEOUT):
+    """
+    Cache the full response of a GET view for anonymous visitors.
+
+    The key is the URL plus the current value of each named content version
+    (see project/versions.py), so when a signal bumps e.g. 'catalog' every page
+    built from the old catalog simply stops being looked up. A name can also be
+    a callable taking the request and returning a name, or None when this
+    request doesn't depend on it. Logged-in users always get a fresh render.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            # Pending flash messages (e.g. "logged out") must be rendered for this visitor only
+            if request.method != 'GET' or request.user.is_authenticated or CookieStorage.cookie_name in request.COOKIES:
+                return view_func(request, *args, **kwargs)
+
+            names = [name(request) if callable(name) else name for name in version_names]
+            names = [name for name in names if name]
+            versions = get_versions(*names)
+            raw_key = "|".join([request.get_host(), request.get_full_path()] + [str(versions[n]) for n in names])
+            key = f"page:{view_func.__name__}:{hashlib.md5(raw_key.encode()).hexdigest()}"
+
+            response = cache.get(key)
+            metrics.inc('cache_requests_total', cache='page', result='miss' if response is None else 'hit')
+            if response is not None:
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if _is_cacheable(request, response):
+                cache.set(key, response, timeout)
+            return response
+        return _wrapped_view
+    return decorator
+
+
+# ------------------------------
+# Two-tier cache
+# ------------------------------
+
+class TieredCache:
+    """
+    A small LRU of recently used values in each worker, in front of the shared
+    Django cache.
+
+    Values are stored under their key plus the current content versions they
+    depend on, so every worker stops using an entry as soon as a version is
+    bumped. Each entry also has a fresh period; after it the value is served
+    stale for up to `stale_timeout` while exactly one worker (whoever wins the
+    lock) recomputes it. When nothing is stored yet, the lock winner computes
+    and the others wait briefly for its result instead of piling onto the
+    database.
+    """
+
+    LOCK_TIMEOUT = 30     # a crashed recompute can block others at most this long
+    LOCK_WAIT = 2         # how long a miss waits for another worker's recompute
+    LOCK_POLL = 0.05
+    VERSION_MAX_AGE = 1   # seconds a worker trusts its copy of the content versions
+    STATS_FLUSH_INTERVAL = 10
+
+    STAT_NAMES = ('local_hits', 'shared_hits', 'stale_hits', 'misses', 'recomputes', 'lock_waits')
+    # stat -> result label of the cache_requests_total metric, for the stats that are lookups
+    LOOKUP_RESULTS = {'local_hits': 'local_hit', 'shared_hits': 'shared_hit', 'stale_hits': 'stale_hit', 'misses': 'miss'}
+
+    def __init__(self, max_entries=1000, prefix="tiered"):
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(self.STAT_NAMES, 0)
+        self._unflushed = dict.fromkeys(self.STAT_NAMES, 0)
+        self._last_flush = time.monotonic()
+
+    def get_or_set(self, key, compute, versions=(), timeout=300, stale_timeout=60):
+        """Return the cached value for `key`, calling `compute()` at most once across workers when needed"""
+        current = get_versions(*versions, max_age=self.VERSION_MAX_AGE) if versions else {}
+        full_key = ":".join([self.prefix, key] + [str(current[name]) for name in versions])
+        now = time.time()
+
+        entry = self._local_get(full_key)
+        if entry is not None and entry[1] > now:
+            self._count('local_hits')
+            return entry[0]
+
+        entry = cache.get(full_key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until > now:
+                self._count('shared_hits')
+                self._local_set(full_key, entry)
+                return value
+            if self._acquire(full_key):
+                return self._recompute(full_key, compute, timeout, stale_timeout)
+            # Someone else is refreshing it, the stale value will do until then
+            self._count('stale_hits')
+            return value
+
+        self._count('misses')
+        if not self._acquire(full_key):
+            self._count('lock_waits')
+            deadline = time.monotonic() + self.LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(self.LOCK_POLL)
+                entry = cache.get(full_key)
+                if entry is not None:
+                    self._local_set(full_key, entry)
+                    return entry[0]
+            # The lock holder is slow or gone, compute it ourselves rather than fail
+        return self._recompute(full_key, compute, timeout, stale_timeout)
+
+    def stats(self):
+        """This worker's counters plus the totals flushed by all workers"""
+        with self._lock:
+            local = dict(self._stats, entries=len(self._local), max_entries=self.max_entries)
+        shared_keys = {self._stats_key(name): name for name in self.STAT_NAMES}
+        found = cache.get_many(shared_keys)
+        return {
+            'pid': os.getpid(),
+            'worker': local,
+            'all_workers': {name: found.get(key, 0) for key, name in shared_keys.items()},
+        }
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    # ------------------------------
+    # Internals
+    # ------------------------------
+
+    def _recompute(self, full_key, compute, timeout, stale_timeout):
+        try:
+            value = compute()
+            entry = (value, time.time() + timeout)
+            cache.set(full_key, entry, timeout + stale_timeout)
+            self._local_set(full_key, entry)
+            self._count('recomputes')
+            return value
+        finally:
+            cache.delete(f"{full_key}:lock")
+
+    def _acquire(self, full_key):
+        # Exactly one winner needs an atomic add(): project/filecache.py, or Redis/Memcached/database caches
+        return cache.add(f"{full_key}:lock", os.getpid(), self.LOCK_TIMEOUT)
+
+    def _local_get(self, full_key):
+        with self._lock:
+            entry = self._local.get(full_key)
+            if entry is not None:
+                self._local.move_to_end(full_key)
+            return entry
+
+    def _local_set(self, full_key, entry):
+        with self._lock:
+            self._local[full_key] = entry
+            self._local.move_to_end(full_key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _count(self, name):
+        if name in self.LOOKUP_RESULTS:
+            metrics.inc('cache_requests_total', cache='tiered', result=self.LOOKUP_RESULTS[name])
+        with self._lock:
+            self._stats[name] += 1
+            self._unflushed[name] += 1
+            if time.monotonic() - self._last_flush < self.STATS_FLUSH_INTERVAL:
+                return
+            pending = {n: count for n, count in self._unflushed.items() if count}
+            self._unflushed = dict.fromkeys(self.STAT_NAMES, 0)
+            self._last_flush = time.monotonic()
+
+        # Batched so hits don't cost a shared cache write each
+        for name, count in pending.items():
+            key = self._stats_key(name)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:  # evicted in between
+                cache.set(key, count, None)
+
+    def _stats_key(self, name):
+        return f"{self.prefix}:stats:{name}"
+
+
+tiered_cache = TieredCache()
@@ -0,0 +1,61 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back, so csv.writer can feed a generator"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_export(rows, fields, fmt):
+    """
+    Serialize `rows` (dicts, usually a values().iterator() queryset) line by line.
+    Nothing is buffered, so memory stays flat however many rows there are.
+    """
+    if fmt == 'csv':
+        return iter_csv(rows, fields)
+    return iter_jsonl(rows)
+
+
+def export_response(rows, fields, fmt, filename):
+    """Stream an export to the browser as a file download"""
+    response = StreamingHttpResponse(iter_export(rows, fields, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def write_export(rows, fields, fmt, path):
+    """Write the same export format to disk (used by the export_* management commands)"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for line in iter_export(rows, fields, fmt):
+            f.write(line)
+            count += 1
+    return count - 1 if fmt == 'csv' else count  # don't count the CSV header
+
+
+def get_export_format(request):
+    fmt = request.GET.get('format', 'csv')
+    return fmt if fmt in EXPORT_FORMATS else 'csv'
@@ -0,0 +1,55 @@
+import hashlib
+import os
+import pickle
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+# FileBasedCache with an atomic add() and incr() (CACHES in settings.py).
+#
+# Django's file cache runs add() as has_key() then set(), and incr() as get()
+# then set(), so two workers can both "win" an add or lose an increment. The
+# tiered cache's single-flight lock and the content versions' first value
+# (project/caching.py, project/versions.py) rely on add() having exactly one
+# winner. Here both run under an exclusive lock on a lock file picked by the
+# key's hash - a fixed set of files, so they never pile up next to the cache.
+
+LOCK_STRIPES = 64
+
+
+class AtomicFileBasedCache(FileBasedCache):
+
+    @contextmanager
+    def _key_lock(self, key, version):
+        stripe = int(hashlib.md5(self._key_to_file(key, version).encode()).hexdigest(), 16) % LOCK_STRIPES
+        lock_dir = os.path.join(self._dir, 'locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f"{stripe:02d}.lock"), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._key_lock(key, version):
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # Keeps the entry's expiry; BaseCache.incr() would set it to the default timeout
+        with self._key_lock(key, version):
+            try:
+                with open(self._key_to_file(key, version), 'rb') as f:
+                    expiry = pickle.load(f)
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except FileNotFoundError:
+                raise ValueError(f"Key '{key}' not found")
+            if expiry is not None and expiry < time.time():
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            self.set(key, value, None if expiry is None else expiry - time.time(), version)
+            return value
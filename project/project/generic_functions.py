@@ -1,8 +1,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+import logging
 import random
 
+logger = logging.getLogger(__name__)
+
 @login_required
 def _generic_form_view(request, form_class, template_name, success_url_name, pk=None, extra_context=None):
     """
@@ -49,7 +52,7 @@ def _generic_form_view(request, form_class, template_name, success_url_name, pk=
                 return redirect(success_url_name)
         else:
             messages.error(request, "Please correct the errors below.")
-            print("Form errors:", form.errors)
+            logger.debug("%s invalid: %s", form_class.__name__, form.errors.get_json_data())
     else:
         form = form_class(instance=instance)
 
@@ -71,7 +74,6 @@ def _generic_form_view(request, form_class, template_name, success_url_name, ins
             # Set owner for Antique or user for Wishlist if creating a new object
             if instance is None:
                 obj.owner = request.user if hasattr(obj, 'owner') else None
-                print(f"Set owner to {obj.owner}")
             
             obj.save()
             form.save_m2m()
@@ -85,7 +87,7 @@ def _generic_form_view(request, form_class, template_name, success_url_name, ins
             return redirect(success_url_name)
         else:
             messages.error(request, "Please correct the errors below.")
-            print(f"Form errors: {form.errors}")
+            logger.debug("%s invalid: %s", form_class.__name__, form.errors.get_json_data())
     else:
         form = form_class(instance=instance)
 
@@ -106,16 +108,15 @@ def _generic_delete(request, model_class, pk_or_slug, success_url_name):
     # Try to get by primary key first
     try:
         instance = model_class.objects.get(pk=pk_or_slug, owner=request.user)
-        print(f"DEBUG: Found instance by PK ({pk_or_slug})")
     except (model_class.DoesNotExist, ValueError):
-        print(f"DEBUG: No instance found by PK ({pk_or_slug}). Trying slug...")
         instance = model_class.objects.filter(slug=pk_or_slug, owner=request.user).first()
 
     # If not found by PK, try slug
     if instance is None:
         instance = get_object_or_404(model_class, slug=pk_or_slug, owner=request.user)
-        print(f"DEBUG: Found instance by slug ({pk_or_slug})")
 
+    logger.info("Deleting %s %s", model_class.__name__, instance.pk,
+                extra={'model': model_class.__name__, 'pk': instance.pk, 'user_id': request.user.pk})
     instance.delete()
 
     return redirect(success_url_name)
@@ -0,0 +1,126 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+# Logging that stays off the request thread.
+#
+# Modules log through logging.getLogger(__name__) with %-style arguments, so a
+# record below its logger's level is dropped before its message is built -
+# nothing is rendered, nothing is queried. Records that do pass are handed to
+# QueueHandler, which renders the message and any exception in the calling
+# thread (their arguments may be querysets, which must not be evaluated
+# elsewhere) and puts the record on a bounded queue. A listener thread does the
+# formatting and the writing. When the queue is full the record is dropped and
+# counted (log_records_dropped_total) rather than making the request wait.
+#
+# The levels, per module, are in settings.LOGGING; JsonFormatter writes one
+# JSON object per line, with anything passed as `extra=` as extra keys.
+
+QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, the `extra=` fields and the exception"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(_extra(record))
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+def _extra(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+def _plain(value):
+    return value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Writes to `stream` (stderr by default) from a listener thread. The
+    formatter set on this handler is the one the listener uses.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.Queue(QUEUE_SIZE))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self._listener = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Everything that may touch the caller's objects happens here, in the caller's thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in _extra(record).items():
+            setattr(record, key, _plain(value))
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            from . import metrics  # not at import time: this module loads with the settings
+            metrics.inc('log_records_dropped_total')
+
+    def _ensure_listener(self):
+        # Started on first use, and again after a fork, so every worker writes its own records
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener = logging.handlers.QueueListener(self.queue, self.target)
+            self._listener.start()
+            self._listener_pid = os.getpid()
+
+    def flush(self):
+        """Wait until every queued record has been written"""
+        if self._listener_pid == os.getpid():
+            self.queue.join()  # the listener marks each record done once it's written
+        self.target.flush()
+
+    def stop(self):
+        if self._listener_pid == os.getpid():
+            self._listener.stop()  # writes out what's left
+            self._listener_pid = None
+
+
+@contextmanager
+def quiet(level=logging.INFO):
+    """Drop every record at `level` and below while the block runs"""
+    logging.disable(level)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
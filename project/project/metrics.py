@@ -0,0 +1,402 @@
+import atexit
+import bisect
+import fcntl
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import stripe
+from django.conf import settings
+from django.core.mail.backends import smtp
+from django.db import connection
+
+# In-process metrics, aggregated across workers.
+#
+# Each worker keeps counters, gauges and histograms in memory and a daemon
+# thread writes them to its own file, METRICS_DIR/<pid>.json, every
+# FLUSH_INTERVAL seconds (atomically, with a rename), so workers never
+# contend for anything while counting. collect() sums the files of every
+# worker; counters and histograms of workers that have exited are folded
+# into archive.json so totals survive restarts, while their gauges are
+# dropped. expose() renders the result in the Prometheus text format.
+
+FLUSH_INTERVAL = 5
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)  # Stripe retries failed deliveries for days
+ARCHIVE = 'archive.json'
+
+# name -> (type, help)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', "Time to build a response, per URL name"),
+    'http_request_db_seconds': ('histogram', "Time spent in database queries per request, per URL name"),
+    'db_queries_total': ('counter', "Database queries run by requests, per URL name"),
+    'cache_requests_total': ('counter', "Cache lookups by cache and result"),
+    'cache_hit_ratio': ('gauge', "Share of cache lookups that were hits, per cache"),
+    'stripe_request_duration_seconds': ('histogram', "Stripe API round trips, per endpoint"),
+    'emails_sent_total': ('counter', "Outgoing emails by result"),
+    'email_send_duration_seconds': ('histogram', "Time to hand a batch of emails to the SMTP server"),
+    'background_jobs_queued': ('gauge', "Jobs waiting on the background queue (project/tasks.py)"),
+    'stripe_webhook_lag_seconds': ('histogram', "Time from Stripe creating an event to the webhook handling it"),
+    'log_records_dropped_total': ('counter', "Log records dropped because the logging queue was full (project/log.py)"),
+}
+
+logger = logging.getLogger(__name__)
+
+CACHE_HITS = {'tiered': ('local_hit', 'shared_hit', 'stale_hit'), 'page': ('hit',)}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._gauges = {}      # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [buckets, counts per bucket, sum, count]
+        self._collectors = []
+        self._flusher_pid = None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._ensure_flusher()
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+        self._ensure_flusher()
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [list(buckets), [0] * (len(buckets) + 1), 0.0, 0]
+            histogram[1][bisect.bisect_left(histogram[0], value)] += 1
+            histogram[2] += value
+            histogram[3] += 1
+        self._ensure_flusher()
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def register_collector(self, collector):
+        """`collector()` runs before every flush, to set gauges that are read rather than counted"""
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        for collector in self._collectors:
+            collector()
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'written_at': time.time(),
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [
+                    [name, dict(labels), buckets, list(counts), total, count]
+                    for (name, labels), (buckets, counts, total, count) in self._histograms.items()
+                ],
+            }
+
+    def flush(self):
+        """Write this worker's values to its file; they're cumulative, so the file is simply replaced"""
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        _write_json(directory / f"{os.getpid()}.json", self.snapshot())
+
+    def _ensure_flusher(self):
+        # Started lazily, and again after a fork, so every worker gets its own
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("Failed to write metrics: %s", e)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _write_json(path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+registry = Registry()
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+register_collector = registry.register_collector
+
+
+@atexit.register
+def _flush_at_exit():
+    if registry._flusher_pid == os.getpid():
+        try:
+            registry.flush()
+        except OSError:
+            pass
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe how long the block took, in seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+# ------------------------------
+# Aggregation and exposition
+# ------------------------------
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(totals, data, gauges=True):
+    for name, labels, value in data['counters']:
+        key = (name, _label_key(labels))
+        totals['counters'][key] = totals['counters'].get(key, 0) + value
+    if gauges:
+        for name, labels, value in data['gauges']:
+            key = (name, _label_key(labels))
+            totals['gauges'][key] = totals['gauges'].get(key, 0) + value
+    for name, labels, buckets, counts, total, count in data['histograms']:
+        key = (name, _label_key(labels))
+        current = totals['histograms'].get(key)
+        if current is None or current[0] != buckets:
+            totals['histograms'][key] = [buckets, list(counts), total, count]
+        else:
+            current[1] = [a + b for a, b in zip(current[1], counts)]
+            current[2] += total
+            current[3] += count
+
+
+def _as_data(totals):
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in totals['counters'].items()],
+        'gauges': [],
+        'histograms': [[name, dict(labels), *rest] for (name, labels), rest in totals['histograms'].items()],
+    }
+
+
+def _empty():
+    return {'counters': {}, 'gauges': {}, 'histograms': {}}
+
+
+@contextmanager
+def _locked(directory):
+    with open(directory / '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def collect():
+    """Every worker's values summed, as {'counters', 'gauges', 'histograms'} keyed by (name, labels)"""
+    registry.flush()  # so this worker's latest values are in
+    directory = Path(settings.METRICS_DIR)
+    totals = _empty()
+    with _locked(directory):
+        archive_path = directory / ARCHIVE
+        archived = _empty()
+        if archive_path.exists():
+            _merge(archived, json.loads(archive_path.read_text()))
+        retired = []
+        for path in directory.glob('*.json'):
+            if path.name == ARCHIVE:
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(data['pid']):
+                _merge(totals, data)
+            else:
+                _merge(archived, data, gauges=False)
+                retired.append(path)
+        if retired:
+            _write_json(archive_path, _as_data(archived))
+            for path in retired:
+                path.unlink(missing_ok=True)
+    _merge(totals, _as_data(archived))
+
+    # Derived, so a dashboard doesn't need the query for it
+    for cache, hits in CACHE_HITS.items():
+        lookups = {
+            dict(labels)['result']: value
+            for (name, labels), value in totals['counters'].items()
+            if name == 'cache_requests_total' and dict(labels).get('cache') == cache
+        }
+        if sum(lookups.values()):
+            ratio = sum(lookups.get(result, 0) for result in hits) / sum(lookups.values())
+            totals['gauges'][('cache_hit_ratio', (('cache', cache),))] = round(ratio, 4)
+    return totals
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), "")}"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def expose():
+    """All metrics in the Prometheus text exposition format"""
+    totals = collect()
+    by_name = {}
+    for kind in ('counters', 'gauges', 'histograms'):
+        for (name, labels), value in totals[kind].items():
+            by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = METRICS.get(name, ('untyped', name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind != 'histogram':
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            buckets, counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(float(total))}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def is_internal(request):
+    """Whether the request comes from one of METRICS_ALLOWED_NETWORKS, with the METRICS_TOKEN if one is set"""
+    if settings.METRICS_TOKEN:
+        # Behind a local reverse proxy every request comes from an allowed address
+        scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+            return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+# ------------------------------
+# Instrumentation
+# ------------------------------
+
+class _QueryTimer:
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """Request latency, DB time and query count per URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        observe('http_request_duration_seconds', duration,
+                view=view, method=request.method, status=f"{response.status_code // 100}xx")
+        observe('http_request_db_seconds', queries.seconds, view=view)
+        if queries.queries:
+            inc('db_queries_total', queries.queries, view=view)
+        return response
+
+
+# A whole path segment like cus_Nf3kQ or cs_test_a1B2c3: a prefix, then more underscores allowed, with at least one
+# digit or capital - which resource names such as payment_methods or line_items never have
+_stripe_id = re.compile(r"/[a-z]+_(?=[A-Za-z0-9_]*[A-Z0-9])[A-Za-z0-9_]+(?=/|$)")
+
+
+class StripeHTTPClient(stripe.RequestsClient):
+    """The default Stripe client, timing every round trip (retries included, each on its own)"""
+
+    def request(self, method, url, headers, post_data=None, **kwargs):
+        endpoint = _stripe_id.sub("/{id}", url.split('?', 1)[0].split('/v1/', 1)[-1])
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            content, status, response_headers = super().request(method, url, headers, post_data, **kwargs)
+            return content, status, response_headers
+        finally:
+            observe('stripe_request_duration_seconds', time.perf_counter() - started,
+                    method=method.upper(), endpoint=endpoint, status=status)
+
+
+class EmailBackend(smtp.EmailBackend):
+    """Django's SMTP backend, counting and timing what it sends"""
+
+    def send_messages(self, email_messages):
+        started = time.perf_counter()
+        try:
+            sent = super().send_messages(email_messages)
+        except Exception:
+            inc('emails_sent_total', len(email_messages or ()), result='failed')
+            raise
+        observe('email_send_duration_seconds', time.perf_counter() - started)
+        inc('emails_sent_total', sent or 0, result='sent')
+        if email_messages and (sent or 0) < len(email_messages):
+            inc('emails_sent_total', len(email_messages) - (sent or 0), result='failed')
+        return sent
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+# PostgreSQL-only parts of the schema.
+#
+# Some indexes only exist on PostgreSQL: trigram GIN indexes for icontains
+# searches, BRIN indexes for append-mostly timestamp columns. They are created
+# with RunPostgresSQL, which does nothing on other databases, and they are kept
+# out of the models' Meta.indexes on purpose - SQLite rebuilds a table with the
+# indexes Django knows about whenever a column changes, and would fail on them.
+
+
+class RunPostgresSQL(migrations.RunSQL):
+    """RunSQL that only runs on PostgreSQL; other databases skip it, both ways"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return "Raw SQL operation (PostgreSQL only)"
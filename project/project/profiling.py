@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+# Opt-in per-request profiling.
+#
+# ProfilingMiddleware profiles a random PROFILE_SAMPLE_RATE share of requests,
+# plus any request carrying an X-Profile header signed with profile_token().
+# A profiled request gets a sampler thread that records the request thread's
+# Python stack every SAMPLE_INTERVAL seconds; nothing is added to the request
+# thread itself, so unprofiled requests pay one random() call.
+#
+# Each profile is written to PROFILE_DIR as JSON holding the folded stacks
+# ("outer;inner;leaf": samples), i.e. the call tree. The file name carries the
+# start time, duration and view name, so the slowest can be listed without
+# opening them. Only the newest PROFILE_KEEP files are kept.
+
+SAMPLE_INTERVAL = 0.001  # seconds; in practice bounded below by sys.getswitchinterval()
+TOKEN_SALT = 'project.profiling'
+TOKEN_MAX_AGE = 60 * 60  # seconds a signed X-Profile header stays valid
+HEADER = 'HTTP_X_PROFILE'
+
+logger = logging.getLogger(__name__)
+
+_file_name = re.compile(r"^(?P<started>\d{8}T\d{12})_(?P<duration>\d+)ms_(?P<view>[\w.-]+)\.json$")
+
+
+def profile_token():
+    """A value for the X-Profile header that makes the middleware profile that request"""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def _has_valid_token(request):
+    token = request.META.get(HEADER)
+    if not token:
+        return False
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread, counting identical stacks"""
+
+    def __init__(self, thread_id, stop_at=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.stop_at = stop_at  # code object of the frame the stacks are cut at (not included)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._fold(frame)] += 1
+
+    def _fold(self, frame):
+        names = []
+        while frame is not None and frame.f_code is not self.stop_at:
+            names.append(frame_label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+_STDLIB = os.path.dirname(os.__file__) + os.sep
+
+
+def frame_label(code):
+    """function (path:line), with the path shortened to the project or the installed package"""
+    path = code.co_filename
+    base = str(settings.BASE_DIR) + os.sep
+    if path.startswith(base):
+        path = path[len(base):]
+    elif 'site-packages' + os.sep in path:
+        path = path.split('site-packages' + os.sep, 1)[1]
+    elif path.startswith(_STDLIB):
+        path = path[len(_STDLIB):]
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = self._reason(request)
+        if reason is None:
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), stop_at=ProfilingMiddleware.__call__.__code__).start()
+        started_at = timezone.now()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            stacks = sampler.stop()
+        try:
+            save_profile(request, response, reason, started_at, duration, stacks)
+        except OSError as e:
+            logger.warning("Failed to save profile for %s: %s", request.path, e)
+        return response
+
+    def _reason(self, request):
+        if _has_valid_token(request):
+            return 'header'
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return 'sampled'
+        return None
+
+
+# ------------------------------
+# Storage
+# ------------------------------
+
+def save_profile(request, response, reason, started_at, duration, stacks):
+    match = request.resolver_match
+    view = re.sub(r"[^\w.-]", ".", match.view_name if match else 'unresolved')
+    duration_ms = round(duration * 1000)
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    name = f"{started_at:%Y%m%dT%H%M%S%f}_{duration_ms}ms_{view}.json"
+    (directory / name).write_text(json.dumps({
+        'view': match.view_name if match else None,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'reason': reason,
+        'started_at': started_at.isoformat(),
+        'duration_ms': duration_ms,
+        'samples': sum(stacks.values()),
+        'stacks': dict(stacks),
+    }))
+    _rotate(directory)
+
+
+def _rotate(directory):
+    # Names start with the timestamp, so name order is age order
+    names = sorted(name for name in os.listdir(directory) if _file_name.match(name))
+    for name in names[:max(0, len(names) - settings.PROFILE_KEEP)]:
+        try:
+            os.remove(directory / name)
+        except FileNotFoundError:  # another worker got there first
+            pass
+
+
+def list_profiles(limit=50):
+    """The slowest stored profiles, slowest first, from their file names alone"""
+    directory = Path(settings.PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        match = _file_name.match(name)
+        if match:
+            profiles.append({
+                'name': name,
+                'view': match['view'],
+                'duration_ms': int(match['duration']),
+                'started_at': datetime.strptime(match['started'], '%Y%m%dT%H%M%S%f').replace(tzinfo=dt_timezone.utc),
+            })
+    profiles.sort(key=lambda profile: profile['duration_ms'], reverse=True)
+    return profiles[:limit]
+
+
+def load_profile(name):
+    """A stored profile by file name, or None if there is no such profile"""
+    if not _file_name.match(name):
+        return None
+    try:
+        return json.loads((Path(settings.PROFILE_DIR) / name).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# ------------------------------
+# Summaries
+# ------------------------------
+
+MIN_SHARE = 0.005  # frames under this share of the samples are left out of the flame summary
+
+
+def flame_rows(stacks, duration_ms):
+    """
+    The call tree as icicle rows: one dict per frame with its depth, left
+    offset and width (percent of all samples), samples and estimated ms.
+    Callers come before callees; siblings are ordered by name.
+    """
+    total = sum(stacks.values())
+    if not total:
+        return []
+    tree = {}
+    for stack, count in stacks.items():
+        node = tree
+        for name in stack.split(";") if stack else ['(middleware)']:
+            entry = node.setdefault(name, {'count': 0, 'children': {}})
+            entry['count'] += count
+            node = entry['children']
+
+    rows = []
+
+    def walk(node, depth, left):
+        for name in sorted(node):
+            entry = node[name]
+            share = entry['count'] / total
+            if share >= MIN_SHARE:
+                rows.append({
+                    'name': name,
+                    'project': _is_project_frame(name),
+                    'depth': depth,
+                    'left': left * 100,
+                    'width': share * 100,
+                    'samples': entry['count'],
+                    'ms': share * duration_ms,
+                })
+                walk(entry['children'], depth + 1, left)
+            left += share
+
+    walk(tree, 0, 0)
+    return rows
+
+
+def _is_project_frame(name):
+    # frame_label() leaves project paths relative to BASE_DIR, e.g. "view_antiques (antiques/views.py:130)"
+    top = name.rpartition(" (")[2].split(os.sep, 1)[0]
+    return bool(top) and (Path(settings.BASE_DIR) / top).is_dir()
+
+
+def hottest_frames(stacks, duration_ms, limit=20):
+    """Frames by self time: samples where they were the innermost frame"""
+    total = sum(stacks.values())
+    own = Counter()
+    for stack, count in stacks.items():
+        own[stack.rsplit(";", 1)[-1] or '(middleware)'] += count
+    return [
+        {'name': name, 'samples': count, 'share': count / total * 100, 'ms': count / total * duration_ms}
+        for name, count in own.most_common(limit)
+    ]
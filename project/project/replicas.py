@@ -0,0 +1,115 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Read replicas for the read-only views.
+#
+# settings.DATABASE_REPLICAS names database aliases holding copies of the
+# default database. ReplicaRouter sends a read to one of them only while a view
+# decorated with @use_replica runs, and only until something decides to write:
+# the first db_for_write() of the request pins the rest of it to the primary, as
+# does an open transaction. ReplicaMiddleware then sets a short-lived cookie on
+# the response, so the same visitor's next requests (e.g. the redirect after a
+# form) also read from the primary for REPLICA_PIN_SECONDS and see their own
+# write, whatever the replication lag. The visitor's session and user are
+# loaded before a view's reads switch over; everything else (forms, accounts,
+# the webhook) always uses the primary.
+#
+# A page rebuilt from a lagging replica just after a content version bump is
+# cached under the new version, so replicas should lag well under a second.
+
+PIN_COOKIE = 'primary_pin'
+
+
+class _RequestState:
+    def __init__(self, pinned=False):
+        self.replica_allowed = False
+        self.pinned = pinned  # a write happened, in this request or (via the cookie) a recent one
+        self.wrote = False
+        self.alias = None  # one replica per request, so its reads agree with each other
+
+
+_state = ContextVar('replica_state', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is None or not state.replica_allowed or state.pinned
+            or not settings.DATABASE_REPLICAS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            # Explicit, or Django would read related objects from wherever their instance came from
+            return DEFAULT_DB_ALIAS
+        if state.alias is None:
+            state.alias = random.choice(settings.DATABASE_REPLICAS)
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS  # even for an instance that was read from a replica
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema with the data, from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Scopes the router's state to a request, and pins a visitor to the primary after a write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned_until(request) > time.time()
+        token = _state.set(_RequestState(pinned=pinned))
+        try:
+            response = self.get_response(request)
+            if _state.get().wrote and settings.DATABASE_REPLICAS:
+                response.set_cookie(
+                    PIN_COOKIE, str(time.time() + settings.REPLICA_PIN_SECONDS),
+                    max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+                )
+            return response
+        finally:
+            _state.reset(token)
+
+
+def _pinned_until(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0))
+    except ValueError:
+        return 0
+
+
+def use_replica(view_func):
+    """Let the view's reads go to a replica (see ReplicaRouter); outermost, so ETag and page-cache lookups are covered"""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        state = _state.get()
+        if state is None:  # called outside ReplicaMiddleware, e.g. directly from a test
+            return view_func(request, *args, **kwargs)
+        # The session and user first, from the primary: a replica may not have a session created a moment ago
+        if hasattr(request, 'user'):
+            request.user.is_authenticated
+        state.replica_allowed = True
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            state.replica_allowed = False
+    return _wrapped_view
@@ -0,0 +1,52 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+# Short write transactions, one at a time per worker.
+#
+# With IMMEDIATE transactions (settings.DATABASES) SQLite already makes writers
+# wait their turn, but a waiting connection polls with growing sleeps, so under
+# contention a write can sit idle after the lock has been released. Within one
+# worker the threads queue on a plain lock instead and go the moment it's free;
+# across workers SQLite's own lock does the queueing. The lock is held from
+# BEGIN to COMMIT only - the on_commit hooks (cache writes, queued Stripe jobs)
+# run after it's released. Only for short transactions: nothing slow should
+# happen inside one.
+#
+# On PostgreSQL writers only wait for each other on the rows they both touch,
+# so there write_transaction() is plain transaction.atomic().
+
+_write_lock = threading.Lock()
+
+
+@contextmanager
+def write_transaction(using=None):
+    """transaction.atomic() that first waits for this worker's other writers to finish"""
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite':
+        with transaction.atomic(using=using):
+            yield
+        return
+    if connection.in_atomic_block:
+        # Already in a transaction, which holds the write lock; taking ours too could deadlock
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    held = True
+
+    def release():
+        nonlocal held
+        if held:
+            held = False
+            _write_lock.release()
+
+    # Taken before BEGIN: a thread holding SQLite's lock must never wait for ours
+    _write_lock.acquire()
+    try:
+        with transaction.atomic(using=using):
+            transaction.on_commit(release, using=using)  # the first hook, so it runs before the others
+            yield
+    finally:
+        release()
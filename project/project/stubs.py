@@ -0,0 +1,385 @@
+# project/stubs.py
+"""
+Local stand-ins for the outside services, so checkout, webhooks and email can
+run (and be load-tested) without Stripe or Gmail.
+
+StripeStub serves the slice of the Stripe API the site calls - customers,
+products, prices, checkout and billing portal sessions, payment intents,
+charges and invoices - from memory. Point stripe.api_base at its `url`.
+Each checkout session's `url` is a fake hosted payment page: requesting it
+marks the session paid and redirects to the session's success_url, and a
+signed checkout.session.completed webhook is delivered to the site in the
+background, the way Stripe does it.
+
+SmtpSink is an SMTP server that accepts and keeps every message. Point
+EMAIL_HOST/EMAIL_PORT at it, with TLS off and no login.
+"""
+import hashlib
+import hmac
+import json
+import re
+import secrets
+import socketserver
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+
+def stripe_signature(payload, secret):
+    """A Stripe-Signature header for `payload`, so webhook views run their real verification"""
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def percentiles(values):
+    """p50/p95/p99 of a list of numbers, rounded for reports"""
+    if len(values) < 2:
+        value = round(values[0], 2) if values else 0
+        return {'p50': value, 'p95': value, 'p99': value}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': round(cuts[49], 2), 'p95': round(cuts[94], 2), 'p99': round(cuts[98], 2)}
+
+
+# ------------------------------
+# Stripe
+# ------------------------------
+
+# API path -> (id prefix, object name)
+STRIPE_RESOURCES = {
+    'customers': ('cus', 'customer'),
+    'products': ('prod', 'product'),
+    'prices': ('price', 'price'),
+    'checkout/sessions': ('cs', 'checkout.session'),
+    'billing_portal/sessions': ('bps', 'billing_portal.session'),
+    'payment_intents': ('pi', 'payment_intent'),
+    'charges': ('ch', 'charge'),
+    'invoices': ('in', 'invoice'),
+}
+
+_resource_path = re.compile(r"^/v1/(?P<resource>%s)(?:/(?P<id>[\w-]+))?/?$" % "|".join(STRIPE_RESOURCES))
+
+
+def _form_value(value):
+    # Stripe's form encoding turns everything into strings
+    if value in ('true', 'false'):
+        return value == 'true'
+    if value.isdigit():
+        return int(value)
+    return value
+
+
+def _listify(value):
+    if isinstance(value, dict):
+        value = {key: _listify(item) for key, item in value.items()}
+        if value and all(key.isdigit() for key in value):
+            return [value[key] for key in sorted(value, key=int)]
+    return value
+
+
+def decode_form(body):
+    """Stripe's bracketed form encoding (metadata[user_id]=1&line_items[0][price]=x) back into dicts and lists"""
+    data = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r"[^\[\]]+", key)
+        target = data
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = _form_value(value)
+    return _listify(data)
+
+
+class StripeStub:
+    """An in-memory Stripe API on localhost, with hosted checkout and webhook delivery"""
+
+    def __init__(self, webhook_url, webhook_secret, webhook_delay=0.0, webhook_workers=4):
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.webhook_delay = webhook_delay
+        self.objects = {}
+        self.requests = 0
+        # (milliseconds from payment to the webhook's response, status code or None on a connection error)
+        self.deliveries = []
+        self._lock = threading.Lock()
+        self._webhooks = ThreadPoolExecutor(max_workers=webhook_workers, thread_name_prefix='stripe-webhooks')
+        self._server = None
+
+    def start(self):
+        stub = self
+
+        class Handler(_StripeHandler):
+            pass
+        Handler.stub = stub
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        host, port = self._server.server_address
+        self.url = f"http://{host}:{port}"
+        threading.Thread(target=self._server.serve_forever, name='stripe-stub', daemon=True).start()
+        return self
+
+    def wait_for_webhooks(self):
+        """Block until every webhook already scheduled has been delivered"""
+        self._webhooks.shutdown(wait=True)
+
+    def stop(self):
+        self.wait_for_webhooks()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def webhook_report(self):
+        with self._lock:
+            deliveries = list(self.deliveries)
+        failed = sum(1 for _, status in deliveries if status is None or status >= 300)
+        return {
+            'delivered': len(deliveries) - failed,
+            'failed': failed,
+            'latency_ms': percentiles([ms for ms, _ in deliveries]),
+        }
+
+    # ------------------------------
+    # Objects
+    # ------------------------------
+
+    def create(self, resource, params):
+        prefix, name = STRIPE_RESOURCES[resource]
+        obj = {
+            'id': f"{prefix}_{secrets.token_hex(12)}",
+            'object': name,
+            'livemode': False,
+            'created': int(time.time()),
+            'metadata': {},
+            **params,
+        }
+        if resource == 'checkout/sessions':
+            obj.update(
+                url=f"{self.url}/pay/{obj['id']}",
+                status='open',
+                payment_status='unpaid',
+                payment_intent=None,
+                currency='aud',
+                amount_total=self._amount_total(params.get('line_items', [])),
+            )
+        elif resource == 'billing_portal/sessions':
+            obj['url'] = f"{self.url}/portal/{obj['id']}"
+        elif resource in ('products', 'prices'):
+            obj.setdefault('active', True)
+        with self._lock:
+            self.objects[obj['id']] = obj
+        return obj
+
+    def get(self, object_id):
+        with self._lock:
+            return self.objects.get(object_id)
+
+    def modify(self, object_id, params):
+        with self._lock:
+            obj = self.objects.get(object_id)
+            if obj is not None:
+                obj.update(params)
+            return obj
+
+    def _amount_total(self, line_items):
+        total = 0
+        for item in line_items:
+            price = self.get(item.get('price')) if isinstance(item, dict) else None
+            if price:
+                total += price.get('unit_amount', 0) * item.get('quantity', 1)
+        return total
+
+    # ------------------------------
+    # Hosted checkout
+    # ------------------------------
+
+    def pay(self, session_id):
+        """Complete a checkout session as if the card went through. Returns the session, or None."""
+        session = self.get(session_id)
+        if session is None or session['status'] != 'open':
+            return None
+        charge = self.create('charges', {'receipt_url': f"{self.url}/receipts/{session_id}", 'paid': True})
+        intent = self.create('payment_intents', {
+            'status': 'succeeded',
+            'amount': session['amount_total'],
+            'amount_received': session['amount_total'],
+            'currency': session['currency'],
+            'latest_charge': charge['id'],
+        })
+        session = self.modify(session_id, {'status': 'complete', 'payment_status': 'paid', 'payment_intent': intent['id']})
+        self._webhooks.submit(self._deliver, 'checkout.session.completed', dict(session), time.perf_counter())
+        return session
+
+    def _deliver(self, event_type, obj, paid_at):
+        if self.webhook_delay:
+            time.sleep(self.webhook_delay)
+        payload = json.dumps({
+            'id': f"evt_{secrets.token_hex(12)}",
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': obj},
+        })
+        try:
+            response = requests.post(self.webhook_url, data=payload, timeout=30, headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': stripe_signature(payload, self.webhook_secret),
+            })
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        with self._lock:
+            self.deliveries.append(((time.perf_counter() - paid_at) * 1000, status))
+
+
+class _StripeHandler(BaseHTTPRequestHandler):
+    stub = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        with self.stub._lock:
+            self.stub.requests += 1
+
+        if path.startswith('/pay/'):
+            session = self.stub.pay(path.rsplit('/', 1)[1])
+            if session is None:
+                return self._send(404, {'error': {'type': 'invalid_request_error', 'message': "No open session."}})
+            return self._redirect(session.get('success_url') or '/')
+        if path.startswith(('/portal/', '/receipts/')):
+            return self._send(200, {'ok': True})
+
+        match = _resource_path.match(path)
+        if match is None:
+            return self._not_found()
+        if match['id'] is None:  # list, e.g. stripe.Invoice.list(); nothing is ever invoiced here
+            return self._send(200, {'object': 'list', 'data': [], 'has_more': False, 'url': path})
+        obj = self.stub.get(match['id'])
+        return self._send(200, obj) if obj is not None else self._not_found(match['id'])
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        params = decode_form(self.rfile.read(length).decode())
+        with self.stub._lock:
+            self.stub.requests += 1
+
+        match = _resource_path.match(path)
+        if match is None:
+            return self._not_found()
+        if match['id'] is None:
+            return self._send(200, self.stub.create(match['resource'], params))
+        obj = self.stub.modify(match['id'], params)
+        return self._send(200, obj) if obj is not None else self._not_found(match['id'])
+
+    def _not_found(self, object_id=None):
+        message = f"No such object: '{object_id}'" if object_id else f"Unrecognized request URL ({self.path})."
+        return self._send(404, {'error': {'type': 'invalid_request_error', 'code': 'resource_missing', 'message': message}})
+
+    def _redirect(self, location):
+        self.send_response(303)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', f"req_{secrets.token_hex(8)}")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# ------------------------------
+# SMTP
+# ------------------------------
+
+class SmtpSink:
+    """A local SMTP server that accepts every message and keeps it in `messages`"""
+
+    def __init__(self):
+        self.messages = []  # {'sender', 'recipients', 'data'}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        sink = self
+
+        class Handler(_SmtpHandler):
+            pass
+        Handler.sink = sink
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+        threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def add(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append({'sender': sender, 'recipients': recipients, 'data': data})
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough of RFC 5321 for smtplib: no TLS, no AUTH"""
+    sink = None
+
+    def handle(self):
+        self._reply("220 localhost SMTP sink")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                self._reply("250-localhost" if verb == 'EHLO' else "250 localhost")
+                if verb == 'EHLO':
+                    self._reply("250 8BITMIME")
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(' <>'), []
+                self._reply("250 OK")
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip(' <>'))
+                self._reply("250 OK")
+            elif verb == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                self.sink.add(sender, recipients, self._read_data())
+                sender, recipients = None, []
+                self._reply("250 OK: queued")
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self._reply("250 OK")
+            elif verb == 'NOOP':
+                self._reply("250 OK")
+            elif verb == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+    def _read_data(self):
+        lines = []
+        for line in iter(self.rfile.readline, b''):
+            if line in (b".\r\n", b".\n"):
+                break
+            lines.append(line[1:] if line.startswith(b"..") else line)  # undo dot-stuffing
+        return b"".join(lines).decode('utf-8', 'replace')
+
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
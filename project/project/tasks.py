@@ -0,0 +1,49 @@
+import logging
+import queue
+import threading
+
+from django.db import transaction
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Background queue.
+#
+# A small in-process queue so slow work - Stripe round trips, recommendation
+# updates, image file deletion - never blocks a request. Jobs are best-effort:
+# anything still queued when the worker process exits is lost, and the next
+# edit (or the matching management command) will pick it up again.
+
+_jobs = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+metrics.register_collector(lambda: metrics.set_gauge('background_jobs_queued', _jobs.qsize()))
+
+
+def _run_jobs():
+    while True:
+        func, args, kwargs = _jobs.get()
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Background job %s.%s failed", func.__module__, func.__name__)
+        finally:
+            _jobs.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_jobs, name="background-jobs", daemon=True)
+            _worker.start()
+
+
+def enqueue(func, *args, **kwargs):
+    """Run `func` on the background worker once the current transaction commits"""
+    def _put():
+        _ensure_worker()
+        _jobs.put((func, args, kwargs))
+
+    transaction.on_commit(_put)
@@ -0,0 +1,186 @@
+import io
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import metrics, versions, viewcounts
+from .caching import tiered_cache
+
+# Query budgets for views.
+#
+# QueryBudgetTestCase.assertQueryBudget() requests a URL against a small and a
+# larger catalog (seeded with seed_catalog) and fails when either request needs
+# more SQL queries than the view's budget, or when the larger catalog needs
+# more queries than the small one - i.e. the view does something per row. The
+# failure lists the query shapes (SQL with the literals taken out) that grew
+# with the data, which points straight at the loop doing it.
+
+CATALOG_SIZES = (12, 40)  # enough to fill the dashboard sections; the larger spans a page of the paginated views
+CATALOG_SEED = 7
+
+
+class Catalog:
+    """The seeded rows a test can point its URL at, all scaling with `size`"""
+
+    def __init__(self, size):
+        from accounts.models import CustomUser, Seller
+        from antiques.models import Antique, Wishlist
+        from payments.models import Order
+        from service.models import BlogPost, EmailTemplate, Subscriber
+
+        self.size = size
+        call_command(
+            'seed_catalog', size, users=2, sellers=1, orders=size, posts=size,
+            max_wishlist_size=0, seed=CATALOG_SEED, stdout=io.StringIO(),
+        )
+
+        self.seller = Seller.objects.select_related('user').get()
+        self.seller_user = self.seller.user
+        self.buyer, self.other_buyer = CustomUser.objects.filter(seller__isnull=True).order_by('pk')
+        CustomUser.objects.filter(pk=self.buyer.pk).update(stripe_customer_id='cus_budget')
+        self.buyer.stripe_customer_id = 'cus_budget'
+        # bulk_create, so the Stripe customer signal doesn't run
+        self.superuser = CustomUser.objects.bulk_create([CustomUser(
+            email=f"admin-{size}@example.com", is_staff=True, is_superuser=True,
+        )])[0]
+
+        # Every other antique sold, so the sold and unsold sections of a page are filled at every size
+        antique_ids = list(Antique.objects.order_by('pk').values_list('pk', flat=True))
+        Antique.objects.filter(pk__in=antique_ids[::2]).update(quantity=1, is_sold=False)
+        Antique.objects.filter(pk__in=antique_ids[1::2]).update(quantity=0, is_sold=True)
+        call_command('recompute_seller_stats', stdout=io.StringIO())
+
+        # Everything the buyer sees grows with the catalog: one wishlist holding every antique, every order
+        self.antiques = list(Antique.objects.order_by('pk'))
+        self.antique = self.antiques[0]
+        self.wishlist = Wishlist.objects.get(owner=self.buyer)
+        Wishlist.antiques.through.objects.bulk_create([
+            Wishlist.antiques.through(wishlist=self.wishlist, antique=antique) for antique in self.antiques
+        ])
+        Antique.refresh_wishlist_counts([antique.pk for antique in self.antiques])
+        Order.objects.update(user=self.buyer)
+        self.order = Order.objects.order_by('pk').first()
+        self.post = BlogPost.objects.order_by('pk').first()
+
+        Subscriber.objects.bulk_create([Subscriber(email=f"subscriber-{i}@example.com") for i in range(size)])
+        EmailTemplate.objects.bulk_create([
+            EmailTemplate(name=f"Draft {i}", subject=f"Draft {i}", body="<p>Hello</p>", created_by=self.superuser)
+            for i in range(size)
+        ])
+
+
+def query_shape(sql):
+    """The SQL with its literals taken out, so the same query for different rows compares equal"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    return re.sub(r"\((?:\?, )+\?\)", "(...)", sql)
+
+
+def isolated_settings(directory):
+    """
+    Settings that keep tests away from the project's own state: a local-memory
+    cache instead of the shared file cache (which cache.clear() would wipe),
+    and media, metrics and profiles under `directory`.
+    """
+    return override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        MEDIA_ROOT=os.path.join(directory, 'media'),
+        METRICS_DIR=os.path.join(directory, 'metrics'),
+        PROFILE_DIR=os.path.join(directory, 'profiles'),
+    )
+
+
+class TemporaryMediaTestCase(TestCase):
+    """TestCase with its own cache and MEDIA_ROOT, METRICS_DIR and PROFILE_DIR in a temporary directory"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.mkdtemp(prefix='test-')
+        cls.addClassCleanup(shutil.rmtree, directory, ignore_errors=True)
+        isolated = isolated_settings(directory)
+        isolated.enable()
+        cls.addClassCleanup(isolated.disable)
+
+
+class TestRunner(DiscoverRunner):
+    """The test runner (TEST_RUNNER): isolated_settings() around the whole run, for the tests outside a TemporaryMediaTestCase"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directory = tempfile.mkdtemp(prefix='test-')
+        self._isolated = isolated_settings(self._directory)
+        self._isolated.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Skip the flush at exit, which would write the tests' metrics to the real METRICS_DIR
+        metrics.registry._flusher_pid = None
+        self._isolated.disable()
+        shutil.rmtree(self._directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetTestCase(TemporaryMediaTestCase):
+
+    def assertQueryBudget(self, budget, url_name, args=None, user=None, method='get', data=None,
+                          status=200, **extra):
+        """
+        Request `url_name` as `user` (a Catalog attribute such as 'buyer', or
+        None for an anonymous visitor) at each of CATALOG_SIZES and check it
+        takes at most `budget` queries, and no more for the larger catalog.
+        `args`, `data` and the `extra` request headers can be callables
+        taking the Catalog.
+        """
+        runs = [self._run(size, url_name, args, user, method, data, status, extra) for size in CATALOG_SIZES]
+        (small_size, small), (large_size, large) = zip(CATALOG_SIZES, runs)
+
+        if len(large) > len(small):
+            grown = Counter(map(query_shape, large)) - Counter(map(query_shape, small))
+            lines = [
+                f"  {Counter(map(query_shape, small))[shape]} -> {Counter(map(query_shape, large))[shape]}  {shape}"
+                for shape in grown
+            ]
+            self.fail(
+                f"{url_name} made {len(small)} queries with {small_size} antiques but {len(large)} with "
+                f"{large_size}. Queries that grew with the data:\n" + "\n".join(lines)
+            )
+        if len(large) > budget:
+            self.fail(
+                f"{url_name} made {len(large)} queries, over its budget of {budget}:\n"
+                + "\n".join(f"  {query_shape(sql)}" for sql in large)
+            )
+
+    def _run(self, size, url_name, args, user, method, data, status, extra):
+        with transaction.atomic():
+            catalog = Catalog(size)
+            url = reverse(url_name, args=args(catalog) if callable(args) else args)
+            payload = data(catalog) if callable(data) else data
+            headers = {key: value(catalog) if callable(value) else value for key, value in extra.items()}
+
+            client = Client()
+            if user:
+                client.force_login(getattr(catalog, user))
+            # Every run starts cold; content versions bump on commit, which never comes here
+            cache.clear()
+            tiered_cache.clear_local()
+            versions._seen.clear()
+
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(url, payload, **headers)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            self.assertEqual(response.status_code, status, f"{url_name} with {size} antiques")
+
+            viewcounts.flush()
+            transaction.set_rollback(True)
+        return [query['sql'] for query in queries.captured_queries]
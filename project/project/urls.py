@@ -10,6 +10,7 @@ urlpatterns = [
     path('antiques/', include('antiques.urls')),
     path('service/', include('service.urls')),
     path('payments/', include('payments.urls')),
+    path('api/v1/', include('api.urls')),
 ]
 
 # This block is essential for serving media files during development (DEBUG=True)
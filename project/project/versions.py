@@ -0,0 +1,68 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Content versions shared by every worker through the configured cache.
+#
+# A version is just the timestamp of the last change to some slice of content
+# ("catalog", "sellers", "wishlists:<user_id>", ...). Pages derive their ETag,
+# Last-Modified and cache keys from these, so a signal bumping the version is
+# all it takes to invalidate them - nothing is ever flushed.
+
+KEY_PREFIX = "version:"
+
+# Versions this process has seen recently: {name: (version, fetched_at)}
+_seen = {}
+
+
+def get_versions(*names, max_age=0):
+    """
+    Return {name: version} for every name, initialising any that are missing.
+
+    With `max_age` (seconds), versions this process fetched more recently than
+    that are reused without asking the shared cache. Changes made in this
+    process are seen immediately; other workers' changes within `max_age`.
+    """
+    now = time.time()
+    versions = {}
+    if max_age:
+        for name in names:
+            seen = _seen.get(name)
+            if seen and now - seen[1] < max_age:
+                versions[name] = seen[0]
+
+    keys = {f"{KEY_PREFIX}{name}": name for name in names if name not in versions}
+    if keys:
+        found = cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            for key in missing:
+                cache.add(key, now, None)  # add() so racing workers agree on one value (atomic, see project/filecache.py)
+            found.update(cache.get_many(missing))
+        for key, value in found.items():
+            versions[keys[key]] = value
+            if max_age:
+                _seen[keys[key]] = (value, now)
+    return versions
+
+
+def get_version(name):
+    return get_versions(name)[name]
+
+
+def bump_version(*names):
+    """
+    Mark content as changed once the current transaction commits, so nothing
+    can read the old rows and store them under the new version.
+    """
+    def _bump():
+        now = time.time()
+        cache.set_many({f"{KEY_PREFIX}{name}": now for name in names}, None)
+        _seen.update({name: (now, now) for name in names if name in _seen})
+
+    transaction.on_commit(_bump)
+
+
+def wishlist_version_name(user):
+    return f"wishlists:{user.pk}" if user.is_authenticated else "wishlists:anonymous"
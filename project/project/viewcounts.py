@@ -0,0 +1,122 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from functools import wraps
+
+from django.db import DatabaseError, connection
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from .sqlite import write_transaction
+
+# View counters, buffered per worker.
+#
+# Counting with an UPDATE on every page view would serialize writes (badly so
+# on SQLite), so views are tallied in memory and written every FLUSH_INTERVAL
+# seconds as one UPDATE per model. A worker that crashes loses at most that
+# many seconds of views; a clean shutdown flushes what's left.
+
+FLUSH_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+# (model, lookup_field, daily_model) -> Counter({lookup value: views})
+_buffer = {}
+_lock = threading.Lock()
+_timer = None
+
+
+def record_view(model, lookup_field, value, daily_model=None):
+    """
+    Count one view of the `model` row whose `lookup_field` is `value`.
+
+    `daily_model`, if given, also gets the views added to today's row; it must
+    have a foreign key to `model` named after it (e.g. `antique`), a `date`
+    and a `views` field.
+    """
+    global _timer
+    with _lock:
+        _buffer.setdefault((model, lookup_field, daily_model), Counter())[value] += 1
+        if _timer is None:
+            # Started lazily so every forked worker gets its own
+            _timer = threading.Timer(FLUSH_INTERVAL, _flush_from_timer)
+            _timer.daemon = True
+            _timer.start()
+
+
+def count_views(model, lookup_field, daily_model=None):
+    """Record a view for every successful GET of the decorated detail view (including 304s and cached pages)"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            if request.method == 'GET' and response.status_code in (200, 304):
+                record_view(model, lookup_field, kwargs[lookup_field], daily_model)
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def flush():
+    """Write the buffered views to the database; returns how many were written"""
+    global _buffer, _timer
+    with _lock:
+        pending, _buffer = _buffer, {}
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+
+    written = 0
+    for (model, lookup_field, daily_model), counts in pending.items():
+        try:
+            with write_transaction():
+                written += _write(model, lookup_field, daily_model, counts)
+        except DatabaseError as e:
+            # Keep them for the next flush rather than dropping them
+            logger.warning("Failed to flush %s view counts: %s", model.__name__, e)
+            with _lock:
+                _buffer.setdefault((model, lookup_field, daily_model), Counter()).update(counts)
+    return written
+
+
+def _write(model, lookup_field, daily_model, counts):
+    pks = dict(
+        model.objects.filter(**{f"{lookup_field}__in": list(counts)}).values_list(lookup_field, 'pk')
+    )
+    views = {pks[value]: n for value, n in counts.items() if value in pks}  # deleted rows are skipped
+    if not views:
+        return 0
+
+    model.objects.filter(pk__in=list(views)).update(view_count=F('view_count') + _views_case('pk', views))
+
+    if daily_model is not None:
+        fk = model._meta.model_name
+        today = timezone.localdate()
+        # Make sure today's rows exist, then increment them all in one UPDATE
+        daily_model.objects.bulk_create(
+            [daily_model(**{f"{fk}_id": pk}, date=today) for pk in views], ignore_conflicts=True,
+        )
+        daily_model.objects.filter(date=today, **{f"{fk}_id__in": list(views)}).update(
+            views=F('views') + _views_case(f"{fk}_id", views)
+        )
+    return sum(views.values())
+
+
+def _views_case(field, views):
+    # CASE pk WHEN ... THEN n ... END, so one statement covers every row
+    return Case(
+        *[When(**{field: pk}, then=Value(n)) for pk, n in views.items()],
+        default=Value(0),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _flush_from_timer():
+    try:
+        flush()
+    finally:
+        connection.close()  # this thread's own connection
+
+
+atexit.register(flush)
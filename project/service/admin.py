@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Subscriber
+from .models import BlogPost, Subscriber
+
+@admin.register(BlogPost)
+class BlogPostAdmin(admin.ModelAdmin):
+    list_display = ('title', 'status', 'view_count', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('view_count',)
 
 @admin.register(Subscriber)
 class SubscriberAdmin(admin.ModelAdmin):
@@ -0,0 +1,232 @@
+import io
+import json
+import logging
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from antiques.models import Antique, Wishlist
+from payments.models import Order
+from project import log, viewcounts
+from project.caching import tiered_cache
+from project.stubs import stripe_signature
+
+DEFAULT_SCALES = '1000,10000,100000'
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+WEBHOOK_SECRET = 'whsec_benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main pages at several catalog sizes. Each scale is seeded into a throwaway test "
+        "database with seed_catalog, then every scenario is driven through the test client and its "
+        "latency percentiles, queries per request and peak memory are reported against a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default=DEFAULT_SCALES, help="Comma separated antique counts")
+        parser.add_argument('--requests', type=int, default=30, help="Timed requests per scenario")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests first, to fill caches")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Baseline JSON to compare against")
+        parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed p95 slowdown against the baseline, as a fraction")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError("--scales must be comma separated numbers, e.g. 1000,10000")
+        if options['requests'] < 2:
+            raise CommandError("--requests must be at least 2.")
+
+        self.random = random.Random(options['seed'])
+        results = {}
+
+        # The configured cache backend in a scratch directory, so a run never reads or pollutes the real one
+        cache_dir = tempfile.mkdtemp(prefix='benchmark-cache-')
+        caches = {'default': {**settings.CACHES['default'], 'LOCATION': cache_dir}}
+
+        setup_test_environment(debug=False)  # DEBUG logs every query, which would skew time and memory
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=caches, STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET):
+                for scale in scales:
+                    results[str(scale)] = self._run_scale(scale, options)
+        finally:
+            viewcounts.flush()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        baseline_path = Path(options['baseline'])
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        regressions = self._report(results, baseline, options['tolerance'])
+
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(f"Baseline saved to {baseline_path}.")
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+    # ------------------------------
+    # Running
+    # ------------------------------
+
+    def _run_scale(self, scale, options):
+        call_command('flush', interactive=False, verbosity=0)
+        cache.clear()
+        tiered_cache.clear_local()
+
+        self.stdout.write(f"Seeding {scale} antiques...")
+        started = time.perf_counter()
+        call_command('seed_catalog', scale, seed=options['seed'], stdout=io.StringIO())
+        seed_seconds = time.perf_counter() - started
+
+        scenarios = self._scenarios()
+        measured = {}
+        # The webhook view logs a line per event
+        with log.quiet(logging.WARNING):
+            for name, request in scenarios.items():
+                measured[name] = self._measure(name, request, options['requests'], options['warmup'])
+        viewcounts.flush()
+        return {'seed_seconds': round(seed_seconds, 2), 'scenarios': measured}
+
+    def _scenarios(self):
+        # The busiest buyer: has orders and the biggest wishlist, so the per-user pages do real work
+        wishlist = (
+            Wishlist.objects.filter(owner__in=Order.objects.values('user'))
+            .annotate(size=Count('antiques'))
+            .order_by('-size', 'pk')
+            .first()
+        )
+        if wishlist is None:
+            raise CommandError("The seeded catalog has no buyer with orders and a wishlist.")
+        buyer = wishlist.owner
+        client = Client()
+        client.force_login(buyer)
+
+        details = list(Antique.objects.values_list('short_id', 'slug'))
+        detail_urls = [
+            reverse('antiques:antique_detail', args=detail)
+            for detail in self.random.sample(details, min(len(details), 50))
+        ]
+
+        # The webhook buys from one antique with plenty of stock, as a different user
+        webhook_buyer_id = Order.objects.exclude(user=buyer).values_list('user_id', flat=True).first() or buyer.pk
+        webhook_antique = Antique.objects.order_by('pk').first()
+        Antique.objects.filter(pk=webhook_antique.pk).update(quantity=10 ** 6, is_sold=False)
+        webhook_client = Client()
+        webhook_url = reverse('payments:stripe_webhook')
+
+        def webhook(i):
+            payload, signature = self._signed_event(i, webhook_buyer_id, webhook_antique.pk)
+            return webhook_client.post(webhook_url, payload, content_type='application/json',
+                                       HTTP_STRIPE_SIGNATURE=signature)
+
+        return {
+            'view_antiques': lambda i: client.get(reverse('antiques:view_antiques')),
+            'antique_detail': lambda i: client.get(detail_urls[i % len(detail_urls)]),
+            'dashboard': lambda i: client.get(reverse('dashboard')),
+            'orders': lambda i: client.get(reverse('payments:orders')),
+            'wishlist_detail': lambda i: client.get(reverse('antiques:wishlist_detail', args=[wishlist.pk])),
+            'stripe_webhook': webhook,
+        }
+
+    def _signed_event(self, i, user_id, antique_id):
+        payload = json.dumps({
+            'id': f"evt_benchmark_{i}",
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'id': f"cs_benchmark_{i}_{self.random.getrandbits(32)}",
+                'object': 'checkout.session',
+                'metadata': {'user_id': str(user_id), 'antique_id': str(antique_id), 'quantity': '1'},
+            }},
+        })
+        return payload, stripe_signature(payload, WEBHOOK_SECRET)
+
+    def _measure(self, name, request, n, warmup):
+        def checked(i):
+            response = request(i)
+            if response.status_code != 200:
+                raise CommandError(f"{name} returned {response.status_code}")
+            return response
+
+        for i in range(warmup):
+            checked(i)
+
+        with CaptureQueriesContext(connection) as queries:
+            checked(warmup)
+        query_count = len(queries)  # read now, the next request resets the query log
+
+        tracemalloc.start()
+        checked(warmup + 1)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings = []
+        for i in range(warmup + 2, warmup + 2 + n):
+            started = time.perf_counter()
+            checked(i)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'queries': query_count,
+            'peak_kb': round(peak / 1024),
+        }
+
+    # ------------------------------
+    # Reporting
+    # ------------------------------
+
+    def _report(self, results, baseline, tolerance):
+        regressions = []
+        for scale, result in results.items():
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{scale} antiques (seeded in {result['seed_seconds']}s)"))
+            self.stdout.write(
+                f"  {'scenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'peak KB':>9}  vs baseline"
+            )
+            for name, stats in result['scenarios'].items():
+                base = baseline.get(scale, {}).get('scenarios', {}).get(name)
+                comparison, regressed = self._compare(stats, base, tolerance)
+                line = (
+                    f"  {name:<16}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+                    f"{stats['queries']:>9}{stats['peak_kb']:>9}  {comparison}"
+                )
+                if regressed:
+                    regressions.append(f"{name}@{scale}")
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+        return regressions
+
+    def _compare(self, stats, base, tolerance):
+        if base is None:
+            return "-", False
+        change = (stats['p95_ms'] - base['p95_ms']) / base['p95_ms'] if base['p95_ms'] else 0
+        queries = stats['queries'] - base['queries']
+        regressed = change > tolerance or queries > 0
+        return f"p95 {change:+.0%}, queries {queries:+d}", regressed
@@ -0,0 +1,251 @@
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import F
+
+from accounts.models import CustomUser, Seller
+from antiques.models import Antique, Wishlist
+from payments.models import Order, OrderItem
+from project import log
+from project.sqlite import write_transaction
+from project.stubs import percentiles
+
+# What each profile changes from Django's stock SQLite settings
+PROFILES = {
+    'stock': "Django's defaults: rollback journal, deferred transactions, a connection per request",
+    'tuned': "settings.DATABASES: WAL and pragmas, IMMEDIATE transactions, persistent connections, write lock",
+}
+OPERATIONS = ('order', 'wishlist', 'view')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure SQLite under concurrent writers, with Django's stock database settings and with the "
+        "tuned ones in settings.DATABASES. Each profile gets its own throwaway seeded database; writer "
+        "threads run the site's short write transactions (a paid order as the webhook creates it, a "
+        "wishlist add/remove, a view count) while reader threads list the catalog. Reports throughput, "
+        "latency percentiles and 'database is locked' errors per profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Writer threads")
+        parser.add_argument('--readers', type=int, default=2, help="Reader threads")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per profile")
+        parser.add_argument('--antiques', type=int, default=200, help="Catalog size to seed")
+        parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                            help="Run only this profile (repeatable); both by default")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', help="Also write the report to this file")
+
+    def handle(self, *args, **options):
+        if options['writers'] < 1 or options['duration'] <= 0:
+            raise CommandError("--writers and --duration must be positive.")
+        if connection.vendor != 'sqlite':
+            raise CommandError("The profiles are SQLite settings; the default database isn't SQLite.")
+
+        report = {}
+        for profile in [name for name in PROFILES if name in (options['profile'] or PROFILES)]:
+            self.stdout.write(f"Running the {profile} profile ({PROFILES[profile]})...")
+            report[profile] = self._run_profile(profile, options)
+
+        self._print_report(report, options)
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {options['json']}.")
+
+    # ------------------------------
+    # Running
+    # ------------------------------
+
+    def _run_profile(self, profile, options):
+        workdir = tempfile.mkdtemp(prefix='benchmark-writes-')
+        settings_dict = connection.settings_dict  # shared with every thread's connection
+        saved = {key: settings_dict.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE')}
+        old_test_name = settings_dict['TEST'].get('NAME')
+        settings_dict['TEST']['NAME'] = os.path.join(workdir, f"{profile}.sqlite3")
+        if profile == 'stock':
+            settings_dict['OPTIONS'], settings_dict['CONN_MAX_AGE'] = {}, 0
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            fixtures = self._prepare(options)
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                journal_mode = cursor.fetchone()[0]
+            connection.close()  # the threads open their own
+
+            results = Results()
+            deadline = time.monotonic() + options['duration']
+            rng = random.Random(options['seed'])
+            threads = [
+                threading.Thread(target=self._writer, args=(profile, fixtures, results, deadline, rng.random()))
+                for _ in range(options['writers'])
+            ] + [
+                threading.Thread(target=self._reader, args=(results, deadline))
+                for _ in range(options['readers'])
+            ]
+            # Views log per write (e.g. new orders); the report counts what matters
+            with log.quiet(logging.WARNING):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            return self._build_report(results, journal_mode, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            settings_dict.update(saved)
+            settings_dict['TEST']['NAME'] = old_test_name
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _prepare(self, options):
+        count = options['antiques']
+        call_command('seed_catalog', count, users=options['writers'], seed=options['seed'], stdout=io.StringIO())
+        # Unlimited stock, so orders never run out mid-run
+        Antique.objects.update(quantity=10 ** 6, is_sold=False)
+        buyers = list(CustomUser.objects.filter(seller__isnull=True).values_list('pk', flat=True))
+        return {
+            'buyers': buyers,
+            'wishlists': list(Wishlist.objects.values_list('pk', 'owner_id')),
+            'antiques': list(Antique.objects.values_list('pk', 'seller_id', 'price')),
+        }
+
+    def _writer(self, profile, fixtures, results, deadline, seed):
+        # Stock has no write lock; its transactions are plain (deferred) atomic blocks
+        writing = write_transaction if profile == 'tuned' else transaction.atomic
+        rng = random.Random(seed)
+        try:
+            while time.monotonic() < deadline:
+                operation = rng.choice(OPERATIONS)
+                started = time.perf_counter()
+                try:
+                    getattr(self, f"_{operation}")(rng, fixtures, writing)
+                except OperationalError as e:
+                    results.record(operation, time.perf_counter() - started, error=str(e))
+                else:
+                    results.record(operation, time.perf_counter() - started)
+                close_old_connections()  # what the end of a request does: closes it unless CONN_MAX_AGE keeps it
+        finally:
+            connection.close()
+
+    def _reader(self, results, deadline):
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    list(Antique.objects.filter(is_sold=False).order_by('-created_at')[:24])
+                except OperationalError as e:
+                    results.record('read', time.perf_counter() - started, error=str(e))
+                else:
+                    results.record('read', time.perf_counter() - started)
+                close_old_connections()
+        finally:
+            connection.close()
+
+    # The write shapes, as the views and the webhook do them
+
+    def _order(self, rng, fixtures, writing):
+        antique_id, seller_id, price = rng.choice(fixtures['antiques'])
+        with writing():
+            antique = Antique.objects.select_for_update().get(pk=antique_id)
+            order = Order.objects.create(
+                user_id=rng.choice(fixtures['buyers']), stripe_session_id=f"cs_{uuid.uuid4().hex}", status='paid',
+            )
+            OrderItem.objects.create(order=order, antique=antique, quantity=1, unit_price=antique.price)
+            antique.quantity = max(0, antique.quantity - 1)
+            antique.save(update_fields=['quantity', 'is_sold', 'updated_at'])
+            Seller.record_sale(seller_id, 1, price)
+
+    def _wishlist(self, rng, fixtures, writing):
+        pk, owner_id = rng.choice(fixtures['wishlists'])
+        wishlist = Wishlist(pk=pk, owner_id=owner_id)
+        antique_id = rng.choice(fixtures['antiques'])[0]
+        with writing():
+            if rng.random() < 0.5:
+                wishlist.antiques.add(antique_id)
+            else:
+                wishlist.antiques.remove(antique_id)
+
+    def _view(self, rng, fixtures, writing):
+        # viewcounts.flush(): one UPDATE per batch, outside any request
+        with writing():
+            Antique.objects.filter(pk=rng.choice(fixtures['antiques'])[0]).update(view_count=F('view_count') + 1)
+
+    # ------------------------------
+    # Reporting
+    # ------------------------------
+
+    def _build_report(self, results, journal_mode, options):
+        operations = {}
+        for name in OPERATIONS + ('read',):
+            timings = results.timings[name]
+            operations[name] = {
+                'completed': len(timings),
+                'errors': results.errors[name],
+                'per_second': round(len(timings) / options['duration'], 1),
+                **{f"{key}_ms": value for key, value in percentiles([t * 1000 for t in timings]).items()},
+            }
+        writes = sum(operations[name]['completed'] for name in OPERATIONS)
+        return {
+            'journal_mode': journal_mode,
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'duration_s': options['duration'],
+            'writes_per_second': round(writes / options['duration'], 1),
+            'write_errors': sum(operations[name]['errors'] for name in OPERATIONS),
+            'operations': operations,
+            'error_samples': sorted(results.samples),
+        }
+
+    def _print_report(self, report, options):
+        for profile, stats in report.items():
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{profile}: {stats['writers']} writers, {stats['readers']} readers, {stats['duration_s']:g}s, "
+                f"journal_mode={stats['journal_mode']}"
+            ))
+            self.stdout.write(f"  {stats['writes_per_second']} writes/s, {stats['write_errors']} failed writes")
+            self.stdout.write(f"  {'operation':<12}{'completed':>10}{'errors':>8}{'per s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+            for name, op in stats['operations'].items():
+                line = (
+                    f"  {name:<12}{op['completed']:>10}{op['errors']:>8}{op['per_second']:>8.1f}"
+                    f"{op['p50_ms']:>9.1f}{op['p95_ms']:>9.1f}{op['p99_ms']:>9.1f}"
+                )
+                self.stdout.write(self.style.ERROR(line) if op['errors'] else line)
+            for sample in stats['error_samples']:
+                self.stdout.write(self.style.WARNING(f"  {sample}"))
+
+        if {'stock', 'tuned'} <= set(report) and report['stock']['writes_per_second']:
+            ratio = report['tuned']['writes_per_second'] / report['stock']['writes_per_second']
+            self.stdout.write("")
+            self.stdout.write(f"  tuned: {ratio:.2f}x the stock write throughput")
+
+
+class Results:
+    """Per-operation timings and errors, shared by the benchmark threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.samples = set()
+
+    def record(self, operation, seconds, error=None):
+        with self._lock:
+            if error is None:
+                self.timings[operation].append(seconds)
+            else:
+                self.errors[operation] += 1
+                self.samples.add(f"{operation}: {error}")
@@ -0,0 +1,436 @@
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import override_settings
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from antiques.models import Antique, Wishlist
+from payments.models import Order
+from project import log, viewcounts
+from project.caching import tiered_cache
+from project.stubs import SmtpSink, StripeStub, percentiles
+from service.management.commands.seed_catalog import SEED_PASSWORD
+
+DEFAULT_MIX = 'browse=40,search=20,wishlist=15,checkout=10,orders=10,account=5'
+WEBHOOK_SECRET = 'whsec_loadtest'
+CHECKOUT_STOCK = 20  # antiques given unlimited stock, so checkouts never run out mid-run
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the site offline. Boots the project on a local HTTP server over a throwaway seeded "
+        "database, with a local Stripe stub (hosted checkout and signed webhooks included) and an SMTP "
+        "sink in place of Stripe and Gmail, then runs scripted user journeys from concurrent virtual "
+        "users and reports throughput, latency percentiles and errors per step."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antiques', type=int, default=1000, help="Catalog size to seed")
+        parser.add_argument('--concurrency', type=int, default=10, help="Virtual users running at once")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run for")
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f"Journey weights, e.g. {DEFAULT_MIX}")
+        parser.add_argument('--think-time', type=float, default=0, help="Seconds a user waits between steps")
+        parser.add_argument('--webhook-delay', type=float, default=0,
+                            help="Seconds the Stripe stub waits before delivering a webhook")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', help="Also write the report to this file")
+        parser.add_argument('--fail-on-errors', action='store_true')
+
+    def handle(self, *args, **options):
+        mix = self._parse_mix(options['mix'])
+        if options['concurrency'] < 1 or options['duration'] <= 0:
+            raise CommandError("--concurrency and --duration must be positive.")
+
+        workdir = tempfile.mkdtemp(prefix='loadtest-')
+        caches = {'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(workdir, 'cache')}}
+        # A file, not the in-memory test database, so every server thread sees the same data
+        # (a PostgreSQL test database is shared already)
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        if connection.vendor == 'sqlite':
+            test_settings['NAME'] = os.path.join(workdir, 'loadtest.sqlite3')
+        old_stripe = stripe.api_base, stripe.api_key
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        site = stub = sink = None
+        try:
+            site = SiteServer().start()
+            stub = StripeStub(
+                urljoin(site.url, reverse('payments:stripe_webhook')), WEBHOOK_SECRET,
+                webhook_delay=options['webhook_delay'],
+            ).start()
+            sink = SmtpSink().start()
+            stripe.api_base, stripe.api_key = stub.url, 'sk_test_loadtest'
+
+            with override_settings(
+                CACHES=caches,
+                DEBUG=False,
+                ALLOWED_HOSTS=['127.0.0.1'],
+                STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+                EMAIL_BACKEND='project.metrics.EmailBackend',
+                EMAIL_HOST=sink.host, EMAIL_PORT=sink.port,
+                EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            ):
+                cache.clear()
+                tiered_cache.clear_local()
+                self.stdout.write(f"Seeding {options['antiques']} antiques...")
+                fixtures = self._prepare(options)
+
+                self.stdout.write(
+                    f"Running {options['concurrency']} virtual users for {options['duration']:g}s "
+                    f"against {site.url}..."
+                )
+                # Views log a line per request, and every 500 with its traceback; the report counts them
+                with log.quiet(logging.ERROR):
+                    recorder = self._run(site.url, fixtures, mix, options)
+                    stub.wait_for_webhooks()
+                    viewcounts.flush()
+                report = self._build_report(recorder, stub, sink, options)
+        finally:
+            stripe.api_base, stripe.api_key = old_stripe
+            for server in (stub, sink, site):
+                if server is not None:
+                    server.stop()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self._print_report(report)
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {options['json']}.")
+        errors = report['errors'] + report['webhooks']['failed']
+        if errors and options['fail_on_errors']:
+            raise CommandError(f"{errors} error(s) during the load test.")
+
+    def _parse_mix(self, raw):
+        mix = {}
+        try:
+            for part in raw.split(','):
+                name, _, weight = part.partition('=')
+                mix[name.strip()] = float(weight)
+        except ValueError:
+            raise CommandError(f"--mix must look like {DEFAULT_MIX}")
+        unknown = set(mix) - set(VirtualUser.JOURNEYS)
+        if unknown:
+            raise CommandError(f"Unknown journeys: {', '.join(sorted(unknown))}. "
+                               f"Choose from {', '.join(VirtualUser.JOURNEYS)}.")
+        if not any(weight > 0 for weight in mix.values()):
+            raise CommandError("--mix needs at least one journey with a positive weight.")
+        return mix
+
+    # ------------------------------
+    # Setup
+    # ------------------------------
+
+    def _prepare(self, options):
+        count = options['antiques']
+        call_command(
+            'seed_catalog', count, users=max(options['concurrency'], count // 10),
+            seed=options['seed'], stdout=io.StringIO(),
+        )
+        rng = random.Random(options['seed'])
+
+        buyers = list(CustomUser.objects.filter(seller__isnull=True).order_by('pk')[:options['concurrency']])
+        wishlists = dict(Wishlist.objects.filter(owner__in=buyers).values_list('owner_id', 'pk'))
+        antiques = list(Antique.objects.values_list('pk', 'short_id', 'slug'))
+        if not antiques:
+            raise CommandError("--antiques must be at least 1.")
+        sample = rng.sample(antiques, min(len(antiques), 200))
+
+        stock = [pk for pk, _, _ in rng.sample(antiques, min(len(antiques), CHECKOUT_STOCK))]
+        Antique.objects.filter(pk__in=stock).update(quantity=10 ** 6, is_sold=False)
+        prices = Antique.objects.aggregate(low=Min('price'), high=Max('price'))
+
+        return {
+            'buyers': [(buyer.email, str(wishlists.get(buyer.pk, ''))) for buyer in buyers],
+            'details': [reverse('antiques:antique_detail', args=[short_id, slug]) for _, short_id, slug in sample],
+            'antique_ids': [str(pk) for pk, _, _ in sample],
+            'stock': [str(pk) for pk in stock],
+            'types': sorted(set(Antique.objects.values_list('type_of_antique', flat=True))),
+            'prices': (float(prices['low']), float(prices['high'])),
+        }
+
+    # ------------------------------
+    # Running
+    # ------------------------------
+
+    def _run(self, base_url, fixtures, mix, options):
+        recorder = Recorder()
+        names, weights = zip(*[(name, weight) for name, weight in mix.items() if weight > 0])
+        users = [
+            VirtualUser(base_url, email, wishlist_id, fixtures, recorder,
+                        random.Random(options['seed'] * 1000 + i), options['think_time'])
+            for i, (email, wishlist_id) in enumerate(fixtures['buyers'])
+        ]
+
+        with ThreadPoolExecutor(max_workers=options['concurrency'], thread_name_prefix='virtual-user') as pool:
+            # Signing in hashes a password per user; done before the clock starts so it doesn't eat the run
+            users = [user for user, signed_in in zip(users, pool.map(VirtualUser.login, users)) if signed_in]
+            deadline = time.monotonic() + options['duration']
+            for future in [pool.submit(user.run, names, weights, deadline) for user in users]:
+                future.result()  # a bug in the harness itself shouldn't pass for a quiet run
+        recorder.elapsed = options['duration']
+        return recorder
+
+    # ------------------------------
+    # Reporting
+    # ------------------------------
+
+    def _build_report(self, recorder, stub, sink, options):
+        # Sign-ins happen before the clock starts, so they only show up as the 'login' journey
+        timed = {name: timings for name, timings in recorder.timings.items() if not name.startswith('login:')}
+        steps = {}
+        for name, timings in sorted(timed.items()):
+            steps[name] = {
+                'requests': len(timings),
+                'errors': recorder.errors[name],
+                'rps': round(len(timings) / recorder.elapsed, 2),
+                **{f"{key}_ms": value for key, value in percentiles(timings).items()},
+            }
+        journeys = {
+            name: {
+                'completed': len(recorder.journeys[name]),
+                'failed': recorder.failed_journeys[name],
+                **{f"{key}_ms": value for key, value in percentiles(recorder.journeys[name]).items()},
+            }
+            for name in sorted(set(recorder.journeys) | set(recorder.failed_journeys))
+        }
+        total = sum(len(timings) for timings in timed.values())
+        payments = sum(
+            1 for obj in list(stub.objects.values())
+            if obj['object'] == 'checkout.session' and obj['payment_status'] == 'paid'
+        )
+        return {
+            'antiques': options['antiques'],
+            'concurrency': options['concurrency'],
+            'duration_s': options['duration'],
+            'requests': total,
+            'rps': round(total / recorder.elapsed, 2),
+            'errors': sum(recorder.errors[name] for name in timed) + recorder.failed_journeys['login'],
+            'error_samples': recorder.samples,
+            'steps': steps,
+            'journeys': journeys,
+            'webhooks': stub.webhook_report(),
+            'stripe_requests': stub.requests,
+            'payments': payments,
+            'orders_created': Order.objects.filter(stripe_session_id__isnull=False).count(),
+            'emails': len(sink.messages),
+        }
+
+    def _print_report(self, report):
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{report['antiques']} antiques, {report['concurrency']} virtual users, {report['duration_s']:g}s"
+        ))
+        self.stdout.write(f"  {report['requests']} requests, {report['rps']}/s, {report['errors']} errors")
+        self.stdout.write("")
+        self.stdout.write(f"  {'step':<30}{'requests':>9}{'errors':>8}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, stats in report['steps'].items():
+            line = (
+                f"  {name:<30}{stats['requests']:>9}{stats['errors']:>8}{stats['rps']:>8.1f}"
+                f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+            )
+            self.stdout.write(self.style.ERROR(line) if stats['errors'] else line)
+        self.stdout.write("")
+        self.stdout.write(f"  {'journey':<30}{'completed':>10}{'failed':>8}{'p50 ms':>9}{'p95 ms':>9}")
+        for name, stats in report['journeys'].items():
+            self.stdout.write(
+                f"  {name:<30}{stats['completed']:>10}{stats['failed']:>8}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+            )
+        webhooks = report['webhooks']
+        self.stdout.write("")
+        self.stdout.write(
+            f"  Webhooks: {webhooks['delivered']} delivered, {webhooks['failed']} failed, payment to response "
+            f"p50 {webhooks['latency_ms']['p50']} ms, p95 {webhooks['latency_ms']['p95']} ms"
+        )
+        self.stdout.write(
+            f"  Stripe stub: {report['stripe_requests']} API requests, {report['payments']} payments, "
+            f"{report['orders_created']} orders created by webhooks"
+        )
+        self.stdout.write(f"  SMTP sink: {report['emails']} emails")
+        for sample in report['error_samples']:
+            self.stdout.write(self.style.WARNING(f"  {sample}"))
+
+
+class SiteServer:
+    """The project's WSGI app on a threaded localhost server, like runserver without the reloader"""
+
+    def start(self):
+        class Handler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadedWSGIServer(('127.0.0.1', 0), Handler, allow_reuse_address=False)
+        self._server.set_app(WSGIHandler())
+        host, port = self._server.server_address
+        self.url = f"http://{host}:{port}"
+        threading.Thread(target=self._server.serve_forever, name='site-server', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class Recorder:
+    """Timings and errors from every virtual user, per step and per journey"""
+    MAX_SAMPLES = 10
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = Counter()
+        self.journeys = defaultdict(list)
+        self.failed_journeys = Counter()
+        self.samples = []
+        self.elapsed = 0
+        self._lock = threading.Lock()
+
+    def step(self, name, ms, error=None):
+        with self._lock:
+            self.timings[name].append(ms)
+            if error:
+                self.errors[name] += 1
+                if len(self.samples) < self.MAX_SAMPLES:
+                    self.samples.append(f"{name}: {error}")
+
+    def journey(self, name, ms, failed):
+        with self._lock:
+            if failed:
+                self.failed_journeys[name] += 1
+            else:
+                self.journeys[name].append(ms)
+
+
+class VirtualUser:
+    """One signed-in buyer with its own session, running weighted journeys until the deadline"""
+    JOURNEYS = ('browse', 'search', 'wishlist', 'checkout', 'orders', 'account')
+
+    def __init__(self, base_url, email, wishlist_id, fixtures, recorder, rng, think_time):
+        self.base_url = base_url
+        self.email = email
+        self.wishlist_id = wishlist_id
+        self.fixtures = fixtures
+        self.recorder = recorder
+        self.random = rng
+        self.think_time = think_time
+        self.http = requests.Session()
+
+    def run(self, names, weights, deadline):
+        while time.monotonic() < deadline:
+            name = self.random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                getattr(self, name)()
+                failed = False
+            except JourneyFailed:
+                failed = True
+            self.recorder.journey(name, (time.perf_counter() - started) * 1000, failed)
+
+    def request(self, step, method, url, expect=200, **kwargs):
+        """One timed request; raises JourneyFailed on a transport error or an unexpected status"""
+        if self.think_time:
+            time.sleep(self.think_time)
+        if method == 'post':
+            kwargs.setdefault('headers', {})['X-CSRFToken'] = self.http.cookies.get('csrftoken', '')
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, urljoin(self.base_url, url), allow_redirects=False, timeout=60, **kwargs)
+            error = None if response.status_code == expect else f"HTTP {response.status_code} for {url}"
+        except requests.RequestException as e:
+            response, error = None, f"{type(e).__name__} for {url}"
+        self.recorder.step(step, (time.perf_counter() - started) * 1000, error)
+        if error:
+            raise JourneyFailed(error)
+        return response
+
+    def _location(self, response):
+        return response.headers.get('Location', '')
+
+    # ------------------------------
+    # Journeys
+    # ------------------------------
+
+    def login(self):
+        """Sign in through the login form; False if that failed"""
+        started = time.perf_counter()
+        try:
+            self.request('login: page', 'get', reverse('accounts:login_view'))
+            response = self.request(
+                'login: submit', 'post', reverse('accounts:login_view'),
+                data={'username': self.email, 'password': SEED_PASSWORD},
+                headers={'X-Requested-With': 'XMLHttpRequest'},
+            )
+            signed_in = response.json().get('success', False)
+        except JourneyFailed:
+            signed_in = False
+        self.recorder.journey('login', (time.perf_counter() - started) * 1000, failed=not signed_in)
+        return signed_in
+
+    def browse(self):
+        self.request('browse: catalog', 'get', reverse('antiques:view_antiques'))
+        self.request('browse: antique detail', 'get', self.random.choice(self.fixtures['details']))
+        self.request('browse: most wanted', 'get', reverse('antiques:view_antiques') + '?sort=most_wanted')
+
+    def search(self):
+        low, high = self.fixtures['prices']
+        min_price = round(self.random.uniform(low, high) / 2)
+        params = {'min_price': min_price, 'max_price': min_price * 2}
+        if self.fixtures['types']:
+            params['type'] = self.random.choice(self.fixtures['types'])
+        self.request('search: api filter', 'get', reverse('api:antique_list'), params=params)
+        self.request('search: sold catalog', 'get', reverse('antiques:view_antiques') + '?show_sold=true')
+
+    def wishlist(self):
+        if not self.wishlist_id:
+            return
+        self.request(
+            'wishlist: add', 'post', reverse('antiques:add_to_wishlist'),
+            data={'antique_id': self.random.choice(self.fixtures['antique_ids']), 'wishlist_id': self.wishlist_id},
+            headers={'X-Requested-With': 'XMLHttpRequest'},
+        )
+        self.request('wishlist: detail', 'get', reverse('antiques:wishlist_detail', args=[self.wishlist_id]))
+
+    def checkout(self):
+        antique_id = self.random.choice(self.fixtures['stock'])
+        response = self.request('checkout: create order', 'get', reverse('payments:create_order', args=[antique_id]),
+                                expect=302)
+        response = self.request('checkout: stripe session', 'get', self._location(response), expect=302)
+        # The stub's hosted checkout page: pays, redirects back and fires the webhook in the background
+        response = self.request('checkout: stripe payment', 'get', self._location(response), expect=303)
+        success = urlsplit(self._location(response))
+        self.request('checkout: result', 'get', f"{success.path}?{success.query}")
+
+    def orders(self):
+        self.request('orders: list', 'get', reverse('payments:orders'))
+
+    def account(self):
+        # Sends a verification email, through the SMTP sink
+        self.request('account: verification email', 'post', reverse('accounts:send_verification_code_ajax'))
@@ -0,0 +1,196 @@
+import io
+import random
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from accounts.models import CustomUser, Seller
+from antiques.models import Antique, AntiqueImage, Wishlist
+from antiques.recommendations import rebuild_similar_antiques
+from payments.models import Order, OrderItem
+from project.versions import bump_version
+from service.models import BlogPost
+
+PLACEHOLDER_IMAGE = "antiques/seed-placeholder.jpg"
+SEED_PASSWORD = "seed-password"
+
+MATERIALS = ['mahogany', 'oak', 'walnut', 'brass', 'silver', 'porcelain', 'crystal', 'bronze', 'pine', 'rosewood']
+PERIODS = ['victorian', 'georgian', 'edwardian', 'art deco', 'regency', 'mid-century', 'baroque', 'colonial']
+TYPES = {
+    'furniture': ['chair', 'table', 'cabinet', 'chest', 'desk', 'bookcase'],
+    'clocks': ['mantel clock', 'carriage clock', 'longcase clock', 'wall clock'],
+    'ceramics': ['vase', 'teapot', 'platter', 'figurine', 'bowl'],
+    'lighting': ['lamp', 'chandelier', 'candelabra', 'sconce'],
+    'silverware': ['tea set', 'cutlery set', 'salver', 'candlestick'],
+    'art': ['oil painting', 'watercolour', 'engraving', 'bust'],
+}
+DETAILS = [
+    'hand carved detail', 'original finish', 'minor wear consistent with age', 'restored hardware',
+    'maker mark on base', 'provenance available', 'gilt highlights', 'inlaid panels', 'working order',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic catalog for benchmarking: users, sellers, antiques with a "
+        "placeholder image, wishlists, orders and blog posts, all inserted with bulk_create. The other "
+        "counts default to fixed ratios of the number of antiques."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('antiques', type=int, help="Number of antiques to create")
+        parser.add_argument('--users', type=int, help="Defaults to antiques / 10")
+        parser.add_argument('--sellers', type=int, help="Defaults to antiques / 100")
+        parser.add_argument('--orders', type=int, help="Defaults to antiques / 5")
+        parser.add_argument('--posts', type=int, help="Defaults to antiques / 200")
+        parser.add_argument('--max-wishlist-size', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, help="Random seed, for a repeatable catalog")
+        parser.add_argument('--recommendations', action='store_true',
+                            help="Also rebuild the \"you may also like\" neighbours (slow on large catalogs)")
+
+    def handle(self, *args, **options):
+        count = options['antiques']
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        # Keeps the unique emails, store names and slugs of repeated runs apart
+        self.run = uuid.uuid4().hex[:6] if options['seed'] is None else f"s{options['seed']}"
+
+        n_users = options['users'] if options['users'] is not None else max(10, count // 10)
+        n_sellers = options['sellers'] if options['sellers'] is not None else max(1, count // 100)
+        n_orders = options['orders'] if options['orders'] is not None else count // 5
+        n_posts = options['posts'] if options['posts'] is not None else max(5, count // 200)
+
+        with transaction.atomic():
+            users = self._create_users(n_users + n_sellers)
+            buyers, seller_users = users[:n_users], users[n_users:]
+            sellers = self._create_sellers(seller_users)
+            antiques = self._create_antiques(count, sellers)
+            self._create_wishlists(buyers, antiques, options['max_wishlist_size'])
+            self._create_orders(buyers, antiques, n_orders)
+            self._create_posts(seller_users or buyers, n_posts)
+
+            # bulk_create skips the signals that keep these up to date
+            call_command('recompute_seller_stats', stdout=io.StringIO())
+            call_command('recompute_wishlist_counts', stdout=io.StringIO())
+            if options['recommendations']:
+                rebuild_similar_antiques()
+            bump_version('catalog', 'popularity', 'sellers', 'picks', 'blog')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(antiques)} antiques, {len(buyers)} users, {len(sellers)} sellers, "
+            f"{n_orders} orders and {n_posts} blog posts (password '{SEED_PASSWORD}')."
+        ))
+
+    # ------------------------------
+    # Rows
+    # ------------------------------
+
+    def _create_users(self, n):
+        password = make_password(SEED_PASSWORD)  # hashed once, hashing per user would dominate
+        users = [
+            CustomUser(email=f"seed-{self.run}-{i}@example.com", first_name="Seed", last_name=str(i), password=password)
+            for i in range(n)
+        ]
+        return CustomUser.objects.bulk_create(users, batch_size=self.batch_size)
+
+    def _create_sellers(self, users):
+        sellers = [
+            Seller(user=user, store_name=f"Seed Antiques {self.run} {i}", email=user.email,
+                   description="A synthetic store for benchmarking.", is_verified=i % 3 == 0)
+            for i, user in enumerate(users)
+        ]
+        return Seller.objects.bulk_create(sellers, batch_size=self.batch_size)
+
+    def _create_antiques(self, n, sellers):
+        # Past the five digit ids Antique.save() picks at random, so large catalogs never collide
+        next_short_id = max(Antique.objects.order_by('-short_id').values_list('short_id', flat=True).first() or 0, 99999) + 1
+        image = self._placeholder_image()
+
+        created = []
+        for start in range(0, n, self.batch_size):
+            batch = []
+            for short_id in range(next_short_id + start, next_short_id + min(start + self.batch_size, n)):
+                seller = self.random.choice(sellers) if sellers else None
+                type_of_antique = self.random.choice(list(TYPES))
+                title = (
+                    f"{self.random.choice(PERIODS).title()} {self.random.choice(MATERIALS)} "
+                    f"{self.random.choice(TYPES[type_of_antique])}"
+                )
+                quantity = self.random.choice([0, 1, 1, 1, 2, 3])
+                batch.append(Antique(
+                    title=title,
+                    description=", ".join(self.random.sample(DETAILS, 3)).capitalize() + ".",
+                    content=f"<p>{title}. {' '.join(self.random.sample(DETAILS, 4))}.</p>",
+                    price=Decimal(self.random.randint(20, 5000)),
+                    quantity=quantity,
+                    is_sold=quantity == 0,  # bulk_create skips Antique.save()
+                    type_of_antique=type_of_antique,
+                    short_id=short_id,
+                    slug=f"seed-{self.run}-{short_id}",
+                    dimensions=f"{self.random.randint(10, 200)} x {self.random.randint(10, 200)} cm",
+                    seller=seller,
+                    owner_id=seller.user_id if seller else None,
+                ))
+            Antique.objects.bulk_create(batch)
+            AntiqueImage.objects.bulk_create([AntiqueImage(antique=antique, image=image) for antique in batch])
+            created.extend(batch)
+        return created
+
+    def _create_wishlists(self, buyers, antiques, max_size):
+        wishlists = Wishlist.objects.bulk_create(
+            [Wishlist(title="Favourites", owner=buyer) for buyer in buyers], batch_size=self.batch_size,
+        )
+        Through = Wishlist.antiques.through
+        rows = [
+            Through(wishlist_id=wishlist.pk, antique_id=antique.pk)
+            for wishlist in wishlists
+            for antique in self.random.sample(antiques, min(len(antiques), self.random.randint(0, max_size)))
+        ]
+        Through.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def _create_orders(self, buyers, antiques, n):
+        if not buyers or not antiques:
+            return
+        orders = Order.objects.bulk_create(
+            [Order(user=self.random.choice(buyers), status=self.random.choice(['paid', 'paid', 'fulfilled', 'canceled']))
+             for _ in range(n)],
+            batch_size=self.batch_size,
+        )
+        sold = [self.random.choice(antiques) for _ in orders]
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, antique=antique, quantity=1, unit_price=antique.price)
+             for order, antique in zip(orders, sold)],
+            batch_size=self.batch_size,
+        )
+
+    def _create_posts(self, authors, n):
+        if not authors:
+            return
+        posts = []
+        for i in range(n):
+            title = f"Collecting {self.random.choice(PERIODS)} {self.random.choice(MATERIALS)} {i}"
+            posts.append(BlogPost(
+                title=title,
+                slug=f"seed-{self.run}-post-{i}",
+                content="".join(f"<p>{' '.join(self.random.sample(DETAILS, 5))}.</p>" for _ in range(8)),
+                owner=self.random.choice(authors),
+                status='published',
+                topic=self.random.choice(list(TYPES)),
+            ))
+        BlogPost.objects.bulk_create(posts, batch_size=self.batch_size)
+
+    def _placeholder_image(self):
+        # One shared file; every seeded antique points at it
+        if not default_storage.exists(PLACEHOLDER_IMAGE):
+            buffer = io.BytesIO()
+            Image.new('RGB', (400, 300), (205, 190, 165)).save(buffer, 'JPEG')
+            default_storage.save(PLACEHOLDER_IMAGE, ContentFile(buffer.getvalue()))
+        return PLACEHOLDER_IMAGE
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the default SQLite database into every SQLite replica in DB_REPLICAS (settings.DATABASE_REPLICAS), "
+        "with SQLite's online backup, so the read-replica routing can be tried locally. With --interval it keeps "
+        "copying, standing in for replication. Postgres replicas are left to Postgres' own replication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Copy again every this many seconds, until interrupted")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError("The default database isn't SQLite; use its own replication.")
+        targets = [alias for alias in settings.DATABASE_REPLICAS if connections[alias].vendor == 'sqlite']
+        if not targets:
+            raise CommandError("No SQLite replicas configured; set DB_REPLICAS to one or more file paths.")
+
+        while True:
+            started = time.perf_counter()
+            primary.ensure_connection()
+            for alias in targets:
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    primary.connection.backup(target)
+                finally:
+                    target.close()
+            self.stdout.write(
+                f"Copied the database to {', '.join(targets)} in {(time.perf_counter() - started) * 1000:.0f} ms."
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("service", "0004_emailtemplate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blogpost",
+            name="view_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
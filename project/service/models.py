@@ -25,6 +25,9 @@ class BlogPost(models.Model):
     topic = models.CharField(max_length=100, blank=True, null=True)
     image = models.ImageField(upload_to='blog_images/', blank=True, null=True)
 
+    # Buffered in each worker and flushed in batches, see project/viewcounts.py
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return self.title
         
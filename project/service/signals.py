@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from project.versions import bump_version
+from .models import BlogPost
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def bump_blog_version(sender, **kwargs):
+    bump_version('blog')
@@ -1,3 +1,475 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import pickle
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from antiques.models import Antique, DailyPick
+from project import log, metrics, postgres, profiling, replicas, sqlite, tasks
+from project.filecache import AtomicFileBasedCache
+from project.testing import QueryBudgetTestCase
+
+from .models import Subscriber
+
+
+class BlogQueryBudgets(QueryBudgetTestCase):
+    def test_blogs(self):
+        self.assertQueryBudget(1, 'service:blogs')
+
+    def test_blogs_signed_in(self):
+        self.assertQueryBudget(3, 'service:blogs', user='buyer')
+
+    def test_blog_detail(self):
+        self.assertQueryBudget(2, 'service:blog_detail', args=lambda c: [c.post.slug])
+
+    def test_blog_detail_signed_in(self):
+        self.assertQueryBudget(4, 'service:blog_detail', args=lambda c: [c.post.slug], user='buyer')
+
+    def test_create_blog(self):
+        self.assertQueryBudget(2, 'service:create_blog', user='seller_user')
+
+    # edit_blog routes a slug to blog_form(), which only takes a pk, so it has no working request to budget
+
+
+class PageQueryBudgets(QueryBudgetTestCase):
+    def test_about_us(self):
+        self.assertQueryBudget(0, 'service:about_us')
+
+    def test_terms_and_conditions(self):
+        self.assertQueryBudget(0, 'service:terms_and_conditions')
+
+    def test_privacy_policy(self):
+        self.assertQueryBudget(0, 'service:privacy_policy')
+
+
+class SubscriptionQueryBudgets(QueryBudgetTestCase):
+    def test_subscribe(self):
+        self.assertQueryBudget(2, 'service:subscribe', args=['false'], method='post',
+                               data={'email': 'new-subscriber@example.com'}, status=302)
+
+    def test_unsubscribe(self):
+        self.assertQueryBudget(3, 'service:unsubscribe', user='buyer', method='post', status=302)
+
+
+class AdminQueryBudgets(QueryBudgetTestCase):
+    def test_admin_panel(self):
+        self.assertQueryBudget(2, 'service:admin_panel', user='superuser')
+
+    def test_cache_stats(self):
+        self.assertQueryBudget(2, 'service:cache_stats', user='superuser')
+
+    def test_send_mass_email_page(self):
+        self.assertQueryBudget(3, 'service:send_mass_email_page', user='superuser')
+
+    def test_send_mass_email(self):
+        self.assertQueryBudget(1, 'service:send_mass_email_view', user='superuser', method='post',
+                               data={'subject': 'News', 'message': 'New stock is in.'}, status=302)
+
+    def test_save_email_draft(self):
+        self.assertQueryBudget(3, 'service:save_email_draft', user='superuser', method='post',
+                               data=json.dumps({'subject': 'News', 'body': '<p>New stock is in.</p>'}),
+                               content_type='application/json')
+
+
+class ProfileQueryBudgets(QueryBudgetTestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        self.enterContext(override_settings(PROFILE_DIR=self.profile_dir.name))
+
+    def test_profiles(self):
+        self.assertQueryBudget(2, 'service:profiles', user='superuser')
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        self.enterContext(override_settings(PROFILE_DIR=self.profile_dir.name, PROFILE_SAMPLE_RATE=0))
+        self.staff = CustomUser.objects.bulk_create([CustomUser(email="staff@example.com", is_staff=True)])[0]
+
+    def test_signed_header_profiles_the_request(self):
+        self.client.get(reverse('service:about_us'), HTTP_X_PROFILE=profiling.profile_token())
+
+        [profile] = profiling.list_profiles()
+        self.assertEqual(profile['view'], 'service.about_us')
+        stored = profiling.load_profile(profile['name'])
+        self.assertEqual(stored['path'], reverse('service:about_us'))
+        self.assertEqual(stored['reason'], 'header')
+
+    def test_unsigned_header_is_ignored(self):
+        self.client.get(reverse('service:about_us'), HTTP_X_PROFILE='profile')
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_sample_rate(self):
+        with override_settings(PROFILE_SAMPLE_RATE=1):
+            self.client.get(reverse('service:about_us'))
+        self.assertEqual(len(profiling.list_profiles()), 1)
+
+    def test_rotation_keeps_the_newest(self):
+        with override_settings(PROFILE_SAMPLE_RATE=1, PROFILE_KEEP=2):
+            for _ in range(3):
+                self.client.get(reverse('service:about_us'))
+        self.assertEqual(len(profiling.list_profiles()), 2)
+
+    def test_flame_summary(self):
+        stacks = {'view (service/views.py:1);render (django/shortcuts.py:1)': 3, 'view (service/views.py:1)': 1}
+        rows = profiling.flame_rows(stacks, duration_ms=40)
+        self.assertEqual([(row['name'], row['depth'], row['width']) for row in rows], [
+            ('view (service/views.py:1)', 0, 100),
+            ('render (django/shortcuts.py:1)', 1, 75),
+        ])
+        self.assertTrue(rows[0]['project'])
+        self.assertFalse(rows[1]['project'])
+        self.assertEqual(profiling.hottest_frames(stacks, 40)[0]['ms'], 30)
+
+    def test_pages_are_staff_only(self):
+        self.client.get(reverse('service:about_us'), HTTP_X_PROFILE=profiling.profile_token())
+        name = profiling.list_profiles()[0]['name']
+        detail = reverse('service:profile_detail', args=[name])
+
+        self.assertEqual(self.client.get(reverse('service:profiles')).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse('service:profiles')), name)
+        self.assertContains(self.client.get(detail), reverse('service:about_us'))
+        self.assertEqual(self.client.get(reverse('service:profile_detail', args=['..%2Fsettings.py'])).status_code, 404)
+
+
+class MetricsQueryBudgets(QueryBudgetTestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.metrics_dir.cleanup)
+        self.enterContext(override_settings(METRICS_DIR=self.metrics_dir.name))
+
+    def test_metrics(self):
+        self.assertQueryBudget(0, 'service:metrics')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.metrics_dir.cleanup)
+        self.enterContext(override_settings(METRICS_DIR=self.metrics_dir.name))
+        metrics.registry.clear()
+
+    def _worker_file(self, pid, counters=(), gauges=(), histograms=()):
+        Path(self.metrics_dir.name, f"{pid}.json").write_text(json.dumps({
+            'pid': pid, 'written_at': 0,
+            'counters': list(counters), 'gauges': list(gauges), 'histograms': list(histograms),
+        }))
+
+    def _dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def test_request_latency_is_recorded_per_view(self):
+        self.client.get(reverse('service:about_us'))
+        body = self.client.get(reverse('service:metrics')).content.decode()
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",status="2xx",view="service:about_us",le="+Inf"}',
+                      body)
+        self.assertIn('http_request_duration_seconds_count{method="GET",status="2xx",view="service:about_us"}', body)
+
+    def test_internal_addresses_only(self):
+        self.assertEqual(self.client.get(reverse('service:metrics')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('service:metrics'), REMOTE_ADDR='8.8.8.8').status_code, 404)
+        self.assertEqual(self.client.get(reverse('service:metrics'), REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required_when_set(self):
+        # Behind a reverse proxy on the same host, every visitor arrives from 127.0.0.1
+        self.assertEqual(self.client.get(reverse('service:metrics')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('service:metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('service:metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200
+        )
+        self.assertEqual(
+            self.client.get(reverse('service:metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret',
+                            REMOTE_ADDR='8.8.8.8').status_code, 404
+        )
+
+    def test_workers_are_summed_and_dead_ones_archived(self):
+        histogram = ['stripe_webhook_lag_seconds', {'type': 'x'}, [1, 10], [1, 1, 0], 5.5, 2]
+        self._worker_file(os.getppid(), counters=[['emails_sent_total', {'result': 'sent'}, 2]],
+                          gauges=[['background_jobs_queued', {}, 3]], histograms=[histogram])
+        dead = self._dead_pid()
+        self._worker_file(dead, counters=[['emails_sent_total', {'result': 'sent'}, 5]],
+                          gauges=[['background_jobs_queued', {}, 7]], histograms=[histogram])
+
+        for _ in range(2):  # the second pass reads the dead worker from the archive
+            totals = metrics.collect()
+            self.assertEqual(totals['counters'][('emails_sent_total', (('result', 'sent'),))], 7)
+            self.assertEqual(totals['histograms'][('stripe_webhook_lag_seconds', (('type', 'x'),))],
+                             [[1, 10], [2, 2, 0], 11.0, 4])
+            self.assertFalse(Path(self.metrics_dir.name, f"{dead}.json").exists())
+
+        # Only live workers' gauges count; this worker's own queue adds its current depth
+        self.assertEqual(totals['gauges'][('background_jobs_queued', ())], 3)
+
+    def test_cache_hit_ratio(self):
+        self._worker_file(os.getppid(), counters=[
+            ['cache_requests_total', {'cache': 'page', 'result': 'hit'}, 3],
+            ['cache_requests_total', {'cache': 'page', 'result': 'miss'}, 1],
+        ])
+        body = metrics.expose()
+        self.assertIn('cache_hit_ratio{cache="page"} 0.75', body)
+
+    def test_stripe_ids_are_taken_out_of_the_endpoint(self):
+        urls = {
+            'https://api.stripe.com/v1/checkout/sessions/cs_test_a1B2c3D4e5F6g7H8i9J0kLmN': 'checkout/sessions/{id}',
+            'https://api.stripe.com/v1/checkout/sessions/cs_live_b1a2/line_items?limit=5':
+                'checkout/sessions/{id}/line_items',
+            'https://api.stripe.com/v1/customers/cus_Nf3kQ2/payment_methods': 'customers/{id}/payment_methods',
+            'https://api.stripe.com/v1/payment_intents': 'payment_intents',
+        }
+        with mock.patch.object(metrics.stripe.RequestsClient, 'request', return_value=('{}', 200, {})):
+            for url in urls:
+                metrics.StripeHTTPClient().request('get', url, {})
+        endpoints = {labels['endpoint'] for name, labels, *_ in metrics.registry.snapshot()['histograms']
+                     if name == 'stripe_request_duration_seconds'}
+        self.assertEqual(endpoints, set(urls.values()))
+
+
+class FileCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache = AtomicFileBasedCache(cache_dir.name, {})
+
+    def race(self, func, threads=4):
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def run():
+            barrier.wait()
+            results.append(func())
+
+        workers = [threading.Thread(target=run) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_add_has_one_winner(self):
+        has_key = FileBasedCache.has_key
+
+        def slow_has_key(*args, **kwargs):
+            # Widens the gap between the check and the write that FileBasedCache.add() leaves open
+            found = has_key(*args, **kwargs)
+            time.sleep(0.05)
+            return found
+
+        with mock.patch.object(FileBasedCache, 'has_key', slow_has_key):
+            results = self.race(lambda: self.cache.add('lock', os.getpid(), 30))
+        self.assertEqual(results.count(True), 1)
+
+    def test_incr_loses_no_updates_and_keeps_the_expiry(self):
+        self.cache.set('count', 0, None)
+        self.race(lambda: [self.cache.incr('count') for _ in range(25)])
+        self.assertEqual(self.cache.get('count'), 100)
+        with open(self.cache._key_to_file('count'), 'rb') as f:
+            self.assertIsNone(pickle.load(f))  # still never expires
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+
+class BackgroundJobTests(TestCase):
+    def test_failures_name_the_job(self):
+        def refresh_thumbnails():
+            raise RuntimeError("disk full")
+
+        with self.assertLogs('project.tasks', 'ERROR') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                tasks.enqueue(refresh_thumbnails)
+            tasks._jobs.join()
+        self.assertIn("Background job service.tests.refresh_thumbnails failed", logs.output[0])
+
+
+class LoggingTests(TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = log.QueueHandler(self.stream)
+        self.handler.setFormatter(log.JsonFormatter())
+        self.addCleanup(self.handler.stop)
+        self.logger = logging.getLogger('service.tests.logging')
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+        self.logger.setLevel(logging.INFO)
+
+    def records(self):
+        self.handler.flush()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_disabled_levels_never_render_their_arguments(self):
+        with self.assertNumQueries(0):
+            self.logger.debug("Subscribers: %s", Subscriber.objects.all())
+        self.assertEqual(self.records(), [])
+
+    def test_records_are_json_with_their_extra_fields(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.logger.exception("Order %s failed", 7, extra={'order_id': 7, 'user': self.logger})
+
+        [record] = self.records()
+        self.assertEqual(record['level'], 'ERROR')
+        self.assertEqual(record['logger'], 'service.tests.logging')
+        self.assertEqual(record['message'], "Order 7 failed")
+        self.assertEqual(record['order_id'], 7)
+        self.assertIn('service.tests.logging', record['user'])
+        self.assertIn("ValueError: boom", record['exception'])
+
+    def test_message_is_rendered_when_logged(self):
+        # The listener thread writes later; it must not see what the caller changed since
+        items = ['a']
+        self.logger.info("Items: %s", items)
+        items.append('b')
+        self.assertEqual(self.records()[0]['message'], "Items: ['a']")
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "SQLite settings")
+class SqliteTests(TransactionTestCase):
+    def test_pragmas_on_every_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_write_lock_is_released_before_on_commit_hooks(self):
+        seen = []
+        with sqlite.write_transaction():
+            self.assertTrue(sqlite._write_lock.locked())
+            transaction.on_commit(lambda: seen.append(sqlite._write_lock.locked()))
+            Subscriber.objects.create(email="lock@example.com")
+        self.assertEqual(seen, [False])
+
+    def test_write_lock_is_released_on_rollback(self):
+        with self.assertRaises(ValueError), sqlite.write_transaction():
+            Subscriber.objects.create(email="rollback@example.com")
+            raise ValueError
+        self.assertFalse(sqlite._write_lock.locked())
+        self.assertFalse(Subscriber.objects.filter(email="rollback@example.com").exists())
+
+    def test_nested_in_a_transaction_takes_no_lock(self):
+        with transaction.atomic(), sqlite.write_transaction():
+            self.assertFalse(sqlite._write_lock.locked())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=5)
+class ReplicaTests(TransactionTestCase):
+    # The router and middleware only name an alias; nothing here queries 'replica'
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def run_view(self, view, **cookies):
+        """Run `view` under ReplicaMiddleware; returns the response and what db_for_read said inside the view"""
+        seen = {}
+
+        def get_response(request):
+            response = view(request)
+            seen['read'] = self.router.db_for_read(Subscriber)
+            return response
+
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies)
+        return replicas.ReplicaMiddleware(get_response)(request), seen
+
+    def test_reads_go_to_the_primary_outside_replica_views(self):
+        response, seen = self.run_view(lambda request: HttpResponse())
+        self.assertEqual(seen['read'], 'default')
+        self.assertEqual(self.router.db_for_read(Subscriber), 'default')
+
+    def test_replica_view_reads_from_a_replica(self):
+        seen = {}
+
+        @replicas.use_replica
+        def view(request):
+            seen['in_view'] = self.router.db_for_read(Subscriber)
+            with transaction.atomic():
+                seen['in_transaction'] = self.router.db_for_read(Subscriber)
+            return HttpResponse()
+
+        response, after = self.run_view(view)
+        self.assertEqual(seen, {'in_view': 'replica', 'in_transaction': 'default'})
+        self.assertEqual(after['read'], 'default')
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_write_pins_the_request_and_sets_the_cookie(self):
+        @replicas.use_replica
+        def view(request):
+            self.router.db_for_write(Subscriber)
+            return HttpResponse()
+
+        response, seen = self.run_view(view)
+        self.assertEqual(seen['read'], 'default')
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 5)
+
+    def test_cookie_pins_the_next_request(self):
+        pinned = []
+
+        @replicas.use_replica
+        def view(request):
+            pinned.append(replicas._state.get().pinned)
+            return HttpResponse()
+
+        self.run_view(view, **{replicas.PIN_COOKIE: str(time.time() + 5)})
+        self.run_view(view, **{replicas.PIN_COOKIE: str(time.time() - 1)})
+        self.run_view(view, **{replicas.PIN_COOKIE: 'junk'})
+        self.assertEqual(pinned, [True, False, False])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'service'))
+        self.assertIsNone(self.router.allow_migrate('default', 'service'))
+
+
+class DialectTests(TestCase):
+    """The code paths that differ between SQLite and PostgreSQL, on whichever the tests run"""
+
+    def create_antique(self, title, quantity=1):
+        # With a Stripe product already, so saving doesn't create one
+        return Antique.objects.create(title=title, price=1, quantity=quantity, stripe_product_id='prod_test')
+
+    def test_unique_slugs(self):
+        slugs = [self.create_antique(title).slug for title in (
+            "Oak chest", "Oak chest of drawers", "Oak chest", "Oak chest", "Oak-chest",
+        )]
+        self.assertEqual(slugs, ['oak-chest', 'oak-chest-of-drawers', 'oak-chest-1', 'oak-chest-2', 'oak-chest-3'])
+
+    def test_daily_picks_are_available_antiques(self):
+        for i in range(5):
+            self.create_antique(f"Available {i}")
+            self.create_antique(f"Sold {i}", quantity=0)
+        picks = list(DailyPick.get_today_picks())
+        self.assertEqual(len(picks), 3)
+        self.assertFalse(any(antique.is_sold for antique in picks))
+
+    @unittest.skipIf(connection.vendor == 'postgresql', "Runs there")
+    def test_postgres_sql_skipped_elsewhere(self):
+        operation = postgres.RunPostgresSQL("SELECT no_such_function()", reverse_sql="SELECT no_such_function()")
+        editor = SimpleNamespace(connection=connection)  # anything past the vendor check would fail on it
+        operation.database_forwards('antiques', editor, None, None)
+        operation.database_backwards('antiques', editor, None, None)
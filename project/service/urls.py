@@ -21,6 +21,11 @@ urlpatterns = [
     path('send-mass-email-page/', views.send_mass_email_page, name='send_mass_email_page'),
 
     path('admin-panel/', views.admin_panel, name='admin_panel'),
+    path('admin-panel/cache-stats/', views.cache_stats, name='cache_stats'),
+    path('admin-panel/profiles/', views.profiles, name='profiles'),
+    path('admin-panel/profiles/<str:name>/', views.profile_detail, name='profile_detail'),
+
+    path('metrics/', views.metrics_endpoint, name='metrics'),
 
 
 
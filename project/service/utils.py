@@ -9,3 +9,12 @@ def only_superuser(view_func):
         else:
             return HttpResponseForbidden("You do not have permission to access this page.")
     return _wrapped_view
+
+def only_staff(view_func):
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if request.user.is_staff:
+            return view_func(request, *args, **kwargs)
+        else:
+            return HttpResponseForbidden("You do not have permission to access this page.")
+    return _wrapped_view
@@ -4,12 +4,21 @@ from .forms import BlogPostForm
 from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib import messages
-from .utils import only_superuser
-
+from .utils import only_staff, only_superuser
+from project import metrics, profiling
+from project.caching import cache_anonymous_page, tiered_cache
+from project.replicas import use_replica
+from project.viewcounts import count_views
+
+@use_replica
+@cache_anonymous_page('blog')
 def blogs(request):
     posts = BlogPost.objects.all()
     return render(request, 'service/blog/blogs.html', {'posts': posts})
 
+@use_replica
+@count_views(BlogPost, 'slug')
+@cache_anonymous_page('blog')
 def blog_detail(request, slug): 
     post = BlogPost.objects.get(slug=slug)
     username = post.owner.email.split('@')[0] if post.owner and post.owner.email else 'Unknown'
@@ -126,7 +135,7 @@ def send_mass_email(subject, message, recipient_list):
         fail_silently=False,
     )
 
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from .models import EmailTemplate
 from django.views.decorators.csrf import csrf_exempt
 import json
@@ -162,3 +171,37 @@ def save_email_draft(request):
 def admin_panel(request):
     return render(request, 'service/admin/admin_panel.html')
 
+@only_superuser
+def cache_stats(request):
+    # Counters are per worker; 'all_workers' holds what every worker has flushed so far
+    return JsonResponse(tiered_cache.stats())
+
+@only_staff
+def profiles(request):
+    # The slowest profiled requests, plus a header value for profiling one on demand
+    return render(request, 'service/admin/profiles.html', {
+        'profiles': profiling.list_profiles(),
+        'sample_rate': settings.PROFILE_SAMPLE_RATE,
+        'token': profiling.profile_token(),
+        'token_minutes': profiling.TOKEN_MAX_AGE // 60,
+    })
+
+@only_staff
+def profile_detail(request, name):
+    profile = profiling.load_profile(name)
+    if profile is None:
+        raise Http404("No such profile.")
+    rows = profiling.flame_rows(profile['stacks'], profile['duration_ms'])
+    return render(request, 'service/admin/profile_detail.html', {
+        'name': name,
+        'profile': profile,
+        'rows': rows,
+        'depth': max((row['depth'] for row in rows), default=0) + 1,
+        'hottest': profiling.hottest_frames(profile['stacks'], profile['duration_ms']),
+    })
+
+def metrics_endpoint(request):
+    # For a Prometheus scraper on the same host or network (with METRICS_TOKEN, if set); not found from anywhere else
+    if not metrics.is_internal(request):
+        raise Http404
+    return HttpResponse(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')